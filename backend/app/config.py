@@ -9,6 +9,25 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "mysql+pymysql://root:@localhost:3306/hms"
     
+    # Connection pool (per worker process: total = workers * (size + overflow))
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_pool_timeout: int = 10  # seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # keep below MySQL wait_timeout
+    db_pool_pre_ping: bool = False  # ping on every checkout
+    db_pre_ping_idle_seconds: int = 60  # otherwise ping only after this long idle (0 = never)
+    
+    # Read replicas for reports and list endpoints (JSON list of URLs)
+    read_replica_urls: list = []
+    replica_health_check_interval: int = 10  # seconds between replica checks
+    replica_max_lag_seconds: int = 30  # skip MySQL replicas lagging more than this
+    read_your_writes_seconds: int = 5  # keep a client on the primary after its own write
+    
+    # SQLite (sqlite:/// URLs)
+    sqlite_busy_timeout_ms: int = 5000  # wait on a locked database instead of failing
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # memory-mapped I/O window in bytes
+    sqlite_cache_size_kib: int = 64 * 1024  # page cache per connection
+    
     # Security
     secret_key: str = "your-secret-key-change-in-production-hms-2024"
     algorithm: str = "HS256"
@@ -19,17 +38,80 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = False
     
+    # Server (production launcher, see start.py --prod)
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    workers: int = 0  # 0 = one worker per available CPU
+    keepalive_timeout: int = 5  # seconds an idle keep-alive connection is held
+    backlog: int = 2048  # pending connections queued by the listening socket
+    graceful_timeout: int = 30  # seconds workers get to finish requests on shutdown
+    worker_timeout: int = 120  # seconds before a silent worker is restarted
+    
     # CORS
     allowed_origins: list = ["http://localhost:3000", "http://127.0.0.1:3000", "*"]
     
     # File uploads
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     upload_dir: str = "uploads"
+    import_chunk_size: int = 2000  # rows per upsert batch for bulk patient imports
     
     # Pagination
     default_page_size: int = 50
     max_page_size: int = 1000
     
+    # Audit log (buffered writer for system_logs)
+    audit_enabled: bool = True
+    audit_queue_size: int = 10000  # events held in memory before new ones are dropped
+    audit_batch_size: int = 200  # flush as soon as this many events are queued
+    audit_flush_interval_ms: int = 500  # ...or at least this often
+    audit_partitioning: bool = False  # monthly partitions (MySQL) / monthly tables (SQLite)
+    audit_partitions_ahead: int = 3  # future months created ahead of time
+    audit_retention_months: int = 12  # older months are archived and dropped
+    audit_archive_dir: str = "archives/audit"
+    
+    # Reports
+    report_cache_open_ttl_seconds: int = 30  # TTL for today's/future report pieces
+    report_cache_closed_ttl_seconds: int = 600  # TTL for past days; bounds staleness across workers
+    coalesce_timeout_seconds: int = 30  # identical in-flight requests wait this long for the first
+    
+    # Patient history cache
+    history_cache_max_patients: int = 1000  # least recently viewed patients are evicted
+    history_cache_ttl_seconds: int = 300  # bounds staleness across workers
+    
+    # Background jobs (long-range reports, exports)
+    job_workers: int = 2  # processes in the job pool of each server worker
+    job_concurrency: dict = {"reports": 1, "exports": 1, "maintenance": 1}  # running jobs per group across all workers
+    job_results_dir: str = "job_results"
+    job_result_ttl_hours: int = 24
+    
+    # Hot/cold archival of appointments, bills and expenses
+    archive_database_url: str = ""  # empty: archive tables live in the main database
+    archive_after_months: int = 24  # whole months kept hot before the current one
+    archive_batch_size: int = 1000  # appointments moved per transaction
+    archive_batch_pause_ms: int = 50  # pause between batches so OLTP writes get the locks
+    
+    # Monthly partitioning of appointments and bills (MySQL)
+    clinical_partitioning: bool = False  # maintain partitions; conversion itself is run on request
+    clinical_partitions_ahead: int = 3  # future months created ahead of time
+    clinical_partition_merge_after_months: int = 12  # older whole years are folded into one partition
+    
+    # Bill reconciliation
+    reconcile_chunk_size: int = 50000  # bill_id range checked per statement
+    
+    # Batch receipts
+    receipt_workers: int = 2  # rendering processes per server worker
+    receipt_chunk_size: int = 50  # receipts per pool task; smaller batches render in-process
+    receipt_batch_max: int = 1000  # bills per request
+    
+    # Appointments
+    appointment_slot_minutes: int = 10  # per-patient slot used to derive daily capacity from schedules
+    booking_stored_procedure: bool = False  # MySQL: book through sp_create_appointment_with_bill (one CALL)
+    
+    # Idempotency keys (booking, expense and payment-status writes)
+    idempotency_ttl_hours: int = 24  # stored responses are replayed for this long
+    idempotency_cache_size: int = 10000  # completed keys kept in memory per worker
+    idempotency_wait_seconds: int = 30  # duplicates wait this long for the first request, then get 409
+    
     # Hospital settings
     hospital_name: str = "Private Medical Center"
     hospital_address: str = "123 Medical Street, City"
@@ -1,41 +1,288 @@
 """
 Database configuration and connection management for HMS
 """
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, event, exc, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import StaticPool, QueuePool
 import os
+import threading
+import time
 from typing import Generator
+from fastapi import Request
+
+from .config import settings
 
 # Database Configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://root:@localhost:3306/hms")
+DATABASE_URL = settings.database_url
 
 # Determine database type
 is_sqlite = DATABASE_URL.startswith("sqlite")
 is_mysql = "mysql" in DATABASE_URL
 
-# Create engine with proper configuration
-if is_sqlite:
-    engine = create_engine(
-        DATABASE_URL,
+# =====================================================
+# CONNECTION POOL INSTRUMENTATION
+# =====================================================
+class PoolStats:
+    """Counters and live connection ages for one worker process's pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.timeouts = 0
+        self.pings = 0
+        self.disconnects = 0
+        self._connected_at = {}  # id(connection record) -> monotonic connect time
+
+    def incr(self, name: str, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def connection_opened(self, record):
+        with self._lock:
+            self.connects += 1
+            self._connected_at[id(record)] = time.monotonic()
+
+    def connection_closed(self, record):
+        with self._lock:
+            self._connected_at.pop(id(record), None)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            ages = [now - t for t in self._connected_at.values()]
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "waits": self.waits,
+                "wait_time_ms_total": round(self.wait_time_total * 1000, 2),
+                "wait_time_ms_avg": round(self.wait_time_total * 1000 / self.waits, 2) if self.waits else 0,
+                "timeouts": self.timeouts,
+                "idle_pings": self.pings,
+                "disconnects_detected": self.disconnects,
+                "connection_age_seconds": {
+                    "count": len(ages),
+                    "min": round(min(ages), 1) if ages else 0,
+                    "max": round(max(ages), 1) if ages else 0,
+                    "avg": round(sum(ages) / len(ages), 1) if ages else 0
+                }
+            }
+
+pool_stats = PoolStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how often and how long checkouts wait for a free slot"""
+
+    stats = pool_stats  # replaced per engine by _instrument_pool
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        saturated = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.incr("timeouts")
+            raise
+        finally:
+            if saturated:
+                self.stats.incr("waits")
+                self.stats.incr("wait_time_total", time.monotonic() - started)
+
+def _instrument_pool(engine, stats: PoolStats):
+    idle_ping_after = settings.db_pre_ping_idle_seconds
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.connection_opened(connection_record)
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        stats.connection_closed(connection_record)
+
+    @event.listens_for(engine, "detach")
+    def on_detach(dbapi_connection, connection_record):
+        stats.connection_closed(connection_record)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.incr("checkins")
+        if connection_record is not None:
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.incr("checkouts")
+        if settings.db_pool_pre_ping or idle_ping_after <= 0:
+            return
+        # Ping only connections that sat idle long enough to have been dropped by
+        # the server or a firewall, instead of paying a round trip on every checkout
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_ping_after:
+            return
+        stats.incr("pings")
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception:
+            stats.incr("disconnects")
+            # The pool discards this connection and retries with a fresh one
+            raise exc.DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+def _apply_sqlite_pragmas(engine):
+    """Per-connection SQLite tuning: WAL lets readers run alongside a writer"""
+
+    @event.listens_for(engine, "connect")
+    def on_sqlite_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+            cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+            # Negative cache_size is in KiB rather than pages
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+        finally:
+            cursor.close()
+
+def create_sqlite_engine(url: str):
+    """
+    SQLite engine for production use. File databases get a pool where every
+    concurrent thread checks out its own connection; in-memory databases must
+    share a single connection and keep StaticPool.
+    """
+    in_memory = url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+    if in_memory:
+        return create_engine(
+            url,
+            echo=False,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+
+    sqlite_engine = create_engine(
+        url,
         echo=False,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000
+        },
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_use_lifo=True,
     )
-else:
-    # MySQL configuration
-    engine = create_engine(
-        DATABASE_URL,
+    _apply_sqlite_pragmas(sqlite_engine)
+    return sqlite_engine
+
+_built_engines = []  # every engine of this process, see dispose_engines_after_fork()
+
+def build_engine(url: str, stats: PoolStats = None):
+    """
+    Engine for a primary or replica URL with the configured pool settings,
+    idle pre-ping and counters (into `stats`, or a private PoolStats)
+    """
+    if url.startswith("sqlite"):
+        new_engine = create_sqlite_engine(url)
+    else:
+        new_engine = _create_mysql_engine(url)
+    _instrument_pool(new_engine, stats or PoolStats())
+    _built_engines.append(new_engine)
+    return new_engine
+
+def _create_mysql_engine(url: str):
+    # MySQL configuration, sized per worker process (see /api/admin/db-pool)
+    return create_engine(
+        url,
         echo=False,  # Set to True for SQL debugging
-        pool_pre_ping=True,  # Verify connections before use
-        pool_recycle=300,    # Recycle connections every 5 minutes
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_use_lifo=True,  # Reuse warm connections so idle extras can age out
         connect_args={
             "charset": "utf8mb4",
             "autocommit": False
-        } if is_mysql else {}
+        } if "mysql" in url else {}
     )
 
+def dispose_engines_after_fork():
+    """Forked workers must not share the master's pooled connections (primary and replicas)"""
+    for built in _built_engines:
+        built.dispose(close=False)
+
+# Create engine with proper configuration
+engine = build_engine(DATABASE_URL, pool_stats)
+
+def get_pool_status() -> dict:
+    """Pool configuration, occupancy and counters for this worker"""
+    from .services.startup import resolve_workers
+
+    pool = engine.pool
+    per_worker = None
+    status = {
+        "worker_pid": os.getpid(),
+        "dialect": engine.dialect.name,
+        "pool_class": type(pool).__name__,
+        "config": {
+            "pool_size": None,
+            "max_overflow": None,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_recycle": settings.db_pool_recycle,
+            "pre_ping": "always" if settings.db_pool_pre_ping else (
+                f"after {settings.db_pre_ping_idle_seconds}s idle" if settings.db_pre_ping_idle_seconds > 0 else "never"
+            )
+        },
+        "occupancy": {}
+    }
+    if isinstance(pool, QueuePool):
+        per_worker = pool.size() + max(pool._max_overflow, 0)
+        status["config"]["pool_size"] = pool.size()
+        status["config"]["max_overflow"] = pool._max_overflow
+        status["occupancy"] = {
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "status": pool.status()
+        }
+    status["counters"] = pool_stats.snapshot()
+
+    workers = resolve_workers(settings.workers)
+    status["sizing"] = {
+        "workers": workers,
+        "max_connections_per_worker": per_worker,
+        "max_connections_all_workers": per_worker * workers if per_worker is not None else None,
+        "server_max_connections": None
+    }
+    if is_mysql:
+        try:
+            with engine.connect() as conn:
+                row = conn.execute(text("SHOW VARIABLES LIKE 'max_connections'")).fetchone()
+                status["sizing"]["server_max_connections"] = int(row[1]) if row else None
+        except Exception as e:
+            print(f"⚠️ Could not read max_connections: {e}")
+    return status
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -44,10 +291,206 @@ Base = declarative_base()
 
 def get_db() -> Generator:
     """
-    Database dependency for FastAPI
+    Database dependency for FastAPI (write endpoints).
+    Objects stay loaded after commit: every model default is computed in Python
+    and keys come back with the INSERT, so handlers build their response from
+    what they wrote instead of re-SELECTing it.
+    """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# =====================================================
+# READ REPLICA ROUTING
+# =====================================================
+LAST_WRITE_COOKIE = "hms_last_write"
+
+class ReplicaRouter:
+    """
+    Picks a healthy replica engine for read-only requests.
+    Replicas are health-checked at most every `replica_health_check_interval`
+    seconds; unhealthy or lagging replicas are skipped and reads fall back to
+    the primary. Clients that wrote within `read_your_writes_seconds` are kept
+    on the primary so they always see their own changes.
+    """
+
+    def __init__(self, urls):
+        self.replicas = []
+        for url in urls:
+            stats = PoolStats()
+            self.replicas.append({
+                "url": url,
+                "engine": build_engine(url, stats),
+                "pool_stats": stats,
+                "healthy": True,
+                "checked_at": 0.0,
+                "lag_seconds": None,
+                "error": None,
+                "reads": 0
+            })
+        self._lock = threading.Lock()
+        self._next = 0
+        self._last_write = {}  # client key -> time.time() of last write
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def _check(self, replica):
+        try:
+            with replica["engine"].connect() as conn:
+                conn.execute(text("SELECT 1"))
+                lag = None
+                if replica["engine"].dialect.name == "mysql":
+                    try:
+                        row = conn.execute(text("SHOW REPLICA STATUS")).mappings().fetchone()
+                        if row:
+                            lag = row.get("Seconds_Behind_Source")
+                    except Exception:
+                        pass  # Not a replica or no privilege: treat as caught up
+            replica["lag_seconds"] = lag
+            replica["healthy"] = lag is None or lag <= settings.replica_max_lag_seconds
+            replica["error"] = None if replica["healthy"] else f"replication lag {lag}s"
+        except Exception as e:
+            replica["healthy"] = False
+            replica["error"] = str(e)
+        replica["checked_at"] = time.monotonic()
+
+    def _refresh_health(self):
+        now = time.monotonic()
+        for replica in self.replicas:
+            if now - replica["checked_at"] >= settings.replica_health_check_interval:
+                with self._lock:
+                    if now - replica["checked_at"] < settings.replica_health_check_interval:
+                        continue
+                    # Claim the slot so concurrent requests don't all re-check
+                    replica["checked_at"] = now
+                self._check(replica)
+
+    def mark_unhealthy(self, replica, error: Exception):
+        replica["healthy"] = False
+        replica["error"] = str(error)
+        replica["checked_at"] = time.monotonic()
+
+    def pick(self):
+        """Next healthy replica (round-robin), or None to use the primary"""
+        if not self.replicas:
+            return None
+        self._refresh_health()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica["healthy"]:
+                    return replica
+        return None
+
+    @staticmethod
+    def client_key(request) -> str:
+        auth = request.headers.get("authorization") or request.cookies.get("access_token") or ""
+        if auth:
+            return "token:" + auth.split(" ")[-1][-32:]
+        return "ip:" + (request.client.host if request.client else "unknown")
+
+    def record_write(self, request):
+        with self._lock:
+            self._last_write[self.client_key(request)] = time.time()
+            if len(self._last_write) > 10000:
+                cutoff = time.time() - settings.read_your_writes_seconds
+                self._last_write = {k: t for k, t in self._last_write.items() if t >= cutoff}
+
+    def wrote_recently(self, request) -> bool:
+        window = settings.read_your_writes_seconds
+        if window <= 0:
+            return False
+        now = time.time()
+        try:
+            if now - float(request.cookies.get(LAST_WRITE_COOKIE, 0)) < window:
+                return True
+        except ValueError:
+            pass
+        return now - self._last_write.get(self.client_key(request), 0) < window
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "read_your_writes_seconds": settings.read_your_writes_seconds,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "fallbacks": self.fallbacks,
+            "replicas": [{
+                "url": r["engine"].url.render_as_string(hide_password=True),
+                "healthy": r["healthy"],
+                "lag_seconds": r["lag_seconds"],
+                "error": r["error"],
+                "reads": r["reads"],
+                "pool": r["pool_stats"].snapshot()
+            } for r in self.replicas]
+        }
+
+read_router = ReplicaRouter(settings.read_replica_urls)
+
+def begin_write(db) -> None:
+    """
+    SQLite: take the database write lock now (BEGIN IMMEDIATE) rather than at
+    the first INSERT/UPDATE, so a writer waits for a transaction in progress
+    and everything it reads afterwards stays current until commit. MySQL needs
+    nothing - callers lock the rows they depend on (FOR UPDATE / FOR SHARE).
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    conn = db.connection()
+    if not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def begin_read_only(db) -> None:
+    """
+    Start the session's transaction as READ ONLY on MySQL: InnoDB then skips
+    transaction-id and undo bookkeeping, and a stray write fails loudly.
+    SQLite needs nothing - pysqlite only opens a (deferred) transaction before
+    writes, so reads never take a lock.
+    """
+    if db.get_bind().dialect.name == "mysql":
+        db.connection().exec_driver_sql("SET TRANSACTION READ ONLY")
+
+def get_read_db(request: Request) -> Generator:
+    """
+    Database dependency for read-only endpoints (reports, lists).
+    Routes to a healthy replica unless the client wrote recently; falls back to
+    the primary when no replica is healthy or the chosen one can't connect.
+    Runs in a read-only transaction without autoflush.
     """
-    db = SessionLocal()
+    db = None
+    if read_router.enabled:
+        if read_router.wrote_recently(request):
+            read_router.sticky_reads += 1
+        else:
+            replica = read_router.pick()
+            if replica is not None:
+                db = SessionLocal(bind=replica["engine"])
+                try:
+                    db.connection()  # Check out now so a dead replica fails over here
+                    begin_read_only(db)
+                    replica["reads"] += 1
+                    request.state.db_route = "replica"
+                except Exception as e:
+                    print(f"⚠️ Read replica unavailable, using primary: {e}")
+                    read_router.mark_unhealthy(replica, e)
+                    read_router.fallbacks += 1
+                    db.close()
+                    db = None
+    if db is None:
+        read_router.primary_reads += 1
+        request.state.db_route = "primary"
+        db = SessionLocal()
     try:
+        if request.state.db_route == "primary":
+            begin_read_only(db)
         yield db
     finally:
         db.close()
@@ -56,15 +499,24 @@ def create_database_schema():
     """
     Create all tables and database objects
     """
+    # Make sure every model (including doctor_schedules) is registered
+    from . import models  # noqa: F401
+    
     # Create tables from models
     Base.metadata.create_all(bind=engine)
+    add_expense_service_columns()
+    sync_model_indexes()
+    
+    # Archive tables (main database or ARCHIVE_DATABASE_URL)
+    from .services.archive import ensure_archive_schema
+    ensure_archive_schema()
     
     # Add hospital_charges column to doctors table if it doesn't exist
     with engine.connect() as conn:
         try:
-            # Check if hospital_charges column exists
-            result = conn.execute(text("SHOW COLUMNS FROM doctors LIKE 'hospital_charges'")).fetchone()
-            if not result:
+            # Check if hospital_charges column exists (portable across dialects)
+            columns = [c["name"] for c in inspect(conn).get_columns("doctors")]
+            if "hospital_charges" not in columns:
                 print("🔧 Adding hospital_charges column to doctors table...")
                 conn.execute(text("ALTER TABLE doctors ADD COLUMN hospital_charges DECIMAL(10,2) NOT NULL DEFAULT 0.00"))
                 conn.commit()
@@ -72,25 +524,6 @@ def create_database_schema():
         except Exception as e:
             print(f"⚠️ Error adding hospital_charges column: {e}")
     
-    # Create additional tables that are not in models
-    with engine.connect() as conn:
-        # Create doctor_schedules table
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS doctor_schedules (
-                schedule_id INT AUTO_INCREMENT PRIMARY KEY,
-                doctor_id VARCHAR(20) NOT NULL,
-                working_days VARCHAR(255) NOT NULL,
-                start_time TIME NOT NULL,
-                end_time TIME NOT NULL,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_doctor_schedule (doctor_id),
-                FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id) ON DELETE CASCADE
-            )
-        """))
-        conn.commit()
-    
     # Execute additional SQL for views and procedures (MySQL only)
     if is_mysql:
         with engine.connect() as conn:
@@ -99,6 +532,79 @@ def create_database_schema():
             # Create stored procedures
             create_stored_procedures(conn)
 
+# Indexes replaced by a wider one that starts with the same columns
+RETIRED_INDEXES = {
+    "appointments": ["idx_appointment_date", "idx_patient"],
+    "bills": ["idx_bill_date", "idx_bill_date_status"],
+}
+
+def sync_model_indexes():
+    """
+    create_all() leaves existing tables alone, so add model indexes that an
+    older database is missing and drop the retired ones
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    print(f"🔧 Creating index {index.name} on {table.name}...")
+                    index.create(bind=conn)
+            for name in RETIRED_INDEXES.get(table.name, []):
+                if name in existing:
+                    print(f"🔧 Dropping superseded index {name} on {table.name}")
+                    conn.execute(text(f"DROP INDEX {name}" if is_sqlite else f"DROP INDEX {name} ON {table.name}"))
+
+def add_expense_service_columns():
+    """
+    Add service_id and service_date to an additional_expenses table created
+    before they existed. service_date is backfilled from created_at and service_id from the
+    catalog service whose name equals service_type, one expense_id range per
+    transaction so a large table is not rewritten in a single statement.
+    """
+    with engine.connect() as conn:
+        inspector = inspect(conn)
+        if "additional_expenses" not in inspector.get_table_names():
+            return
+        if "service_date" in {c["name"] for c in inspector.get_columns("additional_expenses")}:
+            return
+
+    print("🔧 Adding service_id and service_date to additional_expenses...")
+    with engine.begin() as conn:
+        if is_sqlite:
+            conn.execute(text(
+                "ALTER TABLE additional_expenses ADD COLUMN service_id INTEGER "
+                "REFERENCES services(id) ON DELETE SET NULL"
+            ))
+        else:
+            conn.execute(text("ALTER TABLE additional_expenses ADD COLUMN service_id INTEGER NULL"))
+        conn.execute(text("ALTER TABLE additional_expenses ADD COLUMN service_date DATE NULL"))
+
+    with engine.connect() as conn:
+        lo, hi = conn.execute(text("SELECT MIN(expense_id), MAX(expense_id) FROM additional_expenses")).one()
+    step = settings.reconcile_chunk_size
+    if lo is not None:
+        for start in range(lo, hi + 1, step):
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "UPDATE additional_expenses SET service_date = DATE(created_at), "
+                    "service_id = (SELECT MIN(s.id) FROM services s WHERE s.name = additional_expenses.service_type) "
+                    "WHERE expense_id BETWEEN :lo AND :hi"
+                ), {"lo": start, "hi": start + step - 1})
+
+    if not is_sqlite:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE additional_expenses MODIFY service_date DATE NOT NULL"))
+            conn.execute(text(
+                "ALTER TABLE additional_expenses ADD CONSTRAINT fk_expense_service "
+                "FOREIGN KEY (service_id) REFERENCES services(id) ON DELETE SET NULL"
+            ))
+    print("✅ service_id and service_date added to additional_expenses")
+
 def create_views(conn):
     """Create database views for reporting (MySQL only)"""
     
@@ -210,7 +716,7 @@ def create_stored_procedures(conn):
         except:
             pass
     
-    # Procedure 1: Generate Token Number
+    # Procedure 1: Generate Token Number (counters left at 0 or below restart at 1)
     conn.execute(text("""
         CREATE PROCEDURE sp_generate_token(
             IN p_doctor_id VARCHAR(20),
@@ -221,9 +727,11 @@ def create_stored_procedures(conn):
             DECLARE v_token_count INT;
             
             -- Get or create token counter for doctor and date
-            INSERT INTO token_counter (doctor_id, token_date, last_token_number)
-            VALUES (p_doctor_id, p_appointment_date, 0)
-            ON DUPLICATE KEY UPDATE last_token_number = last_token_number + 1;
+            INSERT INTO token_counter (doctor_id, token_date, last_token_number, created_at, updated_at)
+            VALUES (p_doctor_id, p_appointment_date, 1, UTC_TIMESTAMP(), UTC_TIMESTAMP())
+            ON DUPLICATE KEY UPDATE
+                last_token_number = GREATEST(last_token_number, 0) + 1,
+                updated_at = UTC_TIMESTAMP();
             
             -- Get the current token number
             SELECT last_token_number INTO v_token_count
@@ -239,56 +747,87 @@ def create_stored_procedures(conn):
         END
     """))
     
-    # Procedure 2: Create Appointment with Bill
+    # Procedure 2: Create Appointment with Bill (the BOOKING_STORED_PROCEDURE path
+    # of services/booking.py). Runs in the caller's transaction, which commits;
+    # refusals are SIGNALed and the booking comes back as one result row.
     conn.execute(text("""
         CREATE PROCEDURE sp_create_appointment_with_bill(
             IN p_patient_id INT,
             IN p_doctor_id VARCHAR(20),
             IN p_appointment_date DATE,
-            IN p_hospital_charges DECIMAL(10,2),
-            IN p_admin_id INT,
-            OUT p_appointment_id INT,
-            OUT p_bill_id INT,
-            OUT p_token_number VARCHAR(50)
+            IN p_admin_id INT
         )
         BEGIN
+            DECLARE v_patient_name VARCHAR(100);
+            DECLARE v_doctor_name VARCHAR(100);
             DECLARE v_doctor_charges DECIMAL(10,2);
+            DECLARE v_hospital_charges DECIMAL(10,2);
             DECLARE v_total_amount DECIMAL(10,2);
+            DECLARE v_token_number VARCHAR(50);
+            DECLARE v_appointment_id INT;
+            DECLARE v_message VARCHAR(128);
+            DECLARE v_now DATETIME DEFAULT UTC_TIMESTAMP();
+            
+            SELECT patient_name INTO v_patient_name
+            FROM patients
+            WHERE patient_id = p_patient_id;
+            IF v_patient_name IS NULL THEN
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Patient not found';
+            END IF;
             
-            -- Get doctor consultation charges
-            SELECT consultation_charges INTO v_doctor_charges
+            -- Doctor's charges (hospital charges are per doctor)
+            SELECT doctor_name, consultation_charges, hospital_charges
+            INTO v_doctor_name, v_doctor_charges, v_hospital_charges
             FROM doctors
             WHERE doctor_id = p_doctor_id AND status = 'Active';
+            IF v_doctor_name IS NULL THEN
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Doctor not found or inactive';
+            END IF;
+            
+            -- Generate token (the counter row stays locked until commit)
+            CALL sp_generate_token(p_doctor_id, p_appointment_date, v_token_number);
             
-            -- Generate token
-            CALL sp_generate_token(p_doctor_id, p_appointment_date, p_token_number);
+            -- Locking read: waits for a close of the day in progress, then sees its marker
+            IF EXISTS (
+                SELECT 1 FROM day_closes WHERE close_date = p_appointment_date LOCK IN SHARE MODE
+            ) THEN
+                SET v_message = CONCAT('Day ', p_appointment_date, ' is closed; reopen it before editing');
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = v_message;
+            END IF;
             
             -- Create appointment
             INSERT INTO appointments (
-                patient_id, doctor_id, appointment_date, token_number, 
-                doctor_charges, hospital_charges, created_by
+                patient_id, doctor_id, appointment_date, appointment_time, token_number,
+                doctor_charges, hospital_charges, status, created_by, created_at
             )
             VALUES (
-                p_patient_id, p_doctor_id, p_appointment_date, p_token_number,
-                v_doctor_charges, p_hospital_charges, p_admin_id
+                p_patient_id, p_doctor_id, p_appointment_date, v_now, v_token_number,
+                v_doctor_charges, v_hospital_charges, 'Scheduled', p_admin_id, v_now
             );
             
-            SET p_appointment_id = LAST_INSERT_ID();
+            SET v_appointment_id = LAST_INSERT_ID();
             
             -- Calculate total
-            SET v_total_amount = v_doctor_charges + p_hospital_charges;
+            SET v_total_amount = v_doctor_charges + v_hospital_charges;
             
             -- Create bill
             INSERT INTO bills (
-                appointment_id, bill_date, doctor_charges, hospital_charges,
-                additional_expenses_total, subtotal, total_amount, created_by
+                appointment_id, bill_date, bill_time, doctor_charges, hospital_charges,
+                additional_expenses_total, subtotal, total_amount, payment_status, created_by, created_at
             )
             VALUES (
-                p_appointment_id, p_appointment_date, v_doctor_charges, p_hospital_charges,
-                0, v_total_amount, v_total_amount, p_admin_id
+                v_appointment_id, p_appointment_date, v_now, v_doctor_charges, v_hospital_charges,
+                0, v_total_amount, v_total_amount, 'Pending', p_admin_id, v_now
             );
             
-            SET p_bill_id = LAST_INSERT_ID();
+            SELECT
+                v_appointment_id AS appointment_id,
+                LAST_INSERT_ID() AS bill_id,
+                v_token_number AS token_number,
+                v_patient_name AS patient_name,
+                v_doctor_name AS doctor_name,
+                v_doctor_charges AS doctor_charges,
+                v_hospital_charges AS hospital_charges;
         END
     """))
     
@@ -302,8 +841,8 @@ def create_stored_procedures(conn):
         )
         BEGIN
             -- Add expense
-            INSERT INTO additional_expenses (appointment_id, service_type, service_description, amount)
-            VALUES (p_appointment_id, p_service_type, p_service_description, p_amount);
+            INSERT INTO additional_expenses (appointment_id, service_type, service_description, amount, service_date)
+            VALUES (p_appointment_id, p_service_type, p_service_description, p_amount, CURDATE());
             
             -- Update bill totals
             UPDATE bills
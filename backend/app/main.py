@@ -1,25 +1,52 @@
 # main.py - Hospital Management System FastAPI Backend
 # Run: uvicorn main:app --reload --port 8000
 
-from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
+from sqlalchemy import func, text, DateTime
 from typing import Optional, List
 from datetime import date, datetime, timedelta
 import os
+import time
 from pathlib import Path
 
 # Import our modules
-from .database import get_db, create_database_schema, test_connection
+from .database import get_db, get_read_db, begin_write, read_router, LAST_WRITE_COOKIE, create_database_schema, test_connection, get_pool_status
 from .config import settings
 from .models import *
 from .schemas import *
 from .schemas.bill import PaymentStatusUpdate
 from .models.voucher import Voucher, VoucherType, VoucherStatus
 from .schemas.voucher import VoucherCreate, VoucherUpdate, VoucherResponse, VoucherSummary, DoctorPaymentSummary
+from .services.timeseries import build_timeseries, METRICS as TIMESERIES_METRICS, BUCKETS as TIMESERIES_BUCKETS
+from .services.report_cache import report_cache
+from .services.reports import report_summary, report_doctor_wise, report_service_wise
+from .services.startup import run_once
+from .services.patients import insert_patient, get_or_create_patient, PatientExists
+from .services.patient_history import load_history, history_cache
+from .services.doctor_load import doctors_with_today_stats
+from .services.etags import etag_probe_for, etag_matches, etag_stats
+from .services.coalesce import coalesce, coalescing_stats
+from .services import receipts
+from .services.day_close import close_day, reopen_day, list_closes, ensure_open, lock_for_edit, DayClosedError
+from .services.bill_reconcile import refresh_bill_totals
+from .services.booking import book_appointment, BookingError
+from .services.archive import archive_status, run_archival
+from .services.jobs import job_runner, fail_orphaned_jobs, read_status as read_job_status, JobError
+from .services.patient_import import (
+    receive_part, read_status, errors_path, fail_interrupted_imports, PatientImportError
+)
+from .services.audit import (
+    audit_writer, audit_context, annotate_audit, describe_route, client_ip,
+    MUTATING_METHODS as AUDIT_METHODS, SKIPPED_PATHS as AUDIT_SKIPPED_PATHS
+)
+from .services.audit_partitions import ensure_partitions, list_partitions, apply_retention
+from .services import table_partitions
+from .services.idempotency import idempotency_store, is_idempotent_route, IDEMPOTENCY_HEADER, REPLAYED_HEADER
 
 # Import JWT only
 from jose import jwt
@@ -34,13 +61,98 @@ app = FastAPI(
     debug=settings.debug
 )
 
-# Add CORS middleware
+# Keep clients that just wrote on the primary (read-your-writes for replica reads)
+@app.middleware("http")
+async def track_client_writes(request: Request, call_next):
+    response = await call_next(request)
+    if read_router.enabled and request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400:
+        read_router.record_write(request)
+        response.set_cookie(
+            LAST_WRITE_COOKIE, str(time.time()),
+            max_age=max(settings.read_your_writes_seconds, 1), httponly=True, samesite="lax"
+        )
+    return response
+
+# Audit every successful mutating API call (actor, route, record, IP) via the buffered writer
+@app.middleware("http")
+async def audit_mutations(request: Request, call_next):
+    if (not settings.audit_enabled or request.method not in AUDIT_METHODS
+            or not request.url.path.startswith("/api/") or request.url.path in AUDIT_SKIPPED_PATHS):
+        return await call_next(request)
+    
+    ctx = {}
+    token = audit_context.set(ctx)
+    try:
+        response = await call_next(request)
+    finally:
+        audit_context.reset(token)
+    
+    if response.status_code < 400:
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", request.url.path)
+        path_params = request.scope.get("path_params") or {}
+        action, table, record_id = describe_route(request.method, route_path, path_params)
+        
+        auth = request.headers.get("authorization") or request.cookies.get("access_token")
+        user = get_current_user(auth if not auth or auth.startswith("Bearer ") else f"Bearer {auth}")
+        
+        description = ctx.get("description") or f"{request.method} {request.url.path}"
+        if path_params and record_id is None:
+            description += f" ({', '.join(f'{k}={v}' for k, v in path_params.items())})"
+        audit_writer.enqueue(
+            admin_id=ctx.get("admin_id", user["admin_id"] if user else None),
+            action=ctx.get("action", action),
+            table=ctx.get("table", table),
+            record_id=ctx.get("record_id", record_id),
+            description=description,
+            ip_address=client_ip(request)
+        )
+    return response
+
+# Idempotency-Key on booking/expense/payment writes: retries replay the first response.
+# Registered after the audit middleware so it runs outside it and replays are not audited twice.
+@app.middleware("http")
+async def idempotent_writes(request: Request, call_next):
+    if IDEMPOTENCY_HEADER not in request.headers or not is_idempotent_route(request.method, request.url.path):
+        return await call_next(request)
+    return await idempotency_store.handle(request, call_next)
+
+# Conditional GET: weak ETags from a cheap version probe, 304 without running the handler
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    compute_etag = etag_probe_for(request.url.path, request.query_params) if request.method == "GET" else None
+    if compute_etag is None:
+        return await call_next(request)
+    
+    try:
+        etag = await run_in_threadpool(compute_etag)
+    except Exception as e:
+        print(f"⚠️ ETag probe failed for {request.url.path}: {e}")
+        etag_stats.probe_errors += 1
+        etag = None
+    if etag is None:
+        return await call_next(request)
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        etag_stats.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        # Let browsers keep the body but revalidate every time
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# Add CORS middleware last: it wraps everything above, so 304s and idempotent
+# replays carry the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REPLAYED_HEADER],
 )
 
 # Mount static files (frontend)
@@ -54,77 +166,64 @@ async def startup_event():
     """Initialize database and check connection"""
     if not test_connection():
         raise Exception("Failed to connect to database")
-    
+
     try:
-        create_database_schema()
-        print("✅ Database schema initialized successfully")
+        # Only the first worker of a production launch runs the schema checks
+        if run_once("schema", create_database_schema):
+            print("✅ Database schema initialized successfully")
     except Exception as e:
         print(f"⚠️ Database schema initialization warning: {e}")
         # Continue anyway as tables might already exist
 
+    if settings.audit_partitioning:
+        try:
+            run_once("audit-partitions", ensure_partitions)
+        except Exception as e:
+            print(f"⚠️ Audit log partition maintenance warning: {e}")
+
+    if settings.clinical_partitioning:
+        try:
+            run_once("clinical-partitions", table_partitions.maintain_partitions)
+        except Exception as e:
+            print(f"⚠️ Appointment/bill partition maintenance warning: {e}")
+
+    try:
+        run_once("idempotency-purge", idempotency_store.purge_expired)
+    except Exception as e:
+        print(f"⚠️ Idempotency key purge warning: {e}")
+    
+    # Import threads do not survive a restart
+    run_once("patient-imports", fail_interrupted_imports)
+    # ... nor do job dispatchers and their pool processes
+    run_once("jobs", fail_orphaned_jobs)
+    
+    audit_writer.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush queued audit events and stop job/receipt processes before the worker exits"""
+    audit_writer.stop()
+    job_runner.shutdown()
+    receipts.shutdown_pool()
+
 # =====================================================
 # UTILITY FUNCTIONS
 # =====================================================
-def generate_token_number(db: Session, doctor_id: str, appointment_date: date) -> str:
-    """Generate token number using database procedure or fallback method"""
-    # Skip stored procedure for now to use our custom logic
-    # try:
-    #     # Try to use stored procedure first
-    #     result = db.execute(
-    #         text("CALL sp_generate_token(:doctor_id, :appointment_date, @token_number)"),
-    #         {"doctor_id": doctor_id, "appointment_date": appointment_date}
-    #     )
-    #     token_result = db.execute(text("SELECT @token_number")).fetchone()
-    #     if token_result and token_result[0]:
-    #         return token_result[0]
-    # except Exception as e:
-    #     print(f"Stored procedure failed, using fallback: {e}")
-    
-    print(f"🔍 Generating token for doctor {doctor_id} on {appointment_date}")
-    
-    # Fallback method
-    counter = db.query(TokenCounter).filter(
-        TokenCounter.doctor_id == doctor_id,
-        TokenCounter.token_date == appointment_date
-    ).first()
-    
-    print(f"🔍 Looking for existing counter for doctor {doctor_id} on {appointment_date}")
-    
-    if counter:
-        print(f"🔍 Found existing counter with last_token_number: {counter.last_token_number}")
-        
-        # Fix any counter that has 0 or negative value
-        if counter.last_token_number <= 0:
-            print(f"🔍 WARNING: Counter had invalid value {counter.last_token_number}, resetting to 0")
-            counter.last_token_number = 0
-        
-        # Increment the counter for existing record
-        counter.last_token_number += 1
-        token_num = counter.last_token_number
-        print(f"🔍 Existing counter found, incremented to: {token_num}")
-    else:
-        print(f"🔍 No existing counter found, creating new one")
-        # Create new counter starting from 1 (not 0)
-        counter = TokenCounter(
-            doctor_id=doctor_id,
-            token_date=appointment_date,
-            last_token_number=1
-        )
-        db.add(counter)
-        token_num = 1
-        print(f"🔍 New counter created, starting at: {token_num}")
-    
-    # Final safety check - ensure token number is never 0
-    if token_num <= 0:
-        print(f"🔍 CRITICAL: Token number was {token_num}, forcing to 1")
-        token_num = 1
-        counter.last_token_number = 1
-    
-    db.commit()
-    date_str = appointment_date.strftime("%Y%m%d")
-    token_string = f"{doctor_id}-{date_str}-{token_num:03d}"
-    print(f"🔍 Generated token: {token_string}")
-    return token_string
+def ensure_day_open(db: Session, *days):
+    """409 if a write would change a closed day's financials; lock the rows being written first"""
+    try:
+        ensure_open(db, *days, lock=True)
+    except DayClosedError as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+def lock_day_for_edit(db: Session, appointment_id: int, *days):
+    """Lock the appointment's bill; 409 if the write would change a closed day's financials"""
+    try:
+        lock_for_edit(db, appointment_id, *days)
+    except DayClosedError as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 # Debug endpoint to reset token counters
 @app.post("/api/debug/reset-token-counters")
@@ -140,8 +239,8 @@ def reset_token_counters(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error resetting counters: {str(e)}")
 
 def log_action(db: Session, admin_id: int, action: str, table: str = None, record_id: int = None, desc: str = None):
-    """Log system action for audit trail"""
-    SystemLog.log_action(db, admin_id, action, table, record_id, desc)
+    """Log system action for audit trail (queued; written in bulk off the request path)"""
+    audit_writer.enqueue(admin_id, action, table, record_id, desc)
 
 def get_current_user(authorization: str = None):
     """Get current user from JWT token (optional for frontend routes)"""
@@ -322,9 +421,164 @@ def api_info():
 def health_check():
     return {"status": "ok", "message": "HMS API is running", "timestamp": datetime.now().isoformat()}
 
+# --- Admin: Connection Pool Statistics ---
+@app.get("/api/admin/db-pool")
+def get_db_pool_stats():
+    """Pool sizing, occupancy, waits/timeouts and connection ages for the serving worker"""
+    return get_pool_status()
+
+@app.get("/api/admin/audit")
+def get_audit_writer_stats():
+    """Audit queue depth and writer counters for the serving worker"""
+    return audit_writer.stats()
+
+@app.get("/api/admin/audit/partitions")
+def get_audit_partitions():
+    """system_logs partitions (or monthly tables) and which have passed retention"""
+    try:
+        return {
+            "enabled": settings.audit_partitioning,
+            "retention_months": settings.audit_retention_months,
+            "partitions": list_partitions()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing audit partitions: {str(e)}")
+
+@app.post("/api/admin/audit/retention")
+def run_audit_retention(dry_run: bool = Query(False)):
+    """Archive expired audit months to compressed NDJSON and drop their partitions"""
+    if not settings.audit_partitioning:
+        raise HTTPException(status_code=400, detail="Audit log partitioning is not enabled")
+    try:
+        created = [] if dry_run else ensure_partitions()
+        return {"dry_run": dry_run, "created": created, "archived": apply_retention(dry_run)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error applying audit retention: {str(e)}")
+
+@app.get("/api/admin/history-cache")
+def get_history_cache_stats():
+    """Patient history cache occupancy and hit counters for the serving worker"""
+    return history_cache.stats()
+
+@app.get("/api/admin/idempotency")
+def get_idempotency_stats():
+    """Idempotency-Key replay counters and cached keys for the serving worker"""
+    return idempotency_store.stats()
+
+@app.get("/api/admin/etags")
+def get_etag_stats():
+    """Conditional GET resources and 304 counters for the serving worker"""
+    return etag_stats.as_dict()
+
+@app.get("/api/admin/coalescing")
+def get_coalescing_stats():
+    """Single-flight executions vs. coalesced waiters per endpoint for the serving worker"""
+    return coalescing_stats()
+
+@app.get("/api/admin/db-replicas")
+def get_db_replica_status():
+    """Read replica health, lag and routing counters for the serving worker"""
+    return read_router.status()
+
+@app.post("/api/admin/day-close")
+def run_day_close(request: Optional[dict] = None, db: Session = Depends(get_db)):
+    """Close a day (default today): settle stale appointments, snapshot totals, lock bills"""
+    try:
+        day = date.fromisoformat(request["date"]) if request and request.get("date") else date.today()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    try:
+        result = close_day(db, day)
+    except DayClosedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error closing day: {str(e)}")
+    report_cache.invalidate(day)
+    history_cache.invalidate(*result.pop("patient_ids"))
+    print(f"✅ Day {day} closed: {result['stale_completed']} completed, {result['stale_no_show']} no-show")
+    return result
+
+@app.post("/api/admin/bills/reconcile", status_code=202)
+def run_bill_reconcile(
+    fix: bool = Query(False),
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    sample_size: int = Query(1000, ge=0, le=100000)
+):
+    """Queue a bill integrity check (fix=true rewrites mismatches); poll /api/jobs/{job_id}"""
+    try:
+        status = job_runner.submit("bill_reconcile", {
+            "fix": fix, "start_id": start_id, "end_id": end_id, "sample_size": sample_size
+        })
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    status["status_url"] = f"/api/jobs/{status['job_id']}"
+    return status
+
+@app.get("/api/admin/archive")
+def get_archive_status():
+    """Archive boundary, configured horizon and how many appointments are due to move"""
+    try:
+        return archive_status()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading archive status: {str(e)}")
+
+@app.post("/api/admin/archive", status_code=202)
+def run_archive(dry_run: bool = Query(False), cutoff: Optional[date] = None):
+    """Queue archival of appointments (with bills and expenses) dated before the horizon"""
+    if dry_run:
+        return run_archival(dry_run=True, cutoff=cutoff)
+    try:
+        status = job_runner.submit("archive", {"cutoff": cutoff.isoformat() if cutoff else None})
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    status["status_url"] = f"/api/jobs/{status['job_id']}"
+    return status
+
+@app.get("/api/admin/partitions")
+def get_table_partitions():
+    """Monthly partitions of appointments and bills (MySQL)"""
+    try:
+        return {
+            "enabled": table_partitions.is_enabled(),
+            "partitions_ahead": settings.clinical_partitions_ahead,
+            "merge_before": table_partitions.merge_horizon().isoformat(),
+            "tables": table_partitions.list_partitions()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing partitions: {str(e)}")
+
+@app.post("/api/admin/partitions", status_code=202)
+def run_partition_maintenance(convert: bool = Query(False)):
+    """Queue partition maintenance; convert=true also partitions tables that are not yet"""
+    if not table_partitions.is_enabled():
+        raise HTTPException(status_code=400, detail="Partitioning is not enabled (MySQL with CLINICAL_PARTITIONING=true)")
+    try:
+        status = job_runner.submit("clinical_partitions", {"convert": convert})
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    status["status_url"] = f"/api/jobs/{status['job_id']}"
+    return status
+
+@app.get("/api/admin/day-close")
+def get_day_closes(limit: int = Query(30, ge=1, le=366), db: Session = Depends(get_read_db)):
+    """Most recent closed days with their snapshot totals"""
+    return list_closes(db, limit)
+
+@app.delete("/api/admin/day-close/{day}")
+def reopen_closed_day(day: date, db: Session = Depends(get_db)):
+    """Reopen a closed day for corrections; reports read raw rows again until it is re-closed"""
+    try:
+        reopen_day(db, day)
+    except DayClosedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    report_cache.invalidate(day)
+    return {"message": f"Day {day.isoformat()} reopened"}
+
 # --- Dashboard Stats ---
 @app.get("/api/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+@coalesce("dashboard_stats")
+def get_dashboard_stats(db: Session = Depends(get_read_db)):
     today = date.today()
     return {
         "total_patients": db.query(Patient).count(),
@@ -344,7 +598,7 @@ def get_patients(
     search: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     try:
         query = db.query(Patient)
@@ -376,14 +630,37 @@ def get_patients(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/patients/{patient_id}", response_model=PatientResponse)
-def get_patient(patient_id: int, db: Session = Depends(get_db)):
+def get_patient(patient_id: int, db: Session = Depends(get_read_db)):
     patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
 
+@app.get("/api/patients/{patient_id}/history")
+def get_patient_history(
+    patient_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    before_date: Optional[date] = Query(None, description="Visit date cursor from the previous page"),
+    before_id: Optional[int] = Query(None, description="Appointment id cursor from the previous page"),
+    db: Session = Depends(get_read_db)
+):
+    """Visits newest first with doctor, bill and additional expenses (three queries per page)"""
+    key = (limit, before_date, before_id)
+    cached = history_cache.get(patient_id, key)
+    if cached is not None:
+        return cached
+    try:
+        page = load_history(db, patient_id, limit, before_date, before_id)
+    except Exception as e:
+        print(f"Error loading patient history: {e}")
+        raise HTTPException(status_code=500, detail=f"Error loading patient history: {str(e)}")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    history_cache.put(patient_id, key, page)
+    return page
+
 @app.get("/api/patients/nic/{nic}")
-def get_patient_by_nic(nic: str, db: Session = Depends(get_db)):
+def get_patient_by_nic(nic: str, db: Session = Depends(get_read_db)):
     patient = db.query(Patient).filter(Patient.nic == nic).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -392,41 +669,74 @@ def get_patient_by_nic(nic: str, db: Session = Depends(get_db)):
 @app.post("/api/patients")
 def create_patient(patient: PatientCreate, db: Session = Depends(get_db)):
     try:
-        # Check if NIC already exists
-        existing = db.query(Patient).filter(Patient.nic == patient.nic).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Patient with this NIC already exists")
-        
-        db_patient = Patient(
-            patient_name=patient.patient_name,
-            age=patient.age,
-            phone_number=patient.phone_number,
-            gender=patient.gender,  # Now using string directly
-            nic=patient.nic,
-            registration_date=patient.registration_date or date.today()
-        )
-        db.add(db_patient)
-        db.commit()
-        db.refresh(db_patient)
-        
-        # Return as dict to avoid serialization issues
-        return {
-            "patient_id": db_patient.patient_id,
-            "patient_name": db_patient.patient_name,
-            "age": db_patient.age,
-            "phone_number": db_patient.phone_number,
-            "gender": db_patient.gender,  # Now string directly
-            "nic": db_patient.nic,
-            "registration_date": db_patient.registration_date.isoformat(),
-            "created_at": db_patient.created_at.isoformat(),
-            "updated_at": db_patient.updated_at.isoformat(),
-            "message": "Patient created successfully"
-        }
+        created = insert_patient(db, patient)
+    except PatientExists as e:
+        return JSONResponse(status_code=409, content={
+            "detail": "Patient with this NIC already exists",
+            "patient_id": e.patient.patient_id
+        })
     except Exception as e:
         print(f"Error creating patient: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create patient: {str(e)}")
 
+    report_cache.invalidate(date.fromisoformat(created["registration_date"]))
+    annotate_audit(record_id=created["patient_id"])
+    return {**created, "message": "Patient created successfully"}
+
+@app.post("/api/patients/get-or-create")
+def get_or_create_patient_by_nic(patient: PatientCreate, response: Response, db: Session = Depends(get_db)):
+    """Walk-in registration: returns the patient holding this NIC, registering them if new"""
+    try:
+        result, created = get_or_create_patient(db, patient)
+    except Exception as e:
+        print(f"Error in get-or-create patient: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to register patient: {str(e)}")
+
+    if created:
+        response.status_code = 201
+        report_cache.invalidate(date.fromisoformat(result["registration_date"]))
+        annotate_audit(record_id=result["patient_id"])
+    else:
+        # Nothing was written: record the lookup as a read, not a CREATE
+        annotate_audit(action="READ", record_id=result["patient_id"], description="NIC matched an existing patient")
+    return {**result, "created": created}
+
+@app.post("/api/patients/import", status_code=202)
+async def import_patients(
+    file: UploadFile = File(...),
+    job_id: Optional[str] = Query(None, description="Append this part to an existing upload"),
+    final: bool = Query(True, description="Last part: start the import once received")
+):
+    """Bulk CSV import (patient_name, age, phone_number, gender, nic[, registration_date]), upserted by NIC"""
+    try:
+        return await receive_part(file, job_id, final)
+    except PatientImportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        print(f"Error receiving patient import: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to receive import: {str(e)}")
+
+@app.get("/api/patients/import/{job_id}")
+def get_patient_import_status(job_id: str):
+    """Progress and counters for a bulk import (first rejected rows included)"""
+    try:
+        return read_status(job_id)
+    except PatientImportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.get("/api/patients/import/{job_id}/errors")
+def get_patient_import_errors(job_id: str):
+    """Full per-row error report as CSV"""
+    try:
+        path = errors_path(job_id)
+    except PatientImportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Error report not available yet")
+    return FileResponse(path, media_type="text/csv", filename=f"patient-import-{job_id}-errors.csv")
+
 @app.put("/api/patients/{patient_id}", response_model=PatientResponse)
 def update_patient(patient_id: int, patient: PatientUpdate, db: Session = Depends(get_db)):
     db_patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
@@ -438,7 +748,7 @@ def update_patient(patient_id: int, patient: PatientUpdate, db: Session = Depend
         setattr(db_patient, key, value)
     
     db.commit()
-    db.refresh(db_patient)
+    history_cache.invalidate(patient_id)
     return db_patient
 
 @app.delete("/api/patients/{patient_id}")
@@ -451,8 +761,11 @@ def delete_patient(patient_id: int, db: Session = Depends(get_db)):
     if db.query(Appointment).filter(Appointment.patient_id == patient_id).first():
         raise HTTPException(status_code=400, detail="Cannot delete patient with existing appointments")
     
+    registration_date = db_patient.registration_date
     db.delete(db_patient)
     db.commit()
+    report_cache.invalidate(registration_date)
+    history_cache.invalidate(patient_id)
     return {"message": "Patient deleted successfully"}
 
 # =====================================================
@@ -462,9 +775,15 @@ def delete_patient(patient_id: int, db: Session = Depends(get_db)):
 def get_doctors(
     specialization: Optional[str] = None,
     status: Optional[str] = "Active",
-    db: Session = Depends(get_db)
+    include: Optional[str] = Query(None, description="Comma-separated extras: today_stats"),
+    db: Session = Depends(get_read_db)
 ):
     try:
+        extras = {part.strip() for part in include.split(",")} if include else set()
+        if "today_stats" in extras:
+            # Booked/completed/cancelled, last token and remaining capacity in one query
+            return doctors_with_today_stats(db, status, specialization)
+
         query = db.query(Doctor)
         if status:
             query = query.filter(Doctor.status == status)
@@ -491,7 +810,7 @@ def get_doctors(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/doctors/specializations")
-def get_specializations(db: Session = Depends(get_db)):
+def get_specializations(db: Session = Depends(get_read_db)):
     specs = db.query(Doctor.specialization).distinct().all()
     return [s[0] for s in specs if s[0]]
 
@@ -499,7 +818,7 @@ def get_specializations(db: Session = Depends(get_db)):
 # DOCTOR SCHEDULES ENDPOINTS (moved before parameterized routes)
 # =====================================================
 @app.get("/api/doctors/schedules")
-def get_all_doctor_schedules(db: Session = Depends(get_db)):
+def get_all_doctor_schedules(db: Session = Depends(get_read_db)):
     try:
         print("🔍 Getting all doctor schedules...")
         # Get all doctor schedules with doctor information
@@ -517,7 +836,7 @@ def get_all_doctor_schedules(db: Session = Depends(get_db)):
             JOIN doctors d ON ds.doctor_id = d.doctor_id
             WHERE d.status = 'Active'
             ORDER BY d.doctor_name
-        """)).fetchall()
+        """).columns(created_at=DateTime)).fetchall()
         
         print(f"🔍 Found {len(schedules)} schedules")
         
@@ -585,7 +904,7 @@ def save_doctor_schedule(schedule_data: dict, db: Session = Depends(get_db)):
             db.execute(text("""
                 UPDATE doctor_schedules 
                 SET working_days = :working_days, start_time = :start_time, 
-                    end_time = :end_time, notes = :notes, updated_at = NOW()
+                    end_time = :end_time, notes = :notes, updated_at = CURRENT_TIMESTAMP
                 WHERE doctor_id = :doctor_id
             """), {
                 "doctor_id": doctor_id,
@@ -600,7 +919,7 @@ def save_doctor_schedule(schedule_data: dict, db: Session = Depends(get_db)):
             # Create new schedule
             db.execute(text("""
                 INSERT INTO doctor_schedules (doctor_id, working_days, start_time, end_time, notes, created_at)
-                VALUES (:doctor_id, :working_days, :start_time, :end_time, :notes, NOW())
+                VALUES (:doctor_id, :working_days, :start_time, :end_time, :notes, CURRENT_TIMESTAMP)
             """), {
                 "doctor_id": doctor_id,
                 "working_days": working_days,
@@ -611,6 +930,7 @@ def save_doctor_schedule(schedule_data: dict, db: Session = Depends(get_db)):
             message = "Schedule created successfully"
         
         db.commit()
+        annotate_audit(table="doctor_schedules", description=f"{message} for {doctor_id}")
         print(f"✅ {message}")
         return {"message": message}
         
@@ -620,7 +940,7 @@ def save_doctor_schedule(schedule_data: dict, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @app.get("/api/doctors/{doctor_id}/schedule")
-def get_doctor_schedule(doctor_id: str, db: Session = Depends(get_db)):
+def get_doctor_schedule(doctor_id: str, db: Session = Depends(get_read_db)):
     schedule = db.execute(text("""
         SELECT * FROM doctor_schedules WHERE doctor_id = :doctor_id
     """), {"doctor_id": doctor_id}).fetchone()
@@ -665,7 +985,7 @@ def delete_doctor_schedule(doctor_id: str, db: Session = Depends(get_db)):
     return {"message": "Schedule deleted successfully"}
 
 @app.get("/api/doctors/{doctor_id}", response_model=DoctorResponse)
-def get_doctor(doctor_id: str, db: Session = Depends(get_db)):
+def get_doctor(doctor_id: str, db: Session = Depends(get_read_db)):
     doctor = db.query(Doctor).filter(Doctor.doctor_id == doctor_id).first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
@@ -688,7 +1008,7 @@ def create_doctor(doctor: DoctorCreate, db: Session = Depends(get_db)):
         )
         db.add(db_doctor)
         db.commit()
-        db.refresh(db_doctor)
+        annotate_audit(description=f"Created doctor {db_doctor.doctor_id}")
         
         # Return as dict
         return {
@@ -718,7 +1038,6 @@ def update_doctor(doctor_id: str, doctor: DoctorUpdate, db: Session = Depends(ge
         setattr(db_doctor, key, value)
     
     db.commit()
-    db.refresh(db_doctor)
     return db_doctor
 
 @app.delete("/api/doctors/{doctor_id}")
@@ -762,7 +1081,7 @@ def get_appointments(
     patient_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(Appointment)
     
@@ -808,15 +1127,15 @@ def get_appointments(
     return result
 
 @app.get("/api/appointments/today")
-def get_today_appointments(db: Session = Depends(get_db)):
+def get_today_appointments(db: Session = Depends(get_read_db)):
     return get_appointments(date_from=date.today(), date_to=date.today(), db=db)
 
 @app.get("/api/appointments/doctor/{doctor_id}/today")
-def get_doctor_today_appointments(doctor_id: str, db: Session = Depends(get_db)):
+def get_doctor_today_appointments(doctor_id: str, db: Session = Depends(get_read_db)):
     return get_appointments(doctor_id=doctor_id, date_from=date.today(), date_to=date.today(), db=db)
 
 @app.get("/api/appointments/{appointment_id}")
-def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
+def get_appointment(appointment_id: int, db: Session = Depends(get_read_db)):
     apt = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
@@ -865,66 +1184,16 @@ def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
 
 @app.post("/api/appointments")
 def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get_db)):
-    # Validate patient exists
-    patient = db.query(Patient).filter(Patient.patient_id == appointment.patient_id).first()
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Validate doctor exists and is active
-    doctor = db.query(Doctor).filter(
-        Doctor.doctor_id == appointment.doctor_id,
-        Doctor.status == "Active"
-    ).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found or inactive")
-    
-    # Generate token number
-    token_number = generate_token_number(db, appointment.doctor_id, appointment.appointment_date)
-    
-    # Get doctor's consultation charges and hospital charges
-    doctor_charges = float(doctor.consultation_charges)
-    hospital_charges = float(doctor.hospital_charges)  # Now based on doctor
-    total_amount = doctor_charges + hospital_charges
-    
-    # Create appointment
-    db_appointment = Appointment(
-        patient_id=appointment.patient_id,
-        doctor_id=appointment.doctor_id,
-        appointment_date=appointment.appointment_date,
-        token_number=token_number,
-        doctor_charges=doctor_charges,
-        hospital_charges=hospital_charges,
-        status="Scheduled"
-    )
-    db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
-    
-    # Create bill
-    db_bill = Bill(
-        appointment_id=db_appointment.appointment_id,
-        bill_date=appointment.appointment_date,
-        doctor_charges=doctor_charges,
-        hospital_charges=hospital_charges,
-        additional_expenses_total=0,
-        subtotal=total_amount,
-        total_amount=total_amount,
-        payment_status="Pending"
-    )
-    db.add(db_bill)
-    db.commit()
+    # Validation, token, appointment and bill in one transaction (see services/booking.py)
+    try:
+        booking = book_appointment(db, appointment.patient_id, appointment.doctor_id, appointment.appointment_date)
+    except BookingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    report_cache.invalidate(appointment.appointment_date)
+    history_cache.invalidate(appointment.patient_id)
+    annotate_audit(record_id=booking["appointment_id"], description=f"Booked token {booking['token_number']}")
     
-    return {
-        "appointment_id": db_appointment.appointment_id,
-        "token_number": token_number,
-        "patient_name": patient.patient_name,
-        "doctor_name": doctor.doctor_name,
-        "appointment_date": appointment.appointment_date.isoformat(),
-        "doctor_charges": doctor_charges,
-        "hospital_charges": hospital_charges,
-        "total_amount": total_amount,
-        "message": "Appointment created successfully"
-    }
+    return {**booking, "message": "Appointment created successfully"}
 
 @app.patch("/api/appointments/{appointment_id}/status")
 def update_appointment_status(appointment_id: int, status: str, db: Session = Depends(get_db)):
@@ -935,9 +1204,12 @@ def update_appointment_status(appointment_id: int, status: str, db: Session = De
     apt = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    lock_day_for_edit(db, apt.appointment_id, apt.appointment_date)
     
     apt.status = status
     db.commit()
+    report_cache.invalidate(apt.appointment_date)
+    history_cache.invalidate(apt.patient_id)
     return {"message": f"Appointment status updated to {status}"}
 
 @app.delete("/api/appointments/{appointment_id}")
@@ -945,24 +1217,29 @@ def cancel_appointment(appointment_id: int, db: Session = Depends(get_db)):
     apt = db.query(Appointment).filter(Appointment.appointment_id == appointment_id).first()
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    lock_day_for_edit(db, apt.appointment_id, apt.appointment_date)
     
     apt.status = "Cancelled"
     db.commit()
+    report_cache.invalidate(apt.appointment_date)
+    history_cache.invalidate(apt.patient_id)
     return {"message": "Appointment cancelled successfully"}
 
 # =====================================================
 # ADDITIONAL EXPENSES ENDPOINTS
 # =====================================================
 @app.get("/api/expenses/appointment/{appointment_id}")
-def get_appointment_expenses(appointment_id: int, db: Session = Depends(get_db)):
+def get_appointment_expenses(appointment_id: int, db: Session = Depends(get_read_db)):
     expenses = db.query(AdditionalExpense).filter(
         AdditionalExpense.appointment_id == appointment_id
     ).all()
     return [{
         "expense_id": e.expense_id,
+        "service_id": e.service_id,
         "service_type": e.service_type,
         "service_description": e.service_description,
         "amount": float(e.amount),
+        "service_date": e.service_date.isoformat(),
         "created_at": e.created_at.isoformat()
     } for e in expenses]
 
@@ -972,29 +1249,31 @@ def add_additional_expense(expense: AdditionalExpenseCreate, db: Session = Depen
     apt = db.query(Appointment).filter(Appointment.appointment_id == expense.appointment_id).first()
     if not apt:
         raise HTTPException(status_code=404, detail="Appointment not found")
+    if expense.service_id is not None and not db.query(Service.id).filter(Service.id == expense.service_id).first():
+        raise HTTPException(status_code=404, detail="Service not found")
+    # The bill's day and the service date (the expense's service-wise day) must both be open
+    service_date = date.today()
+    lock_day_for_edit(db, apt.appointment_id, apt.appointment_date, service_date)
     
     # Add expense
     db_expense = AdditionalExpense(
         appointment_id=expense.appointment_id,
+        service_id=expense.service_id,
         service_type=expense.service_type,
         service_description=expense.service_description,
-        amount=expense.amount
+        amount=expense.amount,
+        service_date=service_date
     )
     db.add(db_expense)
-    db.commit()
+    db.flush()
     
-    # Update bill totals
-    bill = db.query(Bill).filter(Bill.appointment_id == expense.appointment_id).first()
-    if bill:
-        total_expenses = db.query(func.sum(AdditionalExpense.amount)).filter(
-            AdditionalExpense.appointment_id == expense.appointment_id
-        ).scalar() or 0
-        
-        bill.additional_expenses_total = total_expenses
-        bill.subtotal = float(bill.doctor_charges) + float(bill.hospital_charges) + float(total_expenses)
-        bill.total_amount = bill.subtotal
-        db.commit()
+    # Update bill totals in SQL, in the same transaction as the expense
+    bill_date = refresh_bill_totals(db, expense.appointment_id)
+    db.commit()
     
+    report_cache.invalidate(service_date, bill_date)
+    history_cache.invalidate(apt.patient_id)
+    annotate_audit(record_id=db_expense.expense_id)
     return {"message": "Expense added successfully", "expense_id": db_expense.expense_id}
 
 @app.delete("/api/expenses/{expense_id}")
@@ -1002,23 +1281,23 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db)):
     expense = db.query(AdditionalExpense).filter(AdditionalExpense.expense_id == expense_id).first()
     if not expense:
         raise HTTPException(status_code=404, detail="Expense not found")
+    lock_day_for_edit(
+        db, expense.appointment_id,
+        expense.service_date, expense.appointment.appointment_date if expense.appointment else None
+    )
     
     appointment_id = expense.appointment_id
+    expense_date = expense.service_date
+    patient_id = expense.appointment.patient_id if expense.appointment else None
     db.delete(expense)
-    db.commit()
+    db.flush()
     
-    # Update bill totals
-    bill = db.query(Bill).filter(Bill.appointment_id == appointment_id).first()
-    if bill:
-        total_expenses = db.query(func.sum(AdditionalExpense.amount)).filter(
-            AdditionalExpense.appointment_id == appointment_id
-        ).scalar() or 0
-        
-        bill.additional_expenses_total = total_expenses
-        bill.subtotal = float(bill.doctor_charges) + float(bill.hospital_charges) + float(total_expenses)
-        bill.total_amount = bill.subtotal
-        db.commit()
+    # Update bill totals in SQL, in the same transaction as the delete
+    bill_date = refresh_bill_totals(db, appointment_id)
+    db.commit()
     
+    report_cache.invalidate(expense_date, bill_date)
+    history_cache.invalidate(patient_id)
     return {"message": "Expense deleted successfully"}
 
 # =====================================================
@@ -1031,7 +1310,7 @@ def get_bills(
     date_to: Optional[date] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(Bill)
     
@@ -1063,7 +1342,7 @@ def get_bills(
     return result
 
 @app.get("/api/bills/{bill_id}")
-def get_bill(bill_id: int, db: Session = Depends(get_db)):
+def get_bill(bill_id: int, db: Session = Depends(get_read_db)):
     bill = db.query(Bill).filter(Bill.bill_id == bill_id).first()
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
@@ -1107,7 +1386,7 @@ def get_bill(bill_id: int, db: Session = Depends(get_db)):
     }
 
 @app.get("/api/bills/appointment/{appointment_id}")
-def get_bill_by_appointment(appointment_id: int, db: Session = Depends(get_db)):
+def get_bill_by_appointment(appointment_id: int, db: Session = Depends(get_read_db)):
     bill = db.query(Bill).filter(Bill.appointment_id == appointment_id).first()
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
@@ -1119,210 +1398,239 @@ def update_payment_status(bill_id: int, status_update: PaymentStatusUpdate, db:
     bill = db.query(Bill).filter(Bill.bill_id == bill_id).first()
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
+    # The service-wise report splits the bill's expenses by payment status on their service dates
+    service_dates = [row[0] for row in db.query(AdditionalExpense.service_date).filter(
+        AdditionalExpense.appointment_id == bill.appointment_id
+    ).distinct()]
+    lock_day_for_edit(db, bill.appointment_id, *service_dates)
     
     # Update the payment status
     bill.payment_status = status_update.payment_status
     db.commit()
+    report_cache.invalidate(bill.bill_date, *service_dates)
+    history_cache.invalidate(bill.appointment.patient_id if bill.appointment else None)
     
     return {"message": f"Payment status updated to {status_update.payment_status}", "success": True}
 
+RECEIPT_MEDIA_TYPES = {"html": "text/html; charset=utf-8", "pdf": "application/pdf", "zip": "application/zip"}
+
+@app.get("/api/bills/{bill_id}/receipt")
+def get_bill_receipt(bill_id: int, format: str = "html", db: Session = Depends(get_read_db)):
+    """Printable receipt for one bill (format=html|pdf)"""
+    if format not in receipts.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(receipts.FORMATS)}")
+    data = receipts.load_receipts(db, bill_ids=[bill_id])
+    if not data:
+        raise HTTPException(status_code=404, detail="Bill not found")
+    _, content = next(receipts.render_batch(data, format, "merged"))
+    return Response(content, media_type=RECEIPT_MEDIA_TYPES[format],
+                    headers={"Content-Disposition": f'inline; filename="receipt-{bill_id}.{format}"'})
+
+@app.post("/api/bills/receipts")
+def create_bill_receipts(request: dict, db: Session = Depends(get_read_db)):
+    """
+    Receipts for many bills at once, e.g. an end-of-day packet or an insurer claim:
+    {"bill_ids": [...]} or {"bill_date": "YYYY-MM-DD"}, "format": "html"|"pdf",
+    "output": "merged" (one document) | "zip" (streamed, one file per bill)
+    """
+    fmt = request.get("format", "pdf")
+    output = request.get("output", "merged")
+    if fmt not in receipts.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(receipts.FORMATS)}")
+    if output not in receipts.OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"output must be one of: {', '.join(receipts.OUTPUTS)}")
+
+    bill_ids = request.get("bill_ids") or None
+    bill_date = request.get("bill_date")
+    if not bill_ids and not bill_date:
+        raise HTTPException(status_code=400, detail="Either bill_ids or bill_date is required")
+    try:
+        bill_ids = [int(b) for b in bill_ids] if bill_ids else None
+        bill_date = date.fromisoformat(bill_date) if bill_date else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="bill_ids must be integers and bill_date YYYY-MM-DD")
+    if bill_ids and len(bill_ids) > settings.receipt_batch_max:
+        raise HTTPException(status_code=400, detail=f"At most {settings.receipt_batch_max} bills per request")
+
+    try:
+        data = receipts.load_receipts(db, bill_ids=bill_ids, bill_date=bill_date)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading bills: {str(e)}")
+    if not data:
+        raise HTTPException(status_code=404, detail="No bills found")
+    if len(data) > settings.receipt_batch_max:
+        raise HTTPException(status_code=400, detail=f"{len(data)} bills selected; at most {settings.receipt_batch_max} per request")
+
+    name = f"receipts-{bill_date.isoformat()}" if bill_date else f"receipts-{len(data)}"
+    if output == "zip":
+        return StreamingResponse(
+            receipts.zip_stream(receipts.render_batch(data, fmt, output), fmt),
+            media_type=RECEIPT_MEDIA_TYPES["zip"],
+            headers={"Content-Disposition": f'attachment; filename="{name}.zip"'}
+        )
+    try:
+        _, content = next(receipts.render_batch(data, fmt, output))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering receipts: {str(e)}")
+    return Response(content, media_type=RECEIPT_MEDIA_TYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'})
+
+# =====================================================
+# BACKGROUND JOBS
+# =====================================================
+@app.post("/api/jobs", status_code=202)
+def create_job(job: dict):
+    """Queue a long-running report/export: {"job_type": "report_doctor_wise", "params": {...}}"""
+    try:
+        return job_runner.submit(job.get("job_type"), job.get("params") or {})
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating job: {str(e)}")
+
+@app.get("/api/jobs/stats")
+def get_job_stats():
+    """Job types, concurrency limits and counters for the serving worker"""
+    return job_runner.stats()
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status and progress; result_url is set once the job has completed"""
+    try:
+        status = read_job_status(job_id)
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    status["result_url"] = f"/api/jobs/{job_id}/result" if status["status"] == "completed" else None
+    return status
+
+@app.get("/api/jobs/{job_id}/result")
+def download_job_result(job_id: str):
+    try:
+        path = job_runner.result_path(job_id)
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    media_type = "text/csv" if path.suffix == ".csv" else "application/json"
+    return FileResponse(path, media_type=media_type, filename=f"{job_id}-{path.name}")
+
 # =====================================================
 # REPORTS ENDPOINTS
 # =====================================================
 @app.get("/api/reports/summary")
+@coalesce("report_summary")
 def get_report_summary(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not start_date:
         start_date = date.today()
     if not end_date:
         end_date = date.today()
     
-    # Total appointments
-    total_appointments = db.query(Appointment).filter(
-        Appointment.appointment_date.between(start_date, end_date)
-    ).count()
-    
-    # Completed appointments
-    completed = db.query(Appointment).filter(
-        Appointment.appointment_date.between(start_date, end_date),
-        Appointment.status == "Completed"
-    ).count()
-    
-    # Cancelled appointments
-    cancelled = db.query(Appointment).filter(
-        Appointment.appointment_date.between(start_date, end_date),
-        Appointment.status == "Cancelled"
-    ).count()
-    
-    # Total revenue (paid bills)
-    total_revenue = db.query(func.sum(Bill.total_amount)).filter(
-        Bill.bill_date.between(start_date, end_date),
-        Bill.payment_status == "Paid"
-    ).scalar() or 0
-    
-    # Doctor fees collected
-    doctor_fees = db.query(func.sum(Bill.doctor_charges)).filter(
-        Bill.bill_date.between(start_date, end_date),
-        Bill.payment_status == "Paid"
-    ).scalar() or 0
-    
-    # Hospital charges collected
-    hospital_charges = db.query(func.sum(Bill.hospital_charges)).filter(
-        Bill.bill_date.between(start_date, end_date),
-        Bill.payment_status == "Paid"
-    ).scalar() or 0
-    
-    # Additional expenses collected
-    additional_expenses = db.query(func.sum(Bill.additional_expenses_total)).filter(
-        Bill.bill_date.between(start_date, end_date),
-        Bill.payment_status == "Paid"
-    ).scalar() or 0
-    
-    # Pending payments
-    pending_amount = db.query(func.sum(Bill.total_amount)).filter(
-        Bill.bill_date.between(start_date, end_date),
-        Bill.payment_status == "Pending"
-    ).scalar() or 0
-    
-    # New patients registered
-    new_patients = db.query(Patient).filter(
-        Patient.registration_date.between(start_date, end_date)
-    ).count()
-    
-    return {
-        "period": {
-            "start_date": start_date.isoformat(),
-            "end_date": end_date.isoformat()
-        },
-        "appointments": {
-            "total": total_appointments,
-            "completed": completed,
-            "cancelled": cancelled,
-            "scheduled": total_appointments - completed - cancelled,
-            "completion_rate": round((completed / total_appointments * 100) if total_appointments else 0, 2)
-        },
-        "revenue": {
-            "total_collected": float(total_revenue),
-            "doctor_fees": float(doctor_fees),
-            "hospital_charges": float(hospital_charges),
-            "additional_services": float(additional_expenses),
-            "pending_amount": float(pending_amount)
-        },
-        "patients": {
-            "new_registrations": new_patients
-        }
-    }
+    # Closed days come from the report cache; only missing/open days hit the tables
+    return report_summary(db, start_date, end_date)
 
 @app.get("/api/reports/daily")
-def get_daily_report(report_date: Optional[date] = None, db: Session = Depends(get_db)):
+def get_daily_report(report_date: Optional[date] = None, db: Session = Depends(get_read_db)):
     if not report_date:
         report_date = date.today()
     return get_report_summary(start_date=report_date, end_date=report_date, db=db)
 
 @app.get("/api/reports/doctor-wise")
+@coalesce("report_doctor_wise")
 def get_doctor_wise_report(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not start_date:
         start_date = date.today()
     if not end_date:
         end_date = date.today()
     
-    results = db.query(
-        Doctor.doctor_id,
-        Doctor.doctor_name,
-        Doctor.specialization,
-        func.count(Appointment.appointment_id).label("total_appointments"),
-        func.sum(Appointment.doctor_charges).label("total_doctor_fees")
-    ).join(Appointment, Doctor.doctor_id == Appointment.doctor_id).filter(
-        Appointment.appointment_date.between(start_date, end_date)
-    ).group_by(Doctor.doctor_id).all()
-    
-    # Check payment status via vouchers for each doctor
-    doctor_reports = []
-    for r in results:
-        doctor_id = r[0]
-        total_fees = float(r[4] or 0)
-        
-        # Check if there's a paid voucher for this doctor covering this period
-        paid_voucher = db.query(Voucher).filter(
-            Voucher.doctor_id == doctor_id,
-            Voucher.voucher_type == "DOCTOR_PAYMENT",
-            Voucher.status == "PAID",
-            Voucher.payment_period_start <= start_date,
-            Voucher.payment_period_end >= end_date
-        ).first()
-        
-        doctor_reports.append({
-            "doctor_id": r[0],
-            "doctor_name": r[1],
-            "specialization": r[2],
-            "total_appointments": r[3],
-            "total_doctor_fees": total_fees,
-            "payment_status": "Paid" if paid_voucher else "Pending",
-            "voucher_number": paid_voucher.voucher_number if paid_voucher else None,
-            "paid_at": paid_voucher.paid_at.isoformat() if paid_voucher and paid_voucher.paid_at else None
-        })
-    
-    return doctor_reports
+    return report_doctor_wise(db, start_date, end_date)
 
 @app.get("/api/reports/service-wise")
+@coalesce("report_service_wise")
 def get_service_wise_report(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not start_date:
         start_date = date.today()
     if not end_date:
         end_date = date.today()
     
-    results = db.query(
-        AdditionalExpense.service_type,
-        func.count(AdditionalExpense.expense_id).label("count"),
-        func.sum(AdditionalExpense.amount).label("total_amount")
-    ).filter(
-        AdditionalExpense.created_at.between(
-            datetime.combine(start_date, datetime.min.time()),
-            datetime.combine(end_date, datetime.max.time())
-        )
-    ).group_by(AdditionalExpense.service_type).all()
-    
-    return [{
-        "service_type": r[0],
-        "count": r[1],
-        "total_amount": float(r[2] or 0)
-    } for r in results]
+    return report_service_wise(db, start_date, end_date)
+
+@app.get("/api/reports/cache")
+def get_report_cache_stats():
+    """Report cache hit/miss counters and entry counts"""
+    return report_cache.stats()
+
+@app.delete("/api/reports/cache")
+def clear_report_cache():
+    """Drop every cached report piece (e.g. after editing rows directly in the database)"""
+    report_cache.clear()
+    return {"message": "Report cache cleared"}
 
 @app.get("/api/reports/appointments-by-date")
+@coalesce("report_appointments_by_date")
 def get_appointments_by_date(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if not start_date:
         start_date = date.today() - timedelta(days=7)
     if not end_date:
         end_date = date.today()
-    
-    from datetime import timedelta
-    
-    results = db.query(
-        Appointment.appointment_date,
-        func.count(Appointment.appointment_id)
-    ).filter(
-        Appointment.appointment_date.between(start_date, end_date)
-    ).group_by(Appointment.appointment_date).order_by(Appointment.appointment_date).all()
-    
+
+    # Gap-filled daily counts so days without appointments report 0
+    data = build_timeseries(db, ["appointments"], "day", start_date, end_date)
+
     return [{
-        "date": r[0].isoformat(),
-        "count": r[1]
-    } for r in results]
+        "date": d,
+        "count": c
+    } for d, c in zip(data["buckets"], data["series"]["appointments"])]
+
+@app.get("/api/reports/timeseries")
+@coalesce("report_timeseries")
+def get_report_timeseries(
+    metric: List[str] = Query(default=list(TIMESERIES_METRICS)),
+    bucket: str = "day",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    doctor_id: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Bucketed, gap-filled metrics in one columnar payload (metric may repeat or be comma-separated)"""
+    metrics = []
+    for m in metric:
+        for name in m.split(","):
+            name = name.strip()
+            if name and name not in metrics:
+                metrics.append(name)
+
+    invalid = [m for m in metrics if m not in TIMESERIES_METRICS]
+    if invalid or not metrics:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Must be any of: {list(TIMESERIES_METRICS)}")
+    if bucket not in TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Invalid bucket. Must be one of: {list(TIMESERIES_BUCKETS)}")
+
+    if not end_date:
+        end_date = date.today()
+    if not start_date:
+        start_date = end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+
+    try:
+        return build_timeseries(db, metrics, bucket, start_date, end_date, doctor_id)
+    except Exception as e:
+        print(f"Error in get_report_timeseries: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 # =====================================================
 # AUTH ENDPOINTS
@@ -1343,7 +1651,7 @@ def register_admin(admin: AdminCreate, db: Session = Depends(get_db)):
     )
     db.add(db_admin)
     db.commit()
-    db.refresh(db_admin)
+    annotate_audit(record_id=db_admin.admin_id)
     return {"message": "Admin registered successfully", "admin_id": db_admin.admin_id}
 
 @app.post("/api/auth/test")
@@ -1410,6 +1718,8 @@ async def login(request: Request):
             # Update last login
             admin.last_login = datetime.utcnow()
             db.commit()
+            # No token on the request yet, so name the actor for the audit log
+            annotate_audit(admin_id=admin.admin_id, record_id=admin.admin_id, description=f"Login {admin.username}")
             
             # Create token
             expire = datetime.utcnow() + timedelta(minutes=480)  # 8 hours
@@ -1467,6 +1777,7 @@ async def reset_password(request: Request):
             # Update password
             admin.password_hash = new_password_hash
             db.commit()
+            annotate_audit(record_id=admin.admin_id, description=f"Password reset for {admin.username}")
             
             return {"message": "Password reset successfully"}
             
@@ -1482,7 +1793,7 @@ async def reset_password(request: Request):
 # SERVICES ENDPOINTS
 # =====================================================
 @app.get("/api/services")
-def get_services(db: Session = Depends(get_db)):
+def get_services(db: Session = Depends(get_read_db)):
     """Get all active services"""
     try:
         from .models.service import Service
@@ -1505,7 +1816,7 @@ def get_services(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error fetching services: {str(e)}")
 
 @app.get("/api/services/{service_id}")
-def get_service(service_id: int, db: Session = Depends(get_db)):
+def get_service(service_id: int, db: Session = Depends(get_read_db)):
     """Get a specific service"""
     try:
         from .models.service import Service
@@ -1553,7 +1864,7 @@ async def create_service(request: Request, db: Session = Depends(get_db)):
         
         db.add(service)
         db.commit()
-        db.refresh(service)
+        annotate_audit(record_id=service.id)
         
         return {
             "id": service.id,
@@ -1640,16 +1951,19 @@ def generate_voucher_number(db: Session, voucher_type: str) -> str:
     prefix = "VCH"
     date_str = today.strftime("%Y%m%d")
     
-    # Get the count of vouchers created today
+    # Get the count of vouchers created today (range filter works on every dialect)
+    day_start = datetime.combine(today, datetime.min.time())
     count = db.query(Voucher).filter(
-        func.date(Voucher.created_at) == today
+        Voucher.created_at >= day_start,
+        Voucher.created_at < day_start + timedelta(days=1)
     ).count()
     
     sequence = str(count + 1).zfill(4)
     return f"{prefix}-{date_str}-{sequence}"
 
 @app.get("/api/vouchers/summary")
-def get_voucher_summary(db: Session = Depends(get_db)):
+@coalesce("voucher_summary")
+def get_voucher_summary(db: Session = Depends(get_read_db)):
     """Get voucher summary statistics"""
     try:
         total_vouchers = db.query(Voucher).count()
@@ -1684,7 +1998,7 @@ def get_vouchers(
     doctor_id: Optional[str] = None,
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get vouchers with optional filters"""
     try:
@@ -1715,7 +2029,7 @@ def get_vouchers(
         raise HTTPException(status_code=500, detail=f"Error getting vouchers: {str(e)}")
 
 @app.get("/api/vouchers/{voucher_id}", response_model=VoucherResponse)
-def get_voucher(voucher_id: int, db: Session = Depends(get_db)):
+def get_voucher(voucher_id: int, db: Session = Depends(get_read_db)):
     """Get voucher by ID"""
     voucher = db.query(Voucher).filter(Voucher.voucher_id == voucher_id).first()
     if not voucher:
@@ -1767,7 +2081,7 @@ def create_voucher(voucher: VoucherCreate, db: Session = Depends(get_db)):
         
         db.add(db_voucher)
         db.commit()
-        db.refresh(db_voucher)
+        annotate_audit(record_id=db_voucher.voucher_id, description=f"Created voucher {db_voucher.voucher_number}")
         
         voucher_data = VoucherResponse.from_orm(db_voucher)
         if db_voucher.doctor:
@@ -11,6 +11,10 @@ from .token_counter import TokenCounter
 from .system_log import SystemLog
 from .service import Service
 from .voucher import Voucher
+from .doctor_schedule import DoctorSchedule
+from .day_close import DayClose, DailyDoctorRollup, DailyServiceRollup
+from .archive import AppointmentArchive, BillArchive, AdditionalExpenseArchive, ArchiveState
+from .idempotency import IdempotencyKey
 
 __all__ = [
     "AdminUser",
@@ -22,5 +26,14 @@ __all__ = [
     "TokenCounter",
     "SystemLog",
     "Service",
-    "Voucher"
+    "Voucher",
+    "DoctorSchedule",
+    "DayClose",
+    "DailyDoctorRollup",
+    "DailyServiceRollup",
+    "AppointmentArchive",
+    "BillArchive",
+    "AdditionalExpenseArchive",
+    "ArchiveState",
+    "IdempotencyKey"
 ]
\ No newline at end of file
@@ -1,9 +1,9 @@
 """
 Additional Expense Model
 """
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, ForeignKey, CheckConstraint, Index
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import datetime, date
 
 from ..database import Base
 
@@ -12,9 +12,11 @@ class AdditionalExpense(Base):
     
     expense_id = Column(Integer, primary_key=True, index=True)
     appointment_id = Column(Integer, ForeignKey("appointments.appointment_id", ondelete="CASCADE"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="SET NULL"), nullable=True)
     service_type = Column(String(50), nullable=False)
     service_description = Column(String(255), nullable=True)
     amount = Column(Numeric(10, 2), nullable=False)
+    service_date = Column(Date, nullable=False, default=date.today)  # the day the service-wise report counts it on
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Constraints
@@ -22,6 +24,10 @@ class AdditionalExpense(Base):
         CheckConstraint('amount >= 0', name='check_amount_positive'),
         Index('idx_appointment', 'appointment_id'),
         Index('idx_service_type', 'service_type'),
+        # Service-wise report and expense timeseries: range on service_date, joins the bill,
+        # groups by service and sums amount without touching the table rows
+        Index('idx_expense_service_date', 'service_date', 'appointment_id', 'service_id', 'service_type', 'amount'),
+        Index('idx_expense_service', 'service_id'),
     )
     
     # Relationships
@@ -35,8 +41,10 @@ class AdditionalExpense(Base):
         return {
             "expense_id": self.expense_id,
             "appointment_id": self.appointment_id,
+            "service_id": self.service_id,
             "service_type": self.service_type,
             "service_description": self.service_description,
             "amount": float(self.amount),
+            "service_date": self.service_date.isoformat() if self.service_date else None,
             "created_at": self.created_at.isoformat()
         }
\ No newline at end of file
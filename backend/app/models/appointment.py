@@ -30,8 +30,11 @@ class Appointment(Base):
     
     # Indexes
     __table_args__ = (
-        Index('idx_appointment_date', 'appointment_date'),
-        Index('idx_patient', 'patient_id'),
+        # Report counts (per day and status) and the doctor-wise totals read only these columns
+        Index('idx_appointment_date_status', 'appointment_date', 'status'),
+        Index('idx_appointment_date_doctor_fees', 'appointment_date', 'doctor_id', 'doctor_charges'),
+        # Patient history pages: newest first per patient
+        Index('idx_appointment_patient_date', 'patient_id', 'appointment_date'),
         Index('idx_doctor', 'doctor_id'),
         Index('idx_token', 'token_number'),
         Index('idx_appointment_doctor_date', 'doctor_id', 'appointment_date'),
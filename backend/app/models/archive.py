@@ -0,0 +1,83 @@
+"""
+Archive Models (cold copies of old appointments, bills and expenses)
+
+The archive tables have their own metadata so they can live in the main
+database or in a separate one (ARCHIVE_DATABASE_URL). They mirror the hot
+columns without foreign keys; ids are kept as they were.
+"""
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Index
+from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+
+from ..database import Base
+
+ArchiveBase = declarative_base()
+
+class AppointmentArchive(ArchiveBase):
+    __tablename__ = "appointments_archive"
+
+    appointment_id = Column(Integer, primary_key=True, autoincrement=False)
+    patient_id = Column(Integer, nullable=False)
+    doctor_id = Column(String(20), nullable=False)
+    appointment_date = Column(Date, nullable=False)
+    appointment_time = Column(DateTime, nullable=False)
+    token_number = Column(String(50), nullable=False)
+    doctor_charges = Column(Numeric(10, 2), nullable=False)
+    hospital_charges = Column(Numeric(10, 2), nullable=False, default=0)
+    status = Column(String(20), nullable=False)
+    created_by = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_archive_appointment_date', 'appointment_date'),
+        Index('idx_archive_patient_date', 'patient_id', 'appointment_date'),
+        Index('idx_archive_doctor_date', 'doctor_id', 'appointment_date'),
+    )
+
+class BillArchive(ArchiveBase):
+    __tablename__ = "bills_archive"
+
+    bill_id = Column(Integer, primary_key=True, autoincrement=False)
+    appointment_id = Column(Integer, nullable=False, unique=True)
+    bill_date = Column(Date, nullable=False)
+    bill_time = Column(DateTime, nullable=False)
+    doctor_charges = Column(Numeric(10, 2), nullable=False)
+    hospital_charges = Column(Numeric(10, 2), nullable=False)
+    additional_expenses_total = Column(Numeric(10, 2), nullable=False, default=0)
+    subtotal = Column(Numeric(10, 2), nullable=False)
+    total_amount = Column(Numeric(10, 2), nullable=False)
+    payment_status = Column(String(20), nullable=False)
+    created_by = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_archive_bill_date_status', 'bill_date', 'payment_status'),
+    )
+
+class AdditionalExpenseArchive(ArchiveBase):
+    __tablename__ = "additional_expenses_archive"
+
+    expense_id = Column(Integer, primary_key=True, autoincrement=False)
+    appointment_id = Column(Integer, nullable=False)
+    service_id = Column(Integer, nullable=True)
+    service_type = Column(String(50), nullable=False)
+    service_description = Column(String(255), nullable=True)
+    amount = Column(Numeric(10, 2), nullable=False)
+    service_date = Column(Date, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_archive_expense_appointment', 'appointment_id'),
+        Index('idx_archive_expense_service_date', 'service_date', 'appointment_id'),
+    )
+
+class ArchiveState(Base):
+    """Lives with the hot tables: everything dated before archived_before may be in the archive"""
+    __tablename__ = "archive_state"
+
+    name = Column(String(50), primary_key=True)
+    archived_before = Column(Date, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -25,9 +25,12 @@ class Bill(Base):
     
     # Indexes
     __table_args__ = (
-        Index('idx_bill_date', 'bill_date'),
         Index('idx_payment_status', 'payment_status'),
-        Index('idx_bill_date_status', 'bill_date', 'payment_status'),
+        # Covers the per-day payment aggregates of the summary report, timeseries and dashboard
+        Index('idx_bill_date_status_amounts', 'bill_date', 'payment_status', 'total_amount',
+              'doctor_charges', 'hospital_charges', 'additional_expenses_total'),
+        # "Is this appointment's bill paid" lookups (day close, appointment lists)
+        Index('idx_bill_appointment_status', 'appointment_id', 'payment_status'),
     )
     
     # Relationships
@@ -0,0 +1,49 @@
+"""
+End-of-Day Close Models (close marker and per-day report snapshots)
+"""
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric
+from datetime import datetime
+
+from ..database import Base
+
+class DayClose(Base):
+    """One row per closed day: the day's summary snapshot and what the close did"""
+    __tablename__ = "day_closes"
+
+    close_date = Column(Date, primary_key=True)
+    appointments = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    no_show = Column(Integer, nullable=False, default=0)
+    total_collected = Column(Numeric(12, 2), nullable=False, default=0)
+    doctor_fees = Column(Numeric(12, 2), nullable=False, default=0)
+    hospital_charges = Column(Numeric(12, 2), nullable=False, default=0)
+    additional_services = Column(Numeric(12, 2), nullable=False, default=0)
+    pending_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    new_registrations = Column(Integer, nullable=False, default=0)
+    stale_completed = Column(Integer, nullable=False, default=0)
+    stale_no_show = Column(Integer, nullable=False, default=0)
+    bills_locked = Column(Integer, nullable=False, default=0)
+    closed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<DayClose(date={self.close_date}, appointments={self.appointments})>"
+
+class DailyDoctorRollup(Base):
+    __tablename__ = "daily_doctor_rollups"
+
+    close_date = Column(Date, primary_key=True)
+    doctor_id = Column(String(20), primary_key=True)
+    appointments = Column(Integer, nullable=False, default=0)
+    doctor_fees = Column(Numeric(12, 2), nullable=False, default=0)
+
+class DailyServiceRollup(Base):
+    """Service-wise snapshot per service and bill payment status (service_id 0: not in the catalog)"""
+    __tablename__ = "daily_service_rollups"
+
+    close_date = Column(Date, primary_key=True)
+    service_id = Column(Integer, primary_key=True, autoincrement=False)
+    service_type = Column(String(50), primary_key=True)
+    payment_status = Column(String(20), primary_key=True)
+    expense_count = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(12, 2), nullable=False, default=0)
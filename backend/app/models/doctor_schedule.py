@@ -0,0 +1,27 @@
+"""
+Doctor Schedule Model
+"""
+from sqlalchemy import Column, Integer, String, Time, Text, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+
+from ..database import Base
+
+class DoctorSchedule(Base):
+    __tablename__ = "doctor_schedules"
+    
+    schedule_id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(String(20), ForeignKey("doctors.doctor_id", ondelete="CASCADE"), nullable=False)
+    working_days = Column(String(255), nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    notes = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    
+    # Constraints
+    __table_args__ = (
+        UniqueConstraint('doctor_id', name='unique_doctor_schedule'),
+    )
+    
+    def __repr__(self):
+        return f"<DoctorSchedule(doctor_id='{self.doctor_id}', days='{self.working_days}')>"
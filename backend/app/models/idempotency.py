@@ -0,0 +1,26 @@
+"""
+Idempotency Key Model (stored responses of retried writes)
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+
+from ..database import Base
+
+class IdempotencyKey(Base):
+    """One row per Idempotency-Key: claimed while the first request runs, then its response"""
+    __tablename__ = "idempotency_keys"
+
+    key_hash = Column(String(64), primary_key=True)  # sha256 of method, path and the client's key
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=True)  # NULL while the first request is running
+    content_type = Column(String(100), nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_idempotency_expires', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key_hash='{self.key_hash[:12]}', status={self.status_code})>"
@@ -1,7 +1,7 @@
 """
 Service Model for Additional Services
 """
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Text
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, Text, Index
 from datetime import datetime
 
 from ..database import Base
@@ -18,5 +18,11 @@ class Service(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     is_active = Column(String(10), default="Active", nullable=False)
     
+    __table_args__ = (
+        Index('idx_service_active', 'is_active'),
+        # ETag version probe: MAX(updated_at), COUNT(*)
+        Index('idx_service_updated', 'updated_at'),
+    )
+    
     def __repr__(self):
         return f"<Service(id={self.id}, name='{self.name}', price={self.price})>"
\ No newline at end of file
@@ -3,10 +3,11 @@ Additional Expense Schemas
 """
 from pydantic import BaseModel, Field, validator
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, date
 
 class AdditionalExpenseCreate(BaseModel):
     appointment_id: int = Field(..., gt=0)
+    service_id: Optional[int] = Field(None, gt=0)  # catalog service, when the expense comes from one
     service_type: str = Field(..., min_length=1, max_length=100)
     service_description: Optional[str] = Field(None, max_length=255)
     amount: float = Field(..., ge=0)
@@ -20,9 +21,11 @@ class AdditionalExpenseCreate(BaseModel):
 class AdditionalExpenseResponse(BaseModel):
     expense_id: int
     appointment_id: int
+    service_id: Optional[int]
     service_type: str
     service_description: Optional[str]
     amount: float
+    service_date: date
     created_at: datetime
     
     class Config:
@@ -0,0 +1,270 @@
+"""
+Hot/cold archival of appointments, bills and additional expenses
+
+Appointments dated before the horizon (ARCHIVE_AFTER_MONTHS whole months
+before the current one) move, together with their bill and expenses, into
+the *_archive tables, either in the main database or in ARCHIVE_DATABASE_URL.
+An appointment with an expense dated on or after the horizon stays hot until
+a later horizon passes it, so archived expenses are dated before it as well.
+Each batch of ARCHIVE_BATCH_SIZE appointments is its own short transaction,
+with a pause between batches.
+
+archive_state.archived_before is raised before any row moves, so readers know
+that dates before it may live in the archive. Reports and patient history
+query the archive only when the requested range reaches below that date and
+add its rows to the hot ones; every row is in exactly one of the two. With a
+separate archive database a batch is committed there first and then deleted
+from the hot tables; a crash in between leaves a batch in both until the next
+run re-copies and deletes it.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import delete, exists, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..config import settings
+from ..database import engine, build_engine
+from ..models import (
+    Appointment, Bill, AdditionalExpense,
+    AppointmentArchive, BillArchive, AdditionalExpenseArchive, ArchiveState
+)
+from ..models.archive import ArchiveBase
+from .audit_partitions import add_months, month_start
+
+STATE_NAME = "clinical"
+# How long a worker trusts its cached boundary; a run waits this long after raising it
+BOUNDARY_TTL_SECONDS = 30
+
+class Tables(NamedTuple):
+    appointment: type
+    bill: type
+    expense: type
+
+HOT_TABLES = Tables(Appointment, Bill, AdditionalExpense)
+ARCHIVE_TABLES = Tables(AppointmentArchive, BillArchive, AdditionalExpenseArchive)
+
+_archive_engine = None
+_engine_lock = threading.Lock()
+
+def archive_engine():
+    global _archive_engine
+    with _engine_lock:
+        if _archive_engine is None:
+            _archive_engine = build_engine(settings.archive_database_url) if settings.archive_database_url else engine
+        return _archive_engine
+
+def separate_database() -> bool:
+    return bool(settings.archive_database_url)
+
+def ensure_archive_schema():
+    ArchiveBase.metadata.create_all(bind=archive_engine())
+
+@contextmanager
+def archive_session(db: Session):
+    """Session for archive reads: the caller's own session when the archive shares its database"""
+    if not separate_database():
+        yield db
+        return
+    session = sessionmaker(autocommit=False, autoflush=False, bind=archive_engine())()
+    try:
+        yield session
+    finally:
+        session.close()
+
+# =====================================================
+# BOUNDARY
+# =====================================================
+_boundary_cache = {"expires": 0.0, "value": None}
+
+def archive_boundary() -> Optional[date]:
+    """Dates before this may be archived; None when nothing was ever archived"""
+    now = time.monotonic()
+    if _boundary_cache["expires"] > now:
+        return _boundary_cache["value"]
+    with engine.connect() as conn:
+        value = conn.execute(
+            select(ArchiveState.archived_before).where(ArchiveState.name == STATE_NAME)
+        ).scalar()
+    _boundary_cache.update(expires=now + BOUNDARY_TTL_SECONDS, value=value)
+    return value
+
+def archive_range(start_date: date, end_date: date) -> Optional[tuple]:
+    """The part of [start_date, end_date] that can be in the archive, or None"""
+    boundary = archive_boundary()
+    if boundary is None or start_date >= boundary:
+        return None
+    return start_date, min(end_date, boundary - timedelta(days=1))
+
+def archive_cutoff(today: Optional[date] = None) -> date:
+    return add_months(month_start(today or date.today()), -settings.archive_after_months)
+
+def merge_pieces(into: Dict, extra: Dict) -> Dict:
+    """Add per-day report pieces from the archive to the hot ones"""
+    for day, piece in extra.items():
+        if day not in into:
+            into[day] = piece
+            continue
+        target = into[day]
+        for key, value in piece.items():
+            if key not in target:
+                target[key] = value
+            elif isinstance(value, list):
+                target[key] = [a + b for a, b in zip(target[key], value)]
+            else:
+                target[key] += value
+    return into
+
+def with_archive(compute: Callable) -> Callable:
+    """Wrap compute(db, lo, hi, tables=...) so ranges reaching archived dates include the archive"""
+    def run(db: Session, start_date: date, end_date: date) -> Dict:
+        pieces = compute(db, start_date, end_date)
+        span = archive_range(start_date, end_date)
+        if span:
+            with archive_session(db) as cold:
+                merge_pieces(pieces, compute(cold, span[0], span[1], tables=ARCHIVE_TABLES))
+        return pieces
+    return run
+
+# =====================================================
+# MOVING ROWS
+# =====================================================
+def _raise_boundary(cutoff: date) -> bool:
+    """Set archived_before to at least cutoff; True if it moved"""
+    with engine.begin() as conn:
+        current = conn.execute(
+            select(ArchiveState.archived_before).where(ArchiveState.name == STATE_NAME)
+        ).scalar()
+        if current is not None and current >= cutoff:
+            return False
+        if current is None:
+            conn.execute(insert(ArchiveState.__table__).values(
+                name=STATE_NAME, archived_before=cutoff, updated_at=datetime.utcnow()
+            ))
+        else:
+            conn.execute(ArchiveState.__table__.update().where(ArchiveState.name == STATE_NAME).values(
+                archived_before=cutoff, updated_at=datetime.utcnow()
+            ))
+    _boundary_cache["expires"] = 0.0
+    return True
+
+def _copy_rows(cold, archive_table, rows: List[dict], key: str):
+    if not rows:
+        return
+    ids = [r[key] for r in rows]
+    # Idempotent: a batch left behind by an interrupted run is replaced
+    cold.execute(delete(archive_table).where(archive_table.c[key].in_(ids)))
+    now = datetime.utcnow()
+    cold.execute(insert(archive_table), [{**r, "archived_at": now} for r in rows])
+
+def _archivable(cutoff: date):
+    """Appointments before cutoff whose expenses (by service_date) are all before it too"""
+    appointments, expenses = Appointment.__table__, AdditionalExpense.__table__
+    later_expense = exists().where(
+        expenses.c.appointment_id == appointments.c.appointment_id,
+        expenses.c.service_date >= cutoff
+    )
+    return (appointments.c.appointment_date < cutoff) & ~later_expense
+
+def _move_batch(appointment_ids: List[int], cutoff: date) -> Dict[str, int]:
+    appointments, bills, expenses = [t.__table__ for t in HOT_TABLES]
+    cold_tables = [t.__table__ for t in ARCHIVE_TABLES]
+
+    with engine.begin() as hot:
+        # Row locks (MySQL) keep the batch from being edited while it moves; an
+        # expense added since the batch was picked keeps its appointment hot
+        apt_rows = [dict(r._mapping) for r in hot.execute(
+            select(appointments)
+            .where(appointments.c.appointment_id.in_(appointment_ids), _archivable(cutoff))
+            .with_for_update()
+        )]
+        appointment_ids = [r["appointment_id"] for r in apt_rows]
+        bill_rows = [dict(r._mapping) for r in hot.execute(
+            select(bills).where(bills.c.appointment_id.in_(appointment_ids)).with_for_update()
+        )]
+        expense_rows = [dict(r._mapping) for r in hot.execute(
+            select(expenses).where(expenses.c.appointment_id.in_(appointment_ids)).with_for_update()
+        )]
+
+        def copy(cold):
+            _copy_rows(cold, cold_tables[0], apt_rows, "appointment_id")
+            _copy_rows(cold, cold_tables[1], bill_rows, "bill_id")
+            _copy_rows(cold, cold_tables[2], expense_rows, "expense_id")
+
+        if separate_database():
+            with archive_engine().begin() as cold:
+                copy(cold)
+        else:
+            copy(hot)
+
+        hot.execute(delete(expenses).where(expenses.c.appointment_id.in_(appointment_ids)))
+        hot.execute(delete(bills).where(bills.c.appointment_id.in_(appointment_ids)))
+        hot.execute(delete(appointments).where(appointments.c.appointment_id.in_(appointment_ids)))
+
+    return {"appointments": len(apt_rows), "bills": len(bill_rows), "expenses": len(expense_rows)}
+
+def pending_count(cutoff: date) -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count()).select_from(Appointment.__table__)
+            .where(_archivable(cutoff))
+        ).scalar()
+
+def run_archival(dry_run: bool = False, cutoff: Optional[date] = None,
+                 progress: Optional[Callable[[float], None]] = None) -> dict:
+    """Move everything dated before cutoff (default: the configured horizon) to the archive"""
+    cutoff = cutoff or archive_cutoff()
+    pending = pending_count(cutoff)
+    result = {
+        "cutoff": cutoff.isoformat(),
+        "dry_run": dry_run,
+        "pending_appointments": pending,
+        "moved": {"appointments": 0, "bills": 0, "expenses": 0},
+        "batches": 0
+    }
+    if dry_run or not pending:
+        return result
+
+    ensure_archive_schema()
+    if _raise_boundary(cutoff):
+        # Let every worker pick up the new boundary before rows start disappearing
+        time.sleep(BOUNDARY_TTL_SECONDS)
+
+    table = Appointment.__table__
+    pause = settings.archive_batch_pause_ms / 1000
+    while True:
+        with engine.connect() as conn:
+            ids = [r[0] for r in conn.execute(
+                select(table.c.appointment_id)
+                .where(_archivable(cutoff))
+                .order_by(table.c.appointment_id)
+                .limit(settings.archive_batch_size)
+            )]
+        if not ids:
+            break
+        moved = _move_batch(ids, cutoff)
+        for key, count in moved.items():
+            result["moved"][key] += count
+        result["batches"] += 1
+        if progress:
+            progress(result["moved"]["appointments"] / pending)
+        if pause:
+            time.sleep(pause)
+
+    print(f"🗄️ Archived {result['moved']['appointments']} appointments before {cutoff} "
+          f"in {result['batches']} batches")
+    return result
+
+def archive_status() -> dict:
+    cutoff = archive_cutoff()
+    boundary = archive_boundary()
+    return {
+        "archived_before": boundary.isoformat() if boundary else None,
+        "horizon_months": settings.archive_after_months,
+        "next_cutoff": cutoff.isoformat(),
+        "pending_appointments": pending_count(cutoff),
+        "separate_database": separate_database()
+    }
@@ -0,0 +1,202 @@
+"""
+Buffered audit log writer
+
+Request handlers (and the audit middleware) enqueue events into a bounded
+in-memory queue; a background thread bulk-inserts them into system_logs every
+`audit_flush_interval_ms` or as soon as `audit_batch_size` events are waiting.
+Audit writes therefore never add a commit to the request's own transaction.
+"""
+import contextvars
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from ..config import settings
+
+# Mutable per-request dict the middleware creates; handlers running in the
+# threadpool share the same object, so their annotations reach the middleware
+audit_context: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("audit_context", default=None)
+
+def annotate_audit(**fields):
+    """Attach details (record_id, table, action, description, admin_id) to the current request's audit event"""
+    ctx = audit_context.get()
+    if ctx is not None:
+        ctx.update({k: v for k, v in fields.items() if v is not None})
+
+class AuditWriter:
+    def __init__(self, queue_size: int, batch_size: int, flush_interval_ms: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.flushes = 0
+
+    def enqueue(self, admin_id: Optional[int], action: str, table: Optional[str] = None,
+                record_id: Optional[int] = None, description: Optional[str] = None,
+                ip_address: Optional[str] = None) -> bool:
+        """Queue an event without blocking; returns False (and counts a drop) when full"""
+        event = {
+            "admin_id": admin_id,
+            "action_type": (action or "")[:50],
+            "table_name": table[:50] if table else None,
+            "record_id": record_id,
+            "description": description,
+            "ip_address": ip_address[:45] if ip_address else None,
+            "created_at": datetime.utcnow()
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _drain(self, limit: int):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        from ..database import engine
+        from .audit_partitions import insert_events
+
+        for attempt in range(3):
+            try:
+                with engine.begin() as conn:
+                    # executemany: one round trip for the whole batch (per month table on SQLite)
+                    insert_events(conn, batch)
+                self.written += len(batch)
+                self.flushes += 1
+                return
+            except Exception as e:
+                print(f"⚠️ Audit flush failed (attempt {attempt + 1}): {e}")
+                time.sleep(0.2 * (attempt + 1))
+        self.failed_batches += 1
+
+        # Salvage what we can so one bad row (e.g. a deleted admin) doesn't lose the batch
+        for event in batch:
+            try:
+                with engine.begin() as conn:
+                    insert_events(conn, [event])
+                self.written += 1
+            except Exception:
+                self.dropped += 1
+
+    def flush(self):
+        """Write everything currently queued"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the background thread and flush whatever is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "queued": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "flushes": self.flushes,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000)
+        }
+
+audit_writer = AuditWriter(
+    settings.audit_queue_size,
+    settings.audit_batch_size,
+    settings.audit_flush_interval_ms
+)
+
+# =====================================================
+# REQUEST METADATA
+# =====================================================
+MUTATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# POSTs that only read or render (receipts) are not mutations
+SKIPPED_PATHS = {"/api/auth/test", "/api/auth/login-raw", "/api/bills/receipts"}
+
+# First path segment under /api -> audited table
+TABLES = {
+    "patients": "patients",
+    "doctors": "doctors",
+    "appointments": "appointments",
+    "expenses": "additional_expenses",
+    "bills": "bills",
+    "vouchers": "vouchers",
+    "services": "services",
+    "auth": "admin_users",
+    "debug": "token_counter",
+}
+
+METHOD_ACTIONS = {"POST": "CREATE", "PUT": "UPDATE", "PATCH": "UPDATE", "DELETE": "DELETE"}
+
+# POST routes that do not create a row
+ROUTE_ACTIONS = {
+    "/api/auth/login": "LOGIN",
+    "/api/auth/reset-password": "PASSWORD_RESET",
+}
+
+def describe_route(method: str, route_path: str, path_params: dict):
+    """(action_type, table_name, record_id) for a matched route template"""
+    parts = [p for p in route_path.split("/") if p and p != "api"]
+    table = TABLES.get(parts[0]) if parts else None
+
+    action = ROUTE_ACTIONS.get(route_path) or METHOD_ACTIONS.get(method, method)
+    last = parts[-1] if parts else ""
+    if path_params and not last.startswith("{"):
+        # Action sub-routes such as /vouchers/{voucher_id}/approve
+        action = last.upper().replace("-", "_")
+
+    record_id = None
+    for value in path_params.values():
+        try:
+            record_id = int(value)
+            break
+        except (TypeError, ValueError):
+            continue
+    return action, table, record_id
+
+def client_ip(request) -> Optional[str]:
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else None
@@ -0,0 +1,371 @@
+"""
+Time partitioning, retention and archiving for system_logs
+
+MySQL: system_logs is RANGE-partitioned by month on TO_DAYS(created_at), with
+a catch-all `pmax` partition that future months are split out of ahead of time.
+InnoDB does not allow foreign keys on partitioned tables, and the partitioning
+column must be in the primary key, so conversion drops the admin_id FK and
+widens the key to (log_id, created_at).
+
+SQLite: there is no native partitioning, so events are written to one table
+per month (system_logs_YYYYMM) instead. Rows already in the base system_logs
+table (written before partitioning was enabled) are moved into their monthly
+tables, so retention covers them too.
+
+Retention exports each expired month to gzip-compressed NDJSON and then drops
+the whole partition/table - no row-by-row DELETE. Archives can be re-imported
+into system_logs_restored for investigations; each row keeps the archive it
+came from, since log_ids are only unique within one month's table on SQLite.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, Index, MetaData, Table, text, inspect, select
+)
+
+from ..config import settings
+from ..database import engine
+
+MONTHLY_TABLE = re.compile(r"^system_logs_(\d{6})$")
+RESTORED_TABLE = "system_logs_restored"
+_known_tables = set()
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def month_key(d: date) -> str:
+    return d.strftime("%Y%m")
+
+def retention_cutoff(today: Optional[date] = None) -> date:
+    """Months starting before this date have expired"""
+    return add_months(month_start(today or date.today()), -settings.audit_retention_months)
+
+def _log_columns() -> List[Column]:
+    """system_logs columns after log_id, without the FK (not allowed on partitions)"""
+    return [
+        Column("admin_id", Integer, nullable=True),
+        Column("action_type", String(50), nullable=False),
+        Column("table_name", String(50), nullable=True),
+        Column("record_id", Integer, nullable=True),
+        Column("description", Text, nullable=True),
+        Column("ip_address", String(45), nullable=True),
+        Column("created_at", DateTime, nullable=False),
+    ]
+
+def _log_table(name: str, metadata: Optional[MetaData] = None) -> Table:
+    """system_logs column layout for a monthly table"""
+    return Table(
+        name, metadata or MetaData(),
+        Column("log_id", Integer, primary_key=True, autoincrement=True),
+        *_log_columns(),
+        Index(f"idx_{name}_created_at", "created_at"),
+        Index(f"idx_{name}_action_type", "action_type"),
+    )
+
+def _restored_table(metadata: Optional[MetaData] = None) -> Table:
+    """Imported archive rows, keyed by (source archive, log_id)"""
+    return Table(
+        RESTORED_TABLE, metadata or MetaData(),
+        Column("restored_id", Integer, primary_key=True, autoincrement=True),
+        Column("source", String(100), nullable=False),  # archive name, e.g. system_logs_202501
+        Column("log_id", Integer, nullable=False),
+        *_log_columns(),
+        Index(f"idx_{RESTORED_TABLE}_source_log", "source", "log_id", unique=True),
+        Index(f"idx_{RESTORED_TABLE}_created_at", "created_at"),
+        Index(f"idx_{RESTORED_TABLE}_action_type", "action_type"),
+    )
+
+def is_partitioned_mode() -> bool:
+    return settings.audit_partitioning and engine.dialect.name in ("mysql", "sqlite")
+
+# =====================================================
+# MYSQL
+# =====================================================
+def _to_days(d: date) -> int:
+    # MySQL TO_DAYS() counts from year 0; Python ordinals from year 1
+    return d.toordinal() + 365
+
+def _from_days(days: int) -> date:
+    return date.fromordinal(days - 365)
+
+def _mysql_partitions(conn, table: str = "system_logs") -> List[dict]:
+    rows = conn.execute(text("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+          AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """), {"table": table}).fetchall()
+    partitions = []
+    for name, description, table_rows in rows:
+        upper = None if description == "MAXVALUE" else _from_days(int(description))
+        partitions.append({"name": name, "upper_bound": upper, "rows": table_rows})
+    return partitions
+
+def _partition_clause(months: List[date]) -> str:
+    parts = [
+        f"PARTITION p{month_key(m)} VALUES LESS THAN ({_to_days(add_months(m, 1))})"
+        for m in months
+    ]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return ", ".join(parts)
+
+def _mysql_convert(conn):
+    """One-time conversion of an unpartitioned system_logs"""
+    print("🔧 Converting system_logs to monthly RANGE partitions...")
+    for (fk_name,) in conn.execute(text("""
+        SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'system_logs'
+    """)).fetchall():
+        conn.execute(text(f"ALTER TABLE system_logs DROP FOREIGN KEY `{fk_name}`"))
+    conn.execute(text("ALTER TABLE system_logs DROP PRIMARY KEY, ADD PRIMARY KEY (log_id, created_at)"))
+
+    oldest = conn.execute(text("SELECT MIN(created_at) FROM system_logs")).scalar()
+    first = month_start(oldest.date() if oldest else date.today())
+    first = max(first, retention_cutoff())
+    last = add_months(month_start(date.today()), settings.audit_partitions_ahead)
+    months = []
+    m = first
+    while m <= last:
+        months.append(m)
+        m = add_months(m, 1)
+    # Anything older than the first monthly partition lands in p_old
+    clause = f"PARTITION p_old VALUES LESS THAN ({_to_days(first)}), " + _partition_clause(months)
+    conn.execute(text(f"ALTER TABLE system_logs PARTITION BY RANGE (TO_DAYS(created_at)) ({clause})"))
+    print(f"✅ system_logs partitioned ({len(months)} monthly partitions)")
+
+def _mysql_ensure(conn) -> List[str]:
+    partitions = _mysql_partitions(conn)
+    if not partitions:
+        _mysql_convert(conn)
+        partitions = _mysql_partitions(conn)
+
+    bounded = [p["upper_bound"] for p in partitions if p["upper_bound"]]
+    highest = max(bounded) if bounded else month_start(date.today())
+    target = add_months(month_start(date.today()), settings.audit_partitions_ahead + 1)
+    months = []
+    m = highest
+    while m < target:
+        months.append(m)
+        m = add_months(m, 1)
+    if months:
+        # Split the new months out of the (empty) catch-all partition
+        conn.execute(text(
+            f"ALTER TABLE system_logs REORGANIZE PARTITION pmax INTO ({_partition_clause(months)})"
+        ))
+    return [f"p{month_key(m)}" for m in months]
+
+# =====================================================
+# SQLITE
+# =====================================================
+def _sqlite_tables(conn) -> Dict[str, date]:
+    tables = {}
+    for name in inspect(conn).get_table_names():
+        match = MONTHLY_TABLE.match(name)
+        if match:
+            key = match.group(1)
+            tables[name] = date(int(key[:4]), int(key[4:]), 1)
+    return tables
+
+def _sqlite_table_for(conn, month: date) -> Table:
+    name = f"system_logs_{month_key(month)}"
+    table = _log_table(name)
+    if name not in _known_tables:
+        table.create(bind=conn, checkfirst=True)
+        _known_tables.add(name)
+    return table
+
+def _sqlite_adopt_base_rows(conn) -> int:
+    """Move rows in the base system_logs table into their monthly tables (new log_ids)"""
+    from ..models import SystemLog
+
+    base = SystemLog.__table__
+    keys = conn.execute(
+        text("SELECT DISTINCT strftime('%Y%m', created_at) FROM system_logs")
+    ).scalars().all()
+    moved = 0
+    for key in keys:
+        month = date(int(key[:4]), int(key[4:]), 1)
+        in_month = (
+            base.c.created_at >= datetime.combine(month, datetime.min.time()),
+            base.c.created_at < datetime.combine(add_months(month, 1), datetime.min.time())
+        )
+        columns = [c.name for c in _log_columns()]
+        moved += conn.execute(_sqlite_table_for(conn, month).insert().from_select(
+            columns, select(*[base.c[name] for name in columns]).where(*in_month)
+        )).rowcount
+        conn.execute(base.delete().where(*in_month))
+    if moved:
+        print(f"🔧 Moved {moved} audit rows from system_logs into monthly tables")
+    return moved
+
+def _sqlite_ensure(conn) -> List[str]:
+    _sqlite_adopt_base_rows(conn)
+    created = []
+    existing = _sqlite_tables(conn)
+    current = month_start(date.today())
+    for offset in range(settings.audit_partitions_ahead + 1):
+        m = add_months(current, offset)
+        name = f"system_logs_{month_key(m)}"
+        if name not in existing:
+            _sqlite_table_for(conn, m)
+            created.append(name)
+    return created
+
+# =====================================================
+# PUBLIC API
+# =====================================================
+def ensure_partitions() -> List[str]:
+    """Convert (MySQL, once) and create partitions/tables for upcoming months"""
+    if not is_partitioned_mode():
+        return []
+    with engine.begin() as conn:
+        if engine.dialect.name == "mysql":
+            return _mysql_ensure(conn)
+        return _sqlite_ensure(conn)
+
+def insert_events(conn, events: List[dict]):
+    """Bulk insert audit rows into the right table(s) for the active mode"""
+    from ..models import SystemLog
+
+    if not (is_partitioned_mode() and engine.dialect.name == "sqlite"):
+        conn.execute(SystemLog.__table__.insert(), events)
+        return
+    by_month: Dict[date, List[dict]] = {}
+    for event in events:
+        by_month.setdefault(month_start(event["created_at"].date()), []).append(event)
+    for month, rows in by_month.items():
+        conn.execute(_sqlite_table_for(conn, month).insert(), rows)
+
+def list_partitions() -> List[dict]:
+    """Partitions (MySQL) or monthly tables (SQLite) with their month and expiry"""
+    cutoff = retention_cutoff()
+    result = []
+    with engine.connect() as conn:
+        if engine.dialect.name == "mysql":
+            for p in _mysql_partitions(conn):
+                upper = p["upper_bound"]
+                result.append({
+                    "name": p["name"],
+                    "before": upper.isoformat() if upper else None,
+                    "approx_rows": p["rows"],
+                    "expired": bool(upper and upper <= cutoff)
+                })
+        elif engine.dialect.name == "sqlite":
+            for name, month in sorted(_sqlite_tables(conn).items(), key=lambda x: x[1]):
+                rows = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                result.append({
+                    "name": name,
+                    "before": add_months(month, 1).isoformat(),
+                    "approx_rows": rows,
+                    "expired": add_months(month, 1) <= cutoff
+                })
+    return result
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def _export(conn, select_sql: str, path: Path) -> int:
+    """Stream a partition to gzip NDJSON; written to a temp name and renamed on success"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".part")
+    count = 0
+    result = conn.execution_options(stream_results=True).execute(text(select_sql))
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        for row in result.mappings():
+            fh.write(json.dumps(dict(row), default=_json_default) + "\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+def _archive_stem(partition: dict) -> str:
+    """system_logs_YYYYMM for a month; system_logs_before_YYYY-MM-DD for MySQL's p_old"""
+    match = re.match(r"^(?:system_logs_|p)(\d{6})$", partition["name"])
+    if match:
+        return f"system_logs_{match.group(1)}"
+    return f"system_logs_before_{partition['before']}"
+
+def apply_retention(dry_run: bool = False) -> List[dict]:
+    """Export every expired month to NDJSON.gz, then drop its partition/table"""
+    if not is_partitioned_mode():
+        return []
+    archive_dir = Path(settings.audit_archive_dir)
+    if engine.dialect.name == "sqlite" and not dry_run:
+        with engine.begin() as conn:
+            _sqlite_adopt_base_rows(conn)
+    done = []
+    for p in list_partitions():
+        if not p["expired"]:
+            continue
+        name = p["name"]
+        path = archive_dir / f"{_archive_stem(p)}.ndjson.gz"
+        entry = {"partition": name, "archive": str(path), "rows": None, "dropped": False}
+        if dry_run:
+            done.append(entry)
+            continue
+        with engine.begin() as conn:
+            if engine.dialect.name == "mysql":
+                entry["rows"] = _export(conn, f"SELECT * FROM system_logs PARTITION ({name})", path)
+                conn.execute(text(f"ALTER TABLE system_logs DROP PARTITION {name}"))
+            else:
+                entry["rows"] = _export(conn, f"SELECT * FROM {name}", path)
+                conn.execute(text(f"DROP TABLE {name}"))
+                _known_tables.discard(name)
+        entry["dropped"] = True
+        print(f"🗄️ Archived {entry['rows']} audit rows from {name} to {path}")
+        done.append(entry)
+    return done
+
+def _source_of(path: str) -> str:
+    """Archive name without extensions: system_logs_202501.ndjson.gz -> system_logs_202501"""
+    name = Path(path).name
+    for suffix in (".gz", ".ndjson", ".json"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+def import_archive(path: str, chunk_size: int = 5000) -> int:
+    """
+    Load an NDJSON(.gz) archive into system_logs_restored. Re-importing an
+    archive replaces the rows it loaded before; other archives' rows are kept.
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    source = _source_of(path)
+    total = 0
+
+    with engine.begin() as conn:
+        table = _restored_table()
+        table.create(bind=conn, checkfirst=True)
+        conn.execute(table.delete().where(table.c.source == source))
+        columns = ["log_id"] + [c.name for c in _log_columns()]
+        rows = []
+        with opener(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+                rows.append({"source": source, **{name: row.get(name) for name in columns}})
+                if len(rows) >= chunk_size:
+                    conn.execute(table.insert(), rows)
+                    total += len(rows)
+                    rows = []
+        if rows:
+            conn.execute(table.insert(), rows)
+            total += len(rows)
+    return total
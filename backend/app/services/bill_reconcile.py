@@ -0,0 +1,183 @@
+"""
+Bill integrity reconciliation
+
+Bills carry denormalized copies of their appointment's charges and the sum of
+its additional expenses. reconcile_bills() walks the bills table in bill_id
+ranges and, for each range, lets the database compare every bill with its
+appointment and expense total in one statement; only mismatching rows come
+back. With fix=True the mismatches of each range are rewritten by one
+set-based UPDATE in the same transaction.
+
+Bills on closed days (see day_close) are reported but never rewritten;
+reopen the day first.
+"""
+from datetime import date
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Appointment, Bill, AdditionalExpense, DayClose
+
+# Amounts are compared with half-a-cent tolerance so SQLite's REAL storage does not report noise
+TOLERANCE = 0.005
+
+FIELDS = ("doctor_charges", "hospital_charges", "additional_expenses_total", "subtotal", "total_amount")
+
+def _expense_total(appointment_id_column):
+    return (
+        select(func.coalesce(func.sum(AdditionalExpense.amount), 0))
+        .where(AdditionalExpense.appointment_id == appointment_id_column)
+        .scalar_subquery()
+    )
+
+def _expected_columns():
+    """Expected values as correlated expressions over Bill (usable in SELECT and UPDATE)"""
+    doctor_charges = (
+        select(Appointment.doctor_charges)
+        .where(Appointment.appointment_id == Bill.appointment_id)
+        .scalar_subquery()
+    )
+    hospital_charges = (
+        select(Appointment.hospital_charges)
+        .where(Appointment.appointment_id == Bill.appointment_id)
+        .scalar_subquery()
+    )
+    expenses = _expense_total(Bill.appointment_id)
+    subtotal = doctor_charges + hospital_charges + expenses
+    return {
+        "doctor_charges": doctor_charges,
+        "hospital_charges": hospital_charges,
+        "additional_expenses_total": expenses,
+        "subtotal": subtotal,
+        "total_amount": subtotal
+    }
+
+def _differs(a, b):
+    return func.abs(a - b) > TOLERANCE
+
+def _mismatch_query(lo: int, hi: int):
+    expenses = _expense_total(Appointment.appointment_id)
+    expected_subtotal = Appointment.doctor_charges + Appointment.hospital_charges + expenses
+    return (
+        select(
+            Bill.bill_id, Bill.bill_date, Appointment.patient_id,
+            Bill.doctor_charges, Bill.hospital_charges, Bill.additional_expenses_total,
+            Bill.subtotal, Bill.total_amount,
+            Appointment.doctor_charges, Appointment.hospital_charges, expenses,
+            DayClose.close_date
+        )
+        .join(Appointment, Appointment.appointment_id == Bill.appointment_id)
+        .outerjoin(DayClose, DayClose.close_date == Bill.bill_date)
+        .where(
+            Bill.bill_id.between(lo, hi),
+            or_(
+                _differs(Bill.doctor_charges, Appointment.doctor_charges),
+                _differs(Bill.hospital_charges, Appointment.hospital_charges),
+                _differs(Bill.additional_expenses_total, expenses),
+                _differs(Bill.subtotal, expected_subtotal),
+                _differs(Bill.total_amount, expected_subtotal)
+            )
+        )
+        .order_by(Bill.bill_id)
+    )
+
+def refresh_bill_totals(db: Session, appointment_id: int) -> Optional[date]:
+    """
+    Recompute one bill from its appointment and expenses in SQL (caller commits).
+    Returns the bill's date, via RETURNING where the database supports it.
+    """
+    statement = (
+        update(Bill)
+        .where(Bill.appointment_id == appointment_id)
+        .values(**_expected_columns())
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        return db.execute(statement.returning(Bill.bill_date)).scalar()
+    db.execute(statement)
+    return db.query(Bill.bill_date).filter(Bill.appointment_id == appointment_id).scalar()
+
+def reconcile_bills(
+    db: Session,
+    fix: bool = False,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    sample_size: int = 100,
+    on_mismatch: Optional[Callable[[dict], None]] = None,
+    progress: Optional[Callable[[float], None]] = None
+) -> dict:
+    """
+    Check (and optionally fix) bills with bill_id in [start_id, end_id].
+    Returns counts plus up to sample_size mismatches; on_mismatch sees all of them.
+    """
+    lo_id, hi_id = db.query(func.min(Bill.bill_id), func.max(Bill.bill_id)).one()
+    result = {
+        "checked_range": None, "chunks": 0, "mismatched": 0, "fixed": 0, "locked": 0,
+        "fields": {field: 0 for field in FIELDS}, "sample": []
+    }
+    if lo_id is None:
+        return result
+    lo_id = max(lo_id, start_id or lo_id)
+    hi_id = min(hi_id, end_id or hi_id)
+    result["checked_range"] = [lo_id, hi_id]
+    chunk = settings.reconcile_chunk_size
+    touched_days = set()
+    touched_patients = set()
+
+    for lo in range(lo_id, hi_id + 1, chunk):
+        hi = min(lo + chunk - 1, hi_id)
+        fixable: List[int] = []
+        for row in db.execute(_mismatch_query(lo, hi)):
+            (bill_id, bill_date, patient_id, b_doctor, b_hospital, b_expenses, b_subtotal, b_total,
+             a_doctor, a_hospital, expenses, closed) = row
+            expected_subtotal = float(a_doctor) + float(a_hospital) + float(expenses)
+            stored = dict(zip(FIELDS, (b_doctor, b_hospital, b_expenses, b_subtotal, b_total)))
+            expected = dict(zip(FIELDS, (a_doctor, a_hospital, expenses, expected_subtotal, expected_subtotal)))
+            diff = {
+                field: {"stored": float(stored[field]), "expected": round(float(expected[field]), 2)}
+                for field in FIELDS if abs(float(stored[field]) - float(expected[field])) > TOLERANCE
+            }
+            for field in diff:
+                result["fields"][field] += 1
+            mismatch = {
+                "bill_id": bill_id,
+                "bill_date": bill_date.isoformat(),
+                "locked": closed is not None,
+                "differences": diff
+            }
+            result["mismatched"] += 1
+            if closed is not None:
+                result["locked"] += 1
+            else:
+                fixable.append(bill_id)
+                touched_days.add(bill_date)
+                touched_patients.add(patient_id)
+            if len(result["sample"]) < sample_size:
+                result["sample"].append(mismatch)
+            if on_mismatch:
+                on_mismatch(mismatch)
+
+        if fix and fixable:
+            # IN lists stay well below SQLite's bound-parameter limit
+            for i in range(0, len(fixable), 1000):
+                db.execute(
+                    update(Bill)
+                    .where(Bill.bill_id.in_(fixable[i:i + 1000]))
+                    .values(**_expected_columns())
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+            result["fixed"] += len(fixable)
+        else:
+            # End the chunk's read transaction so long runs do not pin an old snapshot
+            db.rollback()
+        result["chunks"] += 1
+        if progress:
+            progress((hi - lo_id + 1) / (hi_id - lo_id + 1))
+
+    if fix:
+        result["touched_days"] = sorted(touched_days)
+        result["touched_patients"] = sorted(touched_patients)
+    return result
@@ -0,0 +1,184 @@
+"""
+Appointment booking
+
+A booking is one write transaction, with as few round trips as the dialect allows:
+1. one SELECT checks the patient and the active doctor and reads the doctor's
+   charges
+2. the token comes from an atomic upsert on token_counter (RETURNING on
+   SQLite, LAST_INSERT_ID(expr) on MySQL); concurrent bookings for the same
+   doctor and day queue on the counter row instead of racing a read
+3. holding that row, a locking read checks that the day is not closed, so a
+   close in progress makes the booking wait and then refuses it (see day_close)
+4. the appointment and its bill are inserted and the whole booking commits once
+Any failure rolls everything back, so there is never an appointment without a
+bill or a token used up by a booking that did not happen.
+
+With BOOKING_STORED_PROCEDURE on MySQL the same steps run inside
+sp_create_appointment_with_bill: one CALL plus the COMMIT.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import and_, case, func, select, text
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..database import begin_write
+from ..models import Appointment, Bill, Doctor, Patient, TokenCounter
+from .day_close import ensure_open, DayClosedError
+
+# MySQL error number of SIGNAL SQLSTATE '45000' (raised by the procedure)
+ER_SIGNAL_EXCEPTION = 1644
+
+class BookingError(Exception):
+    """Booking refused: unknown patient, unavailable doctor or closed day"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def format_token(doctor_id: str, day: date, number: int) -> str:
+    return f"{doctor_id}-{day:%Y%m%d}-{number:03d}"
+
+def uses_procedure(db: Session) -> bool:
+    return settings.booking_stored_procedure and db.get_bind().dialect.name == "mysql"
+
+def _check(db: Session, patient_id: int, doctor_id: str):
+    row = db.execute(
+        select(
+            Patient.patient_name,
+            Doctor.doctor_name,
+            Doctor.consultation_charges,
+            Doctor.hospital_charges
+        )
+        .select_from(Patient)
+        .outerjoin(Doctor, and_(Doctor.doctor_id == doctor_id, Doctor.status == "Active"))
+        .where(Patient.patient_id == patient_id)
+    ).mappings().first()
+    if row is None:
+        raise BookingError(404, "Patient not found")
+    if row["doctor_name"] is None:
+        raise BookingError(404, "Doctor not found or inactive")
+    return row
+
+def next_token_number(db: Session, doctor_id: str, day: date) -> int:
+    """Increment (or start at 1) the doctor's counter for the day; the row stays locked until commit"""
+    table = TokenCounter.__table__
+    now = datetime.utcnow()
+    values = {"doctor_id": doctor_id, "token_date": day, "last_token_number": 1, "created_at": now, "updated_at": now}
+    # A counter left at 0 or below restarts at 1
+    bumped = case((table.c.last_token_number < 1, 1), else_=table.c.last_token_number + 1)
+    dialect = db.get_bind().dialect
+
+    if dialect.name == "mysql":
+        result = db.execute(
+            mysql.insert(table).values(**values)
+            .on_duplicate_key_update(last_token_number=func.last_insert_id(bumped), updated_at=now)
+        )
+        # 1 affected row: inserted; 2: updated, and LAST_INSERT_ID(expr) reports the new number
+        return 1 if result.rowcount == 1 else result.lastrowid
+
+    stmt = sqlite.insert(table).values(**values).on_conflict_do_update(
+        index_elements=["doctor_id", "token_date"],
+        set_={"last_token_number": bumped, "updated_at": now}
+    )
+    if dialect.insert_returning:
+        return db.execute(stmt.returning(table.c.last_token_number)).scalar_one()
+    db.execute(stmt)
+    return db.execute(
+        select(table.c.last_token_number).where(table.c.doctor_id == doctor_id, table.c.token_date == day)
+    ).scalar_one()
+
+def _book(db: Session, patient_id: int, doctor_id: str, day: date, created_by: Optional[int]) -> dict:
+    begin_write(db)
+    row = _check(db, patient_id, doctor_id)
+    token_number = format_token(doctor_id, day, next_token_number(db, doctor_id, day))
+    try:
+        ensure_open(db, day, lock=True)
+    except DayClosedError as e:
+        raise BookingError(e.status_code, e.detail)
+    doctor_charges = float(row["consultation_charges"])
+    hospital_charges = float(row["hospital_charges"])
+    total_amount = doctor_charges + hospital_charges
+
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        appointment_date=day,
+        token_number=token_number,
+        doctor_charges=doctor_charges,
+        hospital_charges=hospital_charges,
+        status="Scheduled",
+        created_by=created_by
+    )
+    bill = Bill(
+        appointment=appointment,
+        bill_date=day,
+        doctor_charges=doctor_charges,
+        hospital_charges=hospital_charges,
+        additional_expenses_total=0,
+        subtotal=total_amount,
+        total_amount=total_amount,
+        payment_status="Pending",
+        created_by=created_by
+    )
+    db.add_all([appointment, bill])
+    db.flush()
+    return {
+        "appointment_id": appointment.appointment_id,
+        "bill_id": bill.bill_id,
+        "token_number": token_number,
+        "patient_name": row["patient_name"],
+        "doctor_name": row["doctor_name"],
+        "doctor_charges": doctor_charges,
+        "hospital_charges": hospital_charges
+    }
+
+def _book_with_procedure(db: Session, patient_id: int, doctor_id: str, day: date, created_by: Optional[int]) -> dict:
+    try:
+        row = db.execute(
+            text("CALL sp_create_appointment_with_bill(:patient_id, :doctor_id, :day, :created_by)"),
+            {"patient_id": patient_id, "doctor_id": doctor_id, "day": day, "created_by": created_by}
+        ).mappings().one()
+    except DBAPIError as e:
+        if e.orig is None or e.orig.args[0] != ER_SIGNAL_EXCEPTION:
+            raise
+        message = e.orig.args[1]
+        raise BookingError(409 if "closed" in message else 404, message)
+    return {
+        "appointment_id": row["appointment_id"],
+        "bill_id": row["bill_id"],
+        "token_number": row["token_number"],
+        "patient_name": row["patient_name"],
+        "doctor_name": row["doctor_name"],
+        "doctor_charges": float(row["doctor_charges"]),
+        "hospital_charges": float(row["hospital_charges"])
+    }
+
+def book_appointment(
+    db: Session,
+    patient_id: int,
+    doctor_id: str,
+    day: date,
+    created_by: Optional[int] = None,
+    use_procedure: Optional[bool] = None
+) -> dict:
+    """
+    Book and commit; raises BookingError (404/409). use_procedure=None follows
+    BOOKING_STORED_PROCEDURE (MySQL only).
+    """
+    if use_procedure is None:
+        use_procedure = uses_procedure(db)
+    book = _book_with_procedure if use_procedure else _book
+    try:
+        booking = book(db, patient_id, doctor_id, day, created_by)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    booking["appointment_date"] = day.isoformat()
+    booking["total_amount"] = booking["doctor_charges"] + booking["hospital_charges"]
+    return booking
@@ -0,0 +1,136 @@
+"""
+Single-flight request coalescing
+
+When several identical requests arrive while one is already computing, the
+later ones wait for that computation and share its result (or its error)
+instead of running the same queries again. Waiters give up after the group's
+timeout and compute on their own, so a stuck leader never fails followers.
+
+Use as a decorator on sync endpoints:
+
+    @app.get("/api/reports/summary")
+    @coalesce("report_summary")
+    def get_report_summary(start_date: date = None, db: Session = Depends(get_read_db)): ...
+
+The key is built from the endpoint's arguments. Sessions are keyed by where
+they read from (primary or replica), so a client pinned to the primary for
+read-your-writes never receives a replica-computed result.
+"""
+import functools
+import inspect
+import threading
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    def __init__(self, name: str, timeout_seconds: float):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        self._calls: Dict[tuple, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    def do(self, key: tuple, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+
+        if not call.event.wait(self.timeout_seconds):
+            with self._lock:
+                self.timeouts += 1
+                self.executions += 1
+            return fn()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "max_waiters": self.max_waiters,
+                "timeout_seconds": self.timeout_seconds
+            }
+
+_groups: Dict[str, SingleFlight] = {}
+
+def _key_part(value):
+    if isinstance(value, Session):
+        from ..database import engine
+        return "primary" if value.get_bind() is engine else "replica"
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_key_part(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+def coalesce(name: Optional[str] = None, timeout_seconds: Optional[float] = None):
+    """Decorator: identical concurrent calls share one execution"""
+    def decorator(func):
+        group_name = name or func.__name__
+        group = _groups[group_name] = SingleFlight(
+            group_name,
+            timeout_seconds if timeout_seconds is not None else settings.coalesce_timeout_seconds
+        )
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            key = tuple((k, _key_part(v)) for k, v in sorted(bound.arguments.items()))
+            return group.do(key, lambda: func(*args, **kwargs))
+
+        wrapper.single_flight = group
+        return wrapper
+    return decorator
+
+def coalescing_stats() -> dict:
+    totals = {"executions": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+    groups = {}
+    for name, group in _groups.items():
+        groups[name] = group.stats()
+        for k in totals:
+            totals[k] += groups[name][k]
+    return {"totals": totals, "groups": groups}
@@ -0,0 +1,226 @@
+"""
+End-of-day close
+
+Closing a day, in one transaction:
+- settles the day's still-Scheduled appointments with a single UPDATE
+  (Completed when the bill is paid, otherwise No Show)
+- snapshots the summary, doctor-wise and service-wise figures into
+  day_closes / daily_doctor_rollups / daily_service_rollups
+- locks the day: bookings, appointment, expense and bill edits for a closed
+  day are refused (see lock_for_edit) until the day is reopened
+- records the close marker (the day_closes row)
+
+Reports then read closed days from the snapshots instead of raw rows.
+Patients registered after the close are not added to its snapshot.
+"""
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Set, Tuple
+
+from sqlalchemy import case, exists, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import begin_write
+from ..models import Appointment, Bill, DayClose, DailyDoctorRollup, DailyServiceRollup
+from .archive import archive_boundary
+
+SUMMARY_FIELDS = (
+    "appointments", "completed", "cancelled", "no_show",
+    "total_collected", "doctor_fees", "hospital_charges",
+    "additional_services", "pending_amount", "new_registrations"
+)
+AMOUNT_FIELDS = ("total_collected", "doctor_fees", "hospital_charges", "additional_services", "pending_amount")
+
+class DayClosedError(Exception):
+    """Write or close request that conflicts with a day's close state"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def closed_days(db: Session, start_date: date, end_date: date) -> Set[date]:
+    return {
+        row[0] for row in db.query(DayClose.close_date)
+        .filter(DayClose.close_date.between(start_date, end_date))
+    }
+
+def ensure_open(db: Session, *days, lock: bool = False) -> None:
+    """
+    Raise DayClosedError (409) if any of the given days/datetimes is closed.
+    lock=True reads day_closes with a locking read, which waits for a close in
+    progress and sees markers committed after the transaction's snapshot (MySQL).
+    """
+    targets = {d.date() if isinstance(d, datetime) else d for d in days if d is not None}
+    if not targets:
+        return
+    query = db.query(DayClose.close_date).filter(DayClose.close_date.in_(targets))
+    if lock:
+        query = query.with_for_update(read=True)
+    closed = [row[0] for row in query]
+    if closed:
+        raise DayClosedError(409, f"Day {min(closed).isoformat()} is closed; reopen it before editing")
+
+def lock_for_edit(db: Session, appointment_id: int, *days) -> None:
+    """
+    Lock the appointment's bill, then check that its day and `days` are open;
+    call before writing. close_day holds the day's bills until its marker
+    commits, so a write racing a close waits for it and is then refused,
+    instead of changing a bill after its day's snapshot was taken.
+    """
+    begin_write(db)
+    bill_date = db.query(Bill.bill_date).filter(Bill.appointment_id == appointment_id).with_for_update().scalar()
+    ensure_open(db, bill_date, *days, lock=True)
+
+# =====================================================
+# SNAPSHOT READS (used by the report computations)
+# =====================================================
+def _open_runs(start_date: date, end_date: date, closed: Set[date]) -> List[Tuple[date, date]]:
+    runs = []
+    run_start = None
+    current = start_date
+    while current <= end_date:
+        if current in closed:
+            if run_start is not None:
+                runs.append((run_start, current - timedelta(days=1)))
+                run_start = None
+        elif run_start is None:
+            run_start = current
+        current += timedelta(days=1)
+    if run_start is not None:
+        runs.append((run_start, end_date))
+    return runs
+
+def _summary_values(row: DayClose) -> dict:
+    return {
+        field: float(getattr(row, field)) if field in AMOUNT_FIELDS else int(getattr(row, field))
+        for field in SUMMARY_FIELDS
+    }
+
+def _summary_snapshots(db: Session, start_date: date, end_date: date) -> Dict[date, dict]:
+    return {
+        row.close_date: _summary_values(row)
+        for row in db.query(DayClose).filter(DayClose.close_date.between(start_date, end_date))
+    }
+
+def _doctor_snapshots(db: Session, start_date: date, end_date: date) -> Dict[date, dict]:
+    pieces = {}
+    for row in db.query(DailyDoctorRollup).filter(DailyDoctorRollup.close_date.between(start_date, end_date)):
+        pieces.setdefault(row.close_date, {})[row.doctor_id] = [int(row.appointments), float(row.doctor_fees)]
+    return pieces
+
+def _service_snapshots(db: Session, start_date: date, end_date: date) -> Dict[date, dict]:
+    pieces = {}
+    for row in db.query(DailyServiceRollup).filter(DailyServiceRollup.close_date.between(start_date, end_date)):
+        key = (row.service_id or None, row.service_type, row.payment_status)
+        pieces.setdefault(row.close_date, {})[key] = [int(row.expense_count), float(row.amount)]
+    return pieces
+
+def _service_rollups(day: date, piece: dict) -> List[DailyServiceRollup]:
+    return [
+        DailyServiceRollup(
+            close_date=day, service_id=service_id or 0, service_type=service_type,
+            payment_status=payment_status, expense_count=count, amount=amount
+        )
+        for (service_id, service_type, payment_status), (count, amount) in piece.items()
+    ]
+
+SNAPSHOT_READERS = {
+    "summary": _summary_snapshots,
+    "doctor-wise": _doctor_snapshots,
+    "service-wise": _service_snapshots,
+}
+
+def with_snapshots(kind: str, compute: Callable, db: Session, start_date: date, end_date: date) -> Dict[date, dict]:
+    """Per-day pieces: closed days from their snapshot, open stretches from raw rows"""
+    closed = closed_days(db, start_date, end_date)
+    pieces = {}
+    if closed:
+        snapshots = SNAPSHOT_READERS[kind](db, start_date, end_date)
+        # A closed day with no rollup rows (nothing happened) is still a closed, empty day
+        pieces.update({day: snapshots.get(day, {}) for day in closed})
+    for lo, hi in _open_runs(start_date, end_date, closed):
+        pieces.update(compute(db, lo, hi))
+    return pieces
+
+# =====================================================
+# CLOSE / REOPEN
+# =====================================================
+def close_day(db: Session, day: date) -> dict:
+    """Close the day; returns the close record. Raises DayClosedError if not allowed"""
+    from .reports import compute_summary_pieces, compute_doctor_pieces, compute_service_pieces
+
+    if day > date.today():
+        raise DayClosedError(400, "Cannot close a future day")
+    boundary = archive_boundary()
+    if boundary is not None and day < boundary:
+        raise DayClosedError(400, f"Day {day.isoformat()} is archived")
+
+    begin_write(db)
+    try:
+        # Claim the day before reading anything: writers checking it with a locking
+        # read now wait for this close and are then refused, and a writer already
+        # past its check holds the insert back until it commits, so it is counted
+        marker = DayClose(close_date=day)
+        db.add(marker)
+        db.flush()
+
+        # Hold the day's bills (row locks on MySQL, the write lock on SQLite) until the marker is committed
+        bills_locked = len(db.query(Bill.bill_id).filter(Bill.bill_date == day).with_for_update().all())
+
+        stale = (Appointment.appointment_date == day) & (Appointment.status == "Scheduled")
+        patient_ids = [row[0] for row in db.query(Appointment.patient_id).filter(stale).distinct()]
+        paid = exists().where(Bill.appointment_id == Appointment.appointment_id, Bill.payment_status == "Paid")
+        stale_completed = db.query(Appointment.appointment_id).filter(stale, paid).count()
+        settled = db.execute(
+            update(Appointment)
+            .where(stale)
+            .values(status=case((paid, "Completed"), else_="No Show"))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        summary = compute_summary_pieces(db, day, day).get(day) or {}
+        marker.stale_completed = stale_completed
+        marker.stale_no_show = settled - stale_completed
+        marker.bills_locked = bills_locked
+        for field in SUMMARY_FIELDS:
+            setattr(marker, field, summary.get(field, 0))
+        db.add_all([
+            DailyDoctorRollup(close_date=day, doctor_id=doctor_id, appointments=count, doctor_fees=fees)
+            for doctor_id, (count, fees) in compute_doctor_pieces(db, day, day).get(day, {}).items()
+        ])
+        db.add_all(_service_rollups(day, compute_service_pieces(db, day, day).get(day, {})))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise DayClosedError(409, f"Day {day.isoformat()} is already closed")
+    except Exception:
+        db.rollback()
+        raise
+
+    result = close_record(marker)
+    result["patient_ids"] = patient_ids
+    return result
+
+def reopen_day(db: Session, day: date) -> None:
+    """Drop the day's snapshots and marker; settled appointment statuses are kept"""
+    if not db.query(DayClose.close_date).filter(DayClose.close_date == day).first():
+        raise DayClosedError(404, f"Day {day.isoformat()} is not closed")
+    db.query(DailyDoctorRollup).filter(DailyDoctorRollup.close_date == day).delete(synchronize_session=False)
+    db.query(DailyServiceRollup).filter(DailyServiceRollup.close_date == day).delete(synchronize_session=False)
+    db.query(DayClose).filter(DayClose.close_date == day).delete(synchronize_session=False)
+    db.commit()
+
+def close_record(row: DayClose) -> dict:
+    return {
+        "date": row.close_date.isoformat(),
+        "closed_at": row.closed_at.isoformat() if row.closed_at else None,
+        "summary": _summary_values(row),
+        "stale_completed": row.stale_completed,
+        "stale_no_show": row.stale_no_show,
+        "bills_locked": row.bills_locked
+    }
+
+def list_closes(db: Session, limit: int = 30) -> List[dict]:
+    rows = db.query(DayClose).order_by(DayClose.close_date.desc()).limit(limit).all()
+    return [close_record(r) for r in rows]
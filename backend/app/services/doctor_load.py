@@ -0,0 +1,88 @@
+"""
+Live daily load per doctor for the booking screen
+
+Everything comes from one statement: doctors left-joined to today's
+appointment counts (grouped over idx_appointment_doctor_date), today's token
+counter and the doctor's schedule. Capacity is derived from the schedule
+window when today is a working day.
+"""
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Doctor, Appointment, TokenCounter, DoctorSchedule
+
+def schedule_capacity(working_days: Optional[str], start_time, end_time, day: date) -> Optional[int]:
+    """Bookable slots for the day, 0 on a day off, None without a schedule"""
+    if not working_days or start_time is None or end_time is None:
+        return None
+    days = {d.strip().lower() for d in working_days.split(",")}
+    if day.strftime("%A").lower() not in days:
+        return 0
+    minutes = (datetime.combine(day, end_time) - datetime.combine(day, start_time)).total_seconds() / 60
+    return max(int(minutes // settings.appointment_slot_minutes), 0)
+
+def doctors_with_today_stats(db: Session, status: Optional[str] = "Active",
+                             specialization: Optional[str] = None,
+                             day: Optional[date] = None) -> List[dict]:
+    day = day or date.today()
+
+    counts = (
+        select(
+            Appointment.doctor_id,
+            func.count().label("booked"),
+            func.sum(case((Appointment.status == "Completed", 1), else_=0)).label("completed"),
+            func.sum(case((Appointment.status == "Cancelled", 1), else_=0)).label("cancelled")
+        )
+        .where(Appointment.appointment_date == day)
+        .group_by(Appointment.doctor_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            Doctor,
+            counts.c.booked, counts.c.completed, counts.c.cancelled,
+            TokenCounter.last_token_number,
+            DoctorSchedule.working_days, DoctorSchedule.start_time, DoctorSchedule.end_time
+        )
+        .outerjoin(counts, counts.c.doctor_id == Doctor.doctor_id)
+        .outerjoin(TokenCounter, (TokenCounter.doctor_id == Doctor.doctor_id) & (TokenCounter.token_date == day))
+        .outerjoin(DoctorSchedule, DoctorSchedule.doctor_id == Doctor.doctor_id)
+        .order_by(Doctor.doctor_id)
+    )
+    if status:
+        stmt = stmt.where(Doctor.status == status)
+    if specialization:
+        stmt = stmt.where(Doctor.specialization.ilike(f"%{specialization}%"))
+
+    result = []
+    date_str = day.strftime("%Y%m%d")
+    for d, booked, completed, cancelled, last_token, working_days, start_time, end_time in db.execute(stmt):
+        booked = int(booked or 0)
+        cancelled = int(cancelled or 0)
+        capacity = schedule_capacity(working_days, start_time, end_time, day)
+        active = booked - cancelled
+        result.append({
+            "doctor_id": d.doctor_id,
+            "doctor_name": d.doctor_name,
+            "specialization": d.specialization,
+            "consultation_charges": float(d.consultation_charges),
+            "hospital_charges": float(d.hospital_charges),
+            "status": d.status,
+            "created_at": d.created_at.isoformat(),
+            "updated_at": d.updated_at.isoformat(),
+            "today_stats": {
+                "date": day.isoformat(),
+                "booked": booked,
+                "completed": int(completed or 0),
+                "cancelled": cancelled,
+                "waiting": active - int(completed or 0),
+                "last_token": f"{d.doctor_id}-{date_str}-{last_token:03d}" if last_token else None,
+                "capacity": capacity,
+                "remaining_capacity": max(capacity - active, 0) if capacity is not None else None
+            }
+        })
+    return result
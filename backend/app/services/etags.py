@@ -0,0 +1,101 @@
+"""
+Weak ETags for cacheable GET resources
+
+Instead of hashing response bodies, each registered resource has a cheap
+version probe: MAX(updated_at) and COUNT(*) of the tables it is built from
+(single rows use their own updated_at). The ETag is a hash of that version
+plus the path and query string, so an unchanged resource answers 304 before
+its handler runs.
+
+The probe runs before the handler, so a write landing in between can only
+make the ETag older than the body - the next request then sees a new version
+and gets a full response. updated_at has one-second resolution on MySQL, so
+two edits to the same rows within one second share a version; the tags are
+weak for that reason.
+"""
+import hashlib
+import re
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from ..database import engine
+
+def table_version(conn, table: str) -> tuple:
+    return tuple(conn.execute(text(f"SELECT MAX(updated_at), COUNT(*) FROM {table}")).one())
+
+def _tables_probe(*tables: str) -> Callable:
+    def probe(conn, params) -> Optional[tuple]:
+        return tuple(table_version(conn, t) for t in tables)
+    return probe
+
+def _voucher_probe(conn, params) -> Optional[tuple]:
+    # The payload also carries the doctor's name
+    row = conn.execute(text("""
+        SELECT v.updated_at, d.updated_at
+        FROM vouchers v LEFT JOIN doctors d ON d.doctor_id = v.doctor_id
+        WHERE v.voucher_id = :voucher_id
+    """), {"voucher_id": int(params["voucher_id"])}).first()
+    return tuple(row) if row else None
+
+# (path pattern, query parameters that disable caching, probe)
+RESOURCES: List[Tuple[re.Pattern, Tuple[str, ...], Callable]] = [
+    (re.compile(r"^/api/doctors$"), ("include",), _tables_probe("doctors")),
+    (re.compile(r"^/api/doctors/specializations$"), (), _tables_probe("doctors")),
+    (re.compile(r"^/api/doctors/schedules$"), (), _tables_probe("doctor_schedules", "doctors")),
+    (re.compile(r"^/api/services$"), (), _tables_probe("services")),
+    (re.compile(r"^/api/vouchers/(?P<voucher_id>\d+)$"), (), _voucher_probe),
+]
+
+class ETagStats:
+    def __init__(self):
+        self.probes = 0
+        self.not_modified = 0
+        self.probe_errors = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "resources": [pattern.pattern for pattern, _, _ in RESOURCES],
+            "probes": self.probes,
+            "not_modified": self.not_modified,
+            "probe_errors": self.probe_errors
+        }
+
+etag_stats = ETagStats()
+
+def etag_probe_for(path: str, query_params) -> Optional[Callable[[], Optional[str]]]:
+    """A callable computing the ETag for this request, or None if it is not cacheable"""
+    for pattern, bypass, probe in RESOURCES:
+        match = pattern.match(path)
+        if not match:
+            continue
+        if any(name in query_params for name in bypass):
+            return None
+        params = match.groupdict()
+        query = "&".join(f"{k}={v}" for k, v in sorted(query_params.multi_items()))
+
+        def compute() -> Optional[str]:
+            etag_stats.probes += 1
+            with engine.connect() as conn:
+                version = probe(conn, params)
+            if version is None:
+                return None
+            digest = hashlib.sha1(f"{path}?{query}|{version!r}".encode()).hexdigest()[:20]
+            return f'W/"{digest}"'
+        return compute
+    return None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (list or *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
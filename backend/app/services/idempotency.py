@@ -0,0 +1,291 @@
+"""
+Idempotency keys for retried writes
+
+Reception terminals on flaky networks resend bookings, expenses and payment
+status changes. A request to one of IDEMPOTENT_ROUTES that carries an
+Idempotency-Key header runs once; a retry with the same key gets the stored
+response back (marked Idempotent-Replayed: true) without touching the
+business tables.
+
+- Keys are scoped to method and path, and a retry must send the same body:
+  reusing a key for a different body is refused with 422.
+- The first request claims the key by inserting its idempotency_keys row, so
+  the primary key makes the claim atomic across workers. Duplicates arriving
+  meanwhile wait for it, on an event in the same worker or by polling the row
+  from other workers, for up to IDEMPOTENCY_WAIT_SECONDS and then get 409.
+- Responses below 500 are stored for IDEMPOTENCY_TTL_HOURS and kept in a
+  per-worker LRU, so replays usually skip the database as well. A 5xx or an
+  exception releases the claim so the client can retry; a claim still open
+  after WORKER_TIMEOUT belonged to a dead worker and is taken over.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+
+from ..config import settings
+from ..database import engine
+from ..models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_ROUTES = (
+    ("POST", re.compile(r"^/api/appointments$")),
+    ("POST", re.compile(r"^/api/expenses$")),
+    ("PATCH", re.compile(r"^/api/bills/\d+/payment-status$")),
+)
+
+POLL_SECONDS = 0.2
+PURGE_INTERVAL_SECONDS = 3600
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    content_type: Optional[str]
+    body: str
+    expires_at: datetime
+
+def is_idempotent_route(method: str, path: str) -> bool:
+    return any(method == m and pattern.match(path) for m, pattern in IDEMPOTENT_ROUTES)
+
+def _sha256(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _error(status_code: int, detail: str) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"detail": detail})
+
+class IdempotencyStore:
+    """idempotency_keys table with an LRU of completed responses in front"""
+
+    def __init__(self, max_entries: int, ttl_hours: int, wait_seconds: int, abandon_seconds: int):
+        self.max_entries = max_entries
+        self.ttl = timedelta(hours=ttl_hours)
+        self.wait_seconds = wait_seconds
+        self.abandon_seconds = abandon_seconds
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Event] = {}  # keys this worker is running (event loop only)
+        self._purged_at = 0.0
+        self.executed = 0
+        self.memory_replays = 0
+        self.db_replays = 0
+        self.waited = 0
+        self.in_progress = 0
+        self.mismatches = 0
+        self.released = 0
+
+    # ---------- memory ----------
+    def _cached(self, key_hash: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._cache.get(key_hash)
+            if entry is None:
+                return None
+            if entry.expires_at <= datetime.utcnow():
+                del self._cache[key_hash]
+                return None
+            self._cache.move_to_end(key_hash)
+            return entry
+
+    def _remember(self, key_hash: str, entry: StoredResponse):
+        with self._lock:
+            self._cache[key_hash] = entry
+            self._cache.move_to_end(key_hash)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    # ---------- table (run in the threadpool) ----------
+    def _claim(self, key_hash: str, request_hash: str) -> Tuple[str, Optional[StoredResponse]]:
+        """("claimed" | "done" | "busy" | "mismatch" | "retry", stored response when done)"""
+        table = IdempotencyKey.__table__
+        now = datetime.utcnow()
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(table).values(
+                    key_hash=key_hash, request_hash=request_hash, created_at=now, expires_at=now + self.ttl
+                ))
+            return "claimed", None
+        except IntegrityError:
+            pass
+
+        with engine.begin() as conn:
+            row = conn.execute(select(table).where(table.c.key_hash == key_hash)).mappings().first()
+            if row is None:
+                # Released in the meantime
+                return "retry", None
+            if row["expires_at"] <= now:
+                conn.execute(delete(table).where(table.c.key_hash == key_hash, table.c.expires_at <= now))
+                return "retry", None
+            if row["request_hash"] != request_hash:
+                return "mismatch", None
+            if row["status_code"] is not None:
+                return "done", StoredResponse(
+                    row["request_hash"], row["status_code"], row["content_type"],
+                    row["response_body"] or "", row["expires_at"]
+                )
+            # Still open long after any request could have finished: its worker died
+            taken = conn.execute(
+                update(table)
+                .where(
+                    table.c.key_hash == key_hash,
+                    table.c.status_code.is_(None),
+                    table.c.created_at < now - timedelta(seconds=self.abandon_seconds)
+                )
+                .values(created_at=now, expires_at=now + self.ttl)
+            ).rowcount
+        return ("claimed", None) if taken else ("busy", None)
+
+    def _complete(self, key_hash: str, entry: StoredResponse):
+        table = IdempotencyKey.__table__
+        with engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.key_hash == key_hash).values(
+                    status_code=entry.status_code, content_type=entry.content_type,
+                    response_body=entry.body, expires_at=entry.expires_at
+                )
+            )
+
+    def _release(self, key_hash: str):
+        table = IdempotencyKey.__table__
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key_hash == key_hash, table.c.status_code.is_(None)))
+
+    def purge_expired(self) -> int:
+        """Delete stored responses past their TTL"""
+        table = IdempotencyKey.__table__
+        with engine.begin() as conn:
+            removed = conn.execute(delete(table).where(table.c.expires_at <= datetime.utcnow())).rowcount
+        self._purged_at = time.monotonic()
+        return removed
+
+    # ---------- request handling ----------
+    def _reused(self) -> JSONResponse:
+        self.mismatches += 1
+        return _error(422, f"{IDEMPOTENCY_HEADER} was already used with a different request")
+
+    def _replay(self, entry: StoredResponse, request_hash: str, from_memory: bool) -> Response:
+        if entry.request_hash != request_hash:
+            return self._reused()
+        if from_memory:
+            self.memory_replays += 1
+        else:
+            self.db_replays += 1
+        return Response(
+            content=entry.body, status_code=entry.status_code,
+            media_type=entry.content_type, headers={REPLAYED_HEADER: "true"}
+        )
+
+    async def _run(self, key_hash: str, request_hash: str, request: Request, call_next: Callable) -> Response:
+        self.executed += 1
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        except Exception:
+            self.released += 1
+            await run_in_threadpool(self._release, key_hash)
+            raise
+        if response.status_code >= 500:
+            self.released += 1
+            await run_in_threadpool(self._release, key_hash)
+        else:
+            entry = StoredResponse(
+                request_hash, response.status_code, response.headers.get("content-type"),
+                body.decode("utf-8", errors="replace"), datetime.utcnow() + self.ttl
+            )
+            await run_in_threadpool(self._complete, key_hash, entry)
+            self._remember(key_hash, entry)
+
+        async def stored_body():
+            yield body
+
+        response.body_iterator = stored_body()
+        return response
+
+    async def handle(self, request: Request, call_next: Callable) -> Response:
+        """Run the request once per key; replay, wait or refuse duplicates"""
+        key = request.headers[IDEMPOTENCY_HEADER]
+        if len(key) > MAX_KEY_LENGTH:
+            return _error(400, f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+        key_hash = _sha256(request.method, request.url.path, key)
+        request_hash = _sha256(await request.body())
+        if time.monotonic() - self._purged_at > PURGE_INTERVAL_SECONDS:
+            await run_in_threadpool(self.purge_expired)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_seconds
+        while True:
+            entry = self._cached(key_hash)
+            if entry is not None:
+                return self._replay(entry, request_hash, from_memory=True)
+
+            first = self._inflight.get(key_hash)
+            if first is not None:
+                # Same worker: wait for the first request to finish, then look again
+                self.waited += 1
+                try:
+                    await asyncio.wait_for(first.wait(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                continue
+
+            event = self._inflight[key_hash] = asyncio.Event()
+            try:
+                state, entry = await run_in_threadpool(self._claim, key_hash, request_hash)
+                if state == "claimed":
+                    return await self._run(key_hash, request_hash, request, call_next)
+            finally:
+                del self._inflight[key_hash]
+                event.set()
+            if state == "done":
+                self._remember(key_hash, entry)
+                return self._replay(entry, request_hash, from_memory=False)
+            if state == "mismatch":
+                return self._reused()
+            if loop.time() >= deadline:
+                break
+            if state == "busy":
+                # Another worker is running it
+                self.waited += 1
+                await asyncio.sleep(POLL_SECONDS)
+
+        self.in_progress += 1
+        return _error(409, f"A request with this {IDEMPOTENCY_HEADER} is still in progress; retry later")
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "cached_keys": cached,
+            "max_cached_keys": self.max_entries,
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+            "executed": self.executed,
+            "memory_replays": self.memory_replays,
+            "db_replays": self.db_replays,
+            "waited": self.waited,
+            "in_progress_conflicts": self.in_progress,
+            "key_reuse_rejected": self.mismatches,
+            "released_after_error": self.released
+        }
+
+idempotency_store = IdempotencyStore(
+    max_entries=settings.idempotency_cache_size,
+    ttl_hours=settings.idempotency_ttl_hours,
+    wait_seconds=settings.idempotency_wait_seconds,
+    abandon_seconds=settings.worker_timeout
+)
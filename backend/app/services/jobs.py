@@ -0,0 +1,429 @@
+"""
+Background jobs for long-range reports, exports and maintenance
+
+POST /api/jobs queues a job and returns its id right away. A dispatcher
+thread waits for a free slot of the job's group, then runs the work in a
+process pool (spawned processes with their own DB connections), so a
+multi-year report never holds a request thread or a pooled connection of the
+serving worker. Results are written to `{job_results_dir}/{job_id}/`.
+
+Slots are lock files shared by every server worker: at most
+`job_concurrency[group]` jobs of a group run at once across the whole
+deployment, however many workers accepted them.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from ..config import settings
+from .startup import try_lock_file, unlock_file
+
+class JobError(Exception):
+    """Job request the client must fix (unknown type, bad parameters, unknown id)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def results_dir() -> Path:
+    return Path(settings.job_results_dir)
+
+def _job_dir(job_id: str) -> Path:
+    if not job_id.isalnum():
+        raise JobError(404, "Job not found")
+    return results_dir() / job_id
+
+def _write_status(job_dir: Path, status: dict):
+    tmp = job_dir / "status.json.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(status, fh)
+    os.replace(tmp, job_dir / "status.json")
+
+def read_status(job_id: str) -> dict:
+    path = _job_dir(job_id) / "status.json"
+    if not path.exists():
+        raise JobError(404, "Job not found")
+    with open(path) as fh:
+        return json.load(fh)
+
+def _update_status(job_dir: Path, **fields) -> dict:
+    with open(job_dir / "status.json") as fh:
+        status = json.load(fh)
+    status.update(fields)
+    _write_status(job_dir, status)
+    return status
+
+# =====================================================
+# JOB TYPES (run inside pool processes)
+# =====================================================
+def _date_param(params: dict, name: str) -> date:
+    value = params.get(name)
+    if not value:
+        raise JobError(400, f"Parameter '{name}' is required")
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise JobError(400, f"Parameter '{name}' must be YYYY-MM-DD")
+
+def _validate_range(params: dict) -> dict:
+    start_date = _date_param(params, "start_date")
+    end_date = _date_param(params, "end_date")
+    if end_date < start_date:
+        raise JobError(400, "end_date must not be before start_date")
+    return {**params, "start_date": start_date.isoformat(), "end_date": end_date.isoformat()}
+
+def _validate_timeseries(params: dict) -> dict:
+    from .timeseries import METRICS, BUCKETS
+    params = _validate_range(params)
+    metrics = params.get("metrics") or list(METRICS)
+    if isinstance(metrics, str):
+        metrics = metrics.split(",")
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise JobError(400, f"Unknown metrics: {', '.join(unknown)}")
+    bucket = params.get("bucket", "month")
+    if bucket not in BUCKETS:
+        raise JobError(400, f"bucket must be one of: {', '.join(BUCKETS)}")
+    return {**params, "metrics": metrics, "bucket": bucket}
+
+def _segments(start_date: date, end_date: date, days: int = 92):
+    current = start_date
+    while current <= end_date:
+        segment_end = min(current + timedelta(days=days - 1), end_date)
+        yield current, segment_end
+        current = segment_end + timedelta(days=1)
+
+def _ranged_report(report: Callable) -> Callable:
+    """
+    Compute the pieces a quarter at a time to report progress, then build the
+    full-range report from them. The pieces go into a cache owned by this job:
+    pool processes outlive jobs and never see the server's invalidations, so
+    the shared report_cache would serve later jobs stale days.
+    """
+    def run(db, params: dict, job_dir: Path, progress: Callable):
+        from .report_cache import ReportCache
+        cache = ReportCache(settings.report_cache_open_ttl_seconds, settings.report_cache_closed_ttl_seconds)
+        start_date = date.fromisoformat(params["start_date"])
+        end_date = date.fromisoformat(params["end_date"])
+        segments = list(_segments(start_date, end_date))
+        for i, (lo, hi) in enumerate(segments):
+            report(db, lo, hi, cache=cache)
+            progress((i + 1) / (len(segments) + 1))
+        result = report(db, start_date, end_date, cache=cache)
+        path = job_dir / "result.json"
+        with open(path, "w") as fh:
+            json.dump(result, fh)
+        return path.name
+    return run
+
+def _run_timeseries(db, params: dict, job_dir: Path, progress: Callable):
+    from .timeseries import build_timeseries
+    result = build_timeseries(
+        db, params["metrics"], params["bucket"],
+        date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"]),
+        params.get("doctor_id")
+    )
+    path = job_dir / "result.json"
+    with open(path, "w") as fh:
+        json.dump(result, fh, default=str)
+    return path.name
+
+def _run_patients_export(db, params: dict, job_dir: Path, progress: Callable):
+    from ..models import Patient
+    total = db.query(Patient).count() or 1
+    columns = ["patient_id", "patient_name", "age", "phone_number", "gender", "nic", "registration_date", "created_at"]
+    path = job_dir / "patients.csv"
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        query = db.query(*[getattr(Patient, c) for c in columns]).order_by(Patient.patient_id)
+        for i, row in enumerate(query.yield_per(5000), start=1):
+            writer.writerow(row)
+            if i % 5000 == 0:
+                progress(i / total)
+    return path.name
+
+def _validate_reconcile(params: dict) -> dict:
+    try:
+        start_id = int(params["start_id"]) if params.get("start_id") is not None else None
+        end_id = int(params["end_id"]) if params.get("end_id") is not None else None
+        sample_size = int(params.get("sample_size", 1000))
+    except (TypeError, ValueError):
+        raise JobError(400, "start_id, end_id and sample_size must be integers")
+    fix = params.get("fix", False)
+    if isinstance(fix, str):
+        fix = fix.lower() in ("1", "true", "yes")
+    return {"fix": bool(fix), "start_id": start_id, "end_id": end_id, "sample_size": sample_size}
+
+def _run_bill_reconcile(db, params: dict, job_dir: Path, progress: Callable):
+    from .bill_reconcile import reconcile_bills
+    result = reconcile_bills(db, params["fix"], params["start_id"], params["end_id"],
+                             params["sample_size"], progress=progress)
+    path = job_dir / "result.json"
+    with open(path, "w") as fh:
+        json.dump(result, fh, default=str)
+    return path.name
+
+def _after_reconcile(job_dir: Path, result_file: str):
+    """Fixed bills change cached report days and histories in the serving worker"""
+    from .report_cache import report_cache
+    from .patient_history import history_cache
+    with open(job_dir / result_file) as fh:
+        result = json.load(fh)
+    report_cache.invalidate(*(date.fromisoformat(d) for d in result.get("touched_days", [])))
+    history_cache.invalidate(*result.get("touched_patients", []))
+
+def _validate_archive(params: dict) -> dict:
+    cutoff = params.get("cutoff")
+    if cutoff:
+        try:
+            cutoff = date.fromisoformat(str(cutoff)).isoformat()
+        except ValueError:
+            raise JobError(400, "cutoff must be YYYY-MM-DD")
+    return {"cutoff": cutoff or None}
+
+def _run_archive(db, params: dict, job_dir: Path, progress: Callable):
+    from .archive import run_archival
+    cutoff = date.fromisoformat(params["cutoff"]) if params["cutoff"] else None
+    result = run_archival(cutoff=cutoff, progress=progress)
+    path = job_dir / "result.json"
+    with open(path, "w") as fh:
+        json.dump(result, fh)
+    return path.name
+
+def _validate_partitions(params: dict) -> dict:
+    convert = params.get("convert", False)
+    if isinstance(convert, str):
+        convert = convert.lower() in ("1", "true", "yes")
+    return {"convert": bool(convert)}
+
+def _run_partitions(db, params: dict, job_dir: Path, progress: Callable):
+    from .table_partitions import maintain_partitions
+    result = maintain_partitions(convert=params["convert"])
+    path = job_dir / "result.json"
+    with open(path, "w") as fh:
+        json.dump(result, fh)
+    return path.name
+
+def _reports():
+    from .reports import report_summary, report_doctor_wise, report_service_wise
+    return report_summary, report_doctor_wise, report_service_wise
+
+# job type -> (concurrency group, parameter validator, runner factory, read-only)
+# Read-only jobs may run on a replica; the others write (or must see current
+# data to decide what to write) and always use the primary.
+JOB_TYPES: Dict[str, tuple] = {
+    "report_summary": ("reports", _validate_range, lambda: _ranged_report(_reports()[0]), True),
+    "report_doctor_wise": ("reports", _validate_range, lambda: _ranged_report(_reports()[1]), True),
+    "report_service_wise": ("reports", _validate_range, lambda: _ranged_report(_reports()[2]), True),
+    "report_timeseries": ("reports", _validate_timeseries, lambda: _run_timeseries, True),
+    "patients_export": ("exports", lambda params: params, lambda: _run_patients_export, True),
+    "bill_reconcile": ("maintenance", _validate_reconcile, lambda: _run_bill_reconcile, False),
+    "archive": ("maintenance", _validate_archive, lambda: _run_archive, False),
+    "clinical_partitions": ("maintenance", _validate_partitions, lambda: _run_partitions, False),
+}
+
+# job type -> hook run in the server process after the job completed
+ON_COMPLETE: Dict[str, Callable[[Path, str], None]] = {
+    "bill_reconcile": _after_reconcile,
+}
+
+def _execute(job_id: str, job_type: str, params: dict) -> str:
+    """Entry point inside a pool process; returns the result file name"""
+    from ..database import SessionLocal, read_router
+
+    job_dir = _job_dir(job_id)
+    last = [0.0]
+
+    def progress(fraction: float):
+        # Throttled: at most one status write per 5% step
+        if fraction - last[0] >= 0.05 or fraction >= 1:
+            last[0] = fraction
+            _update_status(job_dir, progress=round(min(fraction, 1.0), 3))
+
+    _, _, runner, read_only = JOB_TYPES[job_type]
+    # Long reads go to a replica when one is healthy; writing jobs use the primary
+    replica = read_router.pick() if read_only and read_router.enabled else None
+    db = SessionLocal(bind=replica["engine"]) if replica else SessionLocal()
+    try:
+        return runner()(db, params, job_dir, progress)
+    finally:
+        db.close()
+
+# =====================================================
+# DISPATCH (server side)
+# =====================================================
+class JobRunner:
+    def __init__(self, max_workers: int, concurrency: Dict[str, int]):
+        self.max_workers = max_workers
+        self.concurrency = concurrency
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: children must not inherit the server's threads or pooled connections
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool (a child died) so the next job starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire_slot(self, group: str):
+        """Block until one of the group's cross-worker slots is free; returns the open lock file"""
+        slots = max(1, self.concurrency.get(group, 1))
+        slot_dir = results_dir() / ".slots"
+        slot_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            for i in range(slots):
+                fh = open(slot_dir / f"{group}-{i}.lock", "a+")
+                if try_lock_file(fh):
+                    return fh
+                fh.close()
+            time.sleep(0.5)
+
+    def submit(self, job_type: str, params: dict) -> dict:
+        if job_type not in JOB_TYPES:
+            raise JobError(400, f"Unknown job type. Must be one of: {', '.join(JOB_TYPES)}")
+        group, validate, _, _ = JOB_TYPES[job_type]
+        params = validate(dict(params or {}))
+
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        status = {
+            "job_id": job_id,
+            "job_type": job_type,
+            "group": group,
+            "params": params,
+            "status": "queued",
+            "progress": 0.0,
+            "result_file": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None
+        }
+        _write_status(job_dir, status)
+        self.submitted += 1
+        threading.Thread(target=self._dispatch, args=(job_id, job_type, group, params),
+                         name=f"job-{job_id[:8]}", daemon=True).start()
+        return status
+
+    def _dispatch(self, job_id: str, job_type: str, group: str, params: dict):
+        job_dir = _job_dir(job_id)
+        slot = self._acquire_slot(group)
+        try:
+            _update_status(job_dir, status="running", started_at=datetime.now().isoformat())
+            pool = self._get_pool()
+            try:
+                result_file = pool.submit(_execute, job_id, job_type, params).result()
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise JobError(500, "The job process exited unexpectedly; submit the job again")
+            if job_type in ON_COMPLETE:
+                ON_COMPLETE[job_type](job_dir, result_file)
+            _update_status(job_dir, status="completed", progress=1.0, result_file=result_file,
+                           finished_at=datetime.now().isoformat())
+            self.completed += 1
+            print(f"✅ Job {job_id} ({job_type}) completed")
+        except Exception as e:
+            detail = e.detail if isinstance(e, JobError) else str(e)
+            _update_status(job_dir, status="failed", error=detail, finished_at=datetime.now().isoformat())
+            self.failed += 1
+            print(f"❌ Job {job_id} ({job_type}) failed: {detail}")
+        finally:
+            unlock_file(slot)
+            slot.close()
+
+    def result_path(self, job_id: str) -> Path:
+        status = read_status(job_id)
+        if status["status"] != "completed" or not status["result_file"]:
+            raise JobError(409, f"Job is {status['status']}; no result yet")
+        return _job_dir(job_id) / status["result_file"]
+
+    def cleanup(self):
+        """Delete finished jobs older than job_result_ttl_hours"""
+        root = results_dir()
+        if not root.exists():
+            return
+        cutoff = time.time() - settings.job_result_ttl_hours * 3600
+        for job_dir in root.iterdir():
+            if job_dir.name.startswith(".") or not job_dir.is_dir():
+                continue
+            status_file = job_dir / "status.json"
+            try:
+                if status_file.stat().st_mtime >= cutoff:
+                    continue
+                with open(status_file) as fh:
+                    finished = json.load(fh)["status"] in ("completed", "failed")
+            except (OSError, ValueError, KeyError):
+                continue
+            if finished:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "job_types": {name: spec[0] for name, spec in JOB_TYPES.items()},
+            "concurrency": self.concurrency,
+            "pool_workers": self.max_workers,
+            "pool_started": self._pool is not None,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+def fail_orphaned_jobs() -> int:
+    """
+    Mark jobs left queued or running by a previous server process as failed.
+    Their dispatcher thread and pool process died with it, so polls would
+    otherwise report them as in progress forever. Runs once at startup.
+    """
+    failed = 0
+    for path in results_dir().glob("*/status.json"):
+        try:
+            with open(path) as fh:
+                status = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if status.get("status") not in ("queued", "running"):
+            continue
+        status["status"] = "failed"
+        status["error"] = "Interrupted by a server restart; submit the job again"
+        status["finished_at"] = datetime.now().isoformat()
+        _write_status(path.parent, status)
+        failed += 1
+    if failed:
+        print(f"⚠️ Marked {failed} interrupted jobs as failed")
+    return failed
+
+job_runner = JobRunner(settings.job_workers, settings.job_concurrency)
@@ -0,0 +1,213 @@
+"""
+Patient visit history
+
+One page of a patient's visits (newest first) is loaded in three queries no
+matter how many visits it holds: the patient, the appointments with doctor and
+bill joined in, and every additional expense for the page via selectinload.
+Pages are keyed by a (visit date, appointment id) cursor, so no COUNT is needed.
+
+Pages are cached per patient and dropped whenever that patient books, gets an
+expense, has a bill paid or is edited.
+
+Once a page reaches dates that may be archived, the archive tables are read
+for the rest of it (appointments, bills, expenses, plus the doctors).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from ..config import settings
+from ..models import Patient, Appointment, Doctor, AppointmentArchive, BillArchive, AdditionalExpenseArchive
+from .archive import archive_boundary, archive_session
+
+def _visit_dict(apt, doctor, bill, expenses) -> dict:
+    return {
+        "appointment_id": apt.appointment_id,
+        "appointment_date": apt.appointment_date.isoformat(),
+        "token_number": apt.token_number,
+        "status": apt.status,
+        "doctor_charges": float(apt.doctor_charges),
+        "hospital_charges": float(apt.hospital_charges),
+        "doctor": {
+            "doctor_id": doctor.doctor_id,
+            "doctor_name": doctor.doctor_name,
+            "specialization": doctor.specialization
+        } if doctor else None,
+        "bill": {
+            "bill_id": bill.bill_id,
+            "bill_date": bill.bill_date.isoformat(),
+            "additional_expenses_total": float(bill.additional_expenses_total),
+            "total_amount": float(bill.total_amount),
+            "payment_status": bill.payment_status
+        } if bill else None,
+        "additional_expenses": [
+            {
+                "expense_id": e.expense_id,
+                "service_type": e.service_type,
+                "service_description": e.service_description,
+                "amount": float(e.amount),
+                "created_at": e.created_at.isoformat()
+            } for e in expenses
+        ]
+    }
+
+def _before_cursor(model, before_date: Optional[date], before_id: Optional[int]):
+    if before_id is not None:
+        return or_(
+            model.appointment_date < before_date,
+            and_(model.appointment_date == before_date, model.appointment_id < before_id)
+        )
+    return model.appointment_date < before_date
+
+def _archived_visits(db: Session, patient_id: int, limit: int,
+                     before_date: Optional[date], before_id: Optional[int]) -> List[dict]:
+    with archive_session(db) as cold:
+        query = cold.query(AppointmentArchive).filter(AppointmentArchive.patient_id == patient_id)
+        if before_date is not None:
+            query = query.filter(_before_cursor(AppointmentArchive, before_date, before_id))
+        rows = (
+            query.order_by(AppointmentArchive.appointment_date.desc(), AppointmentArchive.appointment_id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        if not rows:
+            return []
+        ids = [r.appointment_id for r in rows]
+        bills = {b.appointment_id: b for b in cold.query(BillArchive).filter(BillArchive.appointment_id.in_(ids))}
+        expenses = {}
+        for e in cold.query(AdditionalExpenseArchive).filter(
+            AdditionalExpenseArchive.appointment_id.in_(ids)
+        ).order_by(AdditionalExpenseArchive.expense_id):
+            expenses.setdefault(e.appointment_id, []).append(e)
+
+    doctors = {
+        d.doctor_id: d for d in db.query(Doctor).filter(Doctor.doctor_id.in_({r.doctor_id for r in rows}))
+    }
+    return [
+        _visit_dict(r, doctors.get(r.doctor_id), bills.get(r.appointment_id), expenses.get(r.appointment_id, []))
+        for r in rows
+    ]
+
+def load_history(db: Session, patient_id: int, limit: int,
+                 before_date: Optional[date] = None, before_id: Optional[int] = None) -> Optional[dict]:
+    """One page of visits older than the cursor; None if the patient does not exist"""
+    patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+    if not patient:
+        return None
+
+    query = (
+        db.query(Appointment)
+        .options(
+            joinedload(Appointment.doctor),
+            joinedload(Appointment.bill),
+            selectinload(Appointment.additional_expenses)
+        )
+        .filter(Appointment.patient_id == patient_id)
+    )
+    if before_date is not None:
+        query = query.filter(_before_cursor(Appointment, before_date, before_id))
+
+    # One extra row tells us whether another page exists
+    rows = (
+        query.order_by(Appointment.appointment_date.desc(), Appointment.appointment_id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    visits = [_visit_dict(apt, apt.doctor, apt.bill, apt.additional_expenses) for apt in rows]
+
+    # Archived visits can only belong on this page if it is short or already below the boundary
+    boundary = archive_boundary()
+    if boundary is not None and (len(rows) <= limit or rows[-1].appointment_date < boundary):
+        visits += _archived_visits(db, patient_id, limit, before_date, before_id)
+        visits.sort(key=lambda v: (v["appointment_date"], v["appointment_id"]), reverse=True)
+
+    has_more = len(visits) > limit
+    visits = visits[:limit]
+    last = visits[-1] if visits else None
+
+    return {
+        "patient": {
+            "patient_id": patient.patient_id,
+            "patient_name": patient.patient_name,
+            "age": patient.age,
+            "phone_number": patient.phone_number,
+            "gender": patient.gender,
+            "nic": patient.nic,
+            "registration_date": patient.registration_date.isoformat()
+        },
+        "visits": visits,
+        "has_more": has_more,
+        "next_before_date": last["appointment_date"] if has_more else None,
+        "next_before_id": last["appointment_id"] if has_more else None
+    }
+
+class PatientHistoryCache:
+    """LRU of history pages grouped per patient, with a TTL as a cross-worker safety net"""
+
+    def __init__(self, max_patients: int, ttl_seconds: int, settle_seconds: int = 0):
+        self.max_patients = max_patients
+        self.ttl_seconds = ttl_seconds
+        # Skip caching right after an invalidation while a read replica may lag
+        self.settle_seconds = settle_seconds
+        self._patients = OrderedDict()  # patient_id -> {page_key: (expires_at, page)}
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, patient_id: int, key: tuple) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            pages = self._patients.get(patient_id)
+            entry = pages.get(key) if pages else None
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._patients.move_to_end(patient_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, patient_id: int, key: tuple, page: dict):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._invalidated_at.get(patient_id, float("-inf")) < self.settle_seconds:
+                return
+            self._patients.setdefault(patient_id, {})[key] = (now + self.ttl_seconds, page)
+            self._patients.move_to_end(patient_id)
+            while len(self._patients) > self.max_patients:
+                self._patients.popitem(last=False)
+
+    def invalidate(self, *patient_ids: Optional[int]):
+        now = time.monotonic()
+        with self._lock:
+            for patient_id in patient_ids:
+                if patient_id is None:
+                    continue
+                if self.settle_seconds:
+                    self._invalidated_at[patient_id] = now
+                if self._patients.pop(patient_id, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "patients": len(self._patients),
+                "pages": sum(len(p) for p in self._patients.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "max_patients": self.max_patients,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+history_cache = PatientHistoryCache(
+    settings.history_cache_max_patients,
+    settings.history_cache_ttl_seconds,
+    settle_seconds=settings.replica_max_lag_seconds if settings.read_replica_urls else 0
+)
@@ -0,0 +1,272 @@
+"""
+Streaming bulk patient import (CSV)
+
+Uploads are spooled to disk in fixed-size reads, never held in memory. A
+single request may carry at most `max_file_size` bytes; larger files are sent
+as consecutive parts to the same job (`job_id=...&final=false`, then a last
+part with `final=true`). The import then runs on a background thread, reading
+the spooled file row by row, validating each with PatientCreate and upserting
+by NIC in chunks of `import_chunk_size`.
+
+All job state lives under `{upload_dir}/imports/{job_id}/` (status.json,
+errors.csv), so any server worker can answer progress polls.
+"""
+import csv
+import io
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, update
+
+from ..config import settings
+from ..database import engine
+from ..models import Patient
+from ..schemas import PatientCreate
+from .patient_history import history_cache
+from .report_cache import report_cache
+
+READ_BLOCK = 1024 * 1024
+UPDATABLE = ("patient_name", "age", "phone_number", "gender")
+ERROR_SAMPLE = 20
+
+class PatientImportError(Exception):
+    """Import request the client must fix (bad job id/state, oversized part)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def imports_dir() -> Path:
+    return Path(settings.upload_dir) / "imports"
+
+def _job_dir(job_id: str) -> Path:
+    # job ids are uuid hex; reject anything that could escape the directory
+    if not job_id.isalnum():
+        raise PatientImportError(404, "Import job not found")
+    return imports_dir() / job_id
+
+def _write_status(job_dir: Path, status: dict):
+    tmp = job_dir / "status.json.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(status, fh)
+    os.replace(tmp, job_dir / "status.json")
+
+def read_status(job_id: str) -> dict:
+    path = _job_dir(job_id) / "status.json"
+    if not path.exists():
+        raise PatientImportError(404, "Import job not found")
+    with open(path) as fh:
+        return json.load(fh)
+
+def errors_path(job_id: str) -> Path:
+    return _job_dir(job_id) / "errors.csv"
+
+async def receive_part(upload, job_id: Optional[str], final: bool) -> dict:
+    """Append one uploaded part to a job's spool file (creating the job if needed)"""
+    new_job = not job_id
+    if job_id:
+        status = read_status(job_id)
+        if status["status"] != "uploading":
+            raise PatientImportError(409, f"Import job is already {status['status']}")
+        job_dir = _job_dir(job_id)
+    else:
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        job_dir.mkdir(parents=True)
+        status = {
+            "job_id": job_id,
+            "status": "uploading",
+            "filename": upload.filename,
+            "bytes_received": 0,
+            "parts": 0,
+            "bytes_processed": 0,
+            "rows_processed": 0,
+            "inserted": 0,
+            "updated": 0,
+            "failed": 0,
+            "errors": [],
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "message": None
+        }
+
+    received = 0
+    with open(job_dir / "upload.csv", "ab") as fh:
+        while True:
+            block = await upload.read(READ_BLOCK)
+            if not block:
+                break
+            received += len(block)
+            if received > settings.max_file_size:
+                fh.truncate(status["bytes_received"])
+                if new_job:
+                    fh.close()
+                    discard_job(job_id)
+                raise PatientImportError(
+                    413, f"Part exceeds {settings.max_file_size} bytes; send the file in smaller parts"
+                )
+            fh.write(block)
+
+    status["bytes_received"] += received
+    status["parts"] += 1
+    if final:
+        status["status"] = "queued"
+    _write_status(job_dir, status)
+    if final:
+        threading.Thread(target=run_import, args=(job_id,), name=f"patient-import-{job_id[:8]}", daemon=True).start()
+    return status
+
+def _upsert_chunk(rows: Dict[str, dict]) -> Tuple[int, int]:
+    """Insert new NICs and update existing ones; returns (inserted, updated)"""
+    table = Patient.__table__
+    nics = list(rows)
+    with engine.begin() as conn:
+        existing = dict(conn.execute(select(table.c.nic, table.c.patient_id).where(table.c.nic.in_(nics))).all())
+        new_rows = [r for nic, r in rows.items() if nic not in existing]
+        changed = [r for nic, r in rows.items() if nic in existing]
+
+        if new_rows:
+            dialect = engine.dialect.name
+            if dialect in ("mysql", "sqlite"):
+                # A desk may register one of these NICs mid-import: upsert instead of failing the chunk
+                if dialect == "mysql":
+                    from sqlalchemy.dialects.mysql import insert as dialect_insert
+                    stmt = dialect_insert(table).values(new_rows)
+                    stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in UPDATABLE + ("updated_at",)})
+                else:
+                    from sqlalchemy.dialects.sqlite import insert as dialect_insert
+                    stmt = dialect_insert(table).values(new_rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["nic"],
+                        set_={c: stmt.excluded[c] for c in UPDATABLE + ("updated_at",)}
+                    )
+                conn.execute(stmt)
+            else:
+                conn.execute(insert(table), new_rows)
+
+        if changed:
+            stmt = update(table).where(table.c.nic == bindparam("b_nic")).values(
+                {c: bindparam(f"b_{c}") for c in UPDATABLE + ("updated_at",)}
+            )
+            conn.execute(stmt, [{f"b_{k}": v for k, v in r.items()} for r in changed])
+    # Updated patients' cached history pages show the old name, age and phone
+    history_cache.invalidate(*existing.values())
+    return len(new_rows), len(changed)
+
+def run_import(job_id: str):
+    job_dir = _job_dir(job_id)
+    status = read_status(job_id)
+    status["status"] = "running"
+    status["started_at"] = datetime.now().isoformat()
+    _write_status(job_dir, status)
+
+    chunk_size = settings.import_chunk_size
+    try:
+        with open(job_dir / "upload.csv", "rb") as raw, \
+                open(job_dir / "errors.csv", "w", newline="") as err_fh:
+            errors = csv.writer(err_fh)
+            errors.writerow(["row", "nic", "error"])
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+            missing = {"patient_name", "age", "phone_number", "gender", "nic"} - set(reader.fieldnames or [])
+            if missing:
+                raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+            chunk: Dict[str, dict] = {}
+            dates = set()
+
+            def flush():
+                inserted, updated = _upsert_chunk(chunk)
+                status["inserted"] += inserted
+                status["updated"] += updated
+                report_cache.invalidate(*dates)
+                chunk.clear()
+                dates.clear()
+                status["bytes_processed"] = raw.tell()
+                _write_status(job_dir, status)
+
+            # Row 1 is the header
+            for row_number, row in enumerate(reader, start=2):
+                status["rows_processed"] += 1
+                try:
+                    patient = PatientCreate(**{k: (v.strip() or None) if isinstance(v, str) else v
+                                               for k, v in row.items() if k})
+                except ValidationError as e:
+                    message = "; ".join(
+                        f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+                    )
+                    status["failed"] += 1
+                    errors.writerow([row_number, row.get("nic"), message])
+                    if len(status["errors"]) < ERROR_SAMPLE:
+                        status["errors"].append({"row": row_number, "nic": row.get("nic"), "error": message})
+                    continue
+
+                now = datetime.utcnow()
+                registration_date = patient.registration_date or now.date()
+                # A NIC repeated within the file: the later row wins
+                chunk[patient.nic] = {
+                    "patient_name": patient.patient_name,
+                    "age": patient.age,
+                    "phone_number": patient.phone_number,
+                    "gender": patient.gender,
+                    "nic": patient.nic,
+                    "registration_date": registration_date,
+                    "created_at": now,
+                    "updated_at": now
+                }
+                dates.add(registration_date)
+                if len(chunk) >= chunk_size:
+                    flush()
+            if chunk:
+                flush()
+
+        status["status"] = "completed"
+        status["bytes_processed"] = status["bytes_received"]
+        status["message"] = (f"{status['inserted']} inserted, {status['updated']} updated, "
+                             f"{status['failed']} rejected")
+        print(f"✅ Patient import {job_id}: {status['message']}")
+    except Exception as e:
+        status["status"] = "failed"
+        status["message"] = str(e)
+        print(f"❌ Patient import {job_id} failed: {e}")
+    finally:
+        status["finished_at"] = datetime.now().isoformat()
+        _write_status(job_dir, status)
+        # The spooled upload is no longer needed; status and error report stay
+        (job_dir / "upload.csv").unlink(missing_ok=True)
+
+def discard_job(job_id: str):
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+def fail_interrupted_imports() -> int:
+    """
+    Mark imports left queued or running by a previous server process as failed.
+    Their thread died with that process, so polls would otherwise report them as
+    in progress forever. Runs once at startup, before any worker takes uploads.
+    """
+    failed = 0
+    for path in imports_dir().glob("*/status.json"):
+        try:
+            with open(path) as fh:
+                status = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if status.get("status") not in ("queued", "running"):
+            continue
+        status["status"] = "failed"
+        status["message"] = "Interrupted by a server restart; upload the file again"
+        status["finished_at"] = datetime.now().isoformat()
+        _write_status(path.parent, status)
+        (path.parent / "upload.csv").unlink(missing_ok=True)
+        failed += 1
+    if failed:
+        print(f"⚠️ Marked {failed} interrupted patient imports as failed")
+    return failed
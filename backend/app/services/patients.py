@@ -0,0 +1,85 @@
+"""
+Patient registration
+
+Creation is a single INSERT that relies on the unique NIC constraint instead
+of a SELECT-then-INSERT check, so two desks registering the same NIC cannot
+both succeed. Where the dialect supports INSERT ... RETURNING (SQLite 3.35+,
+MariaDB, PostgreSQL) the stored row comes back in the same round trip;
+otherwise every column value is already known client-side except the id,
+which the driver reports from the insert itself.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import Patient
+from ..schemas import PatientCreate
+
+class PatientExists(Exception):
+    """Raised when the NIC is already registered"""
+
+    def __init__(self, patient: Patient):
+        super().__init__(f"Patient with NIC {patient.nic} already exists")
+        self.patient = patient
+
+def patient_dict(row) -> dict:
+    return {
+        "patient_id": row["patient_id"],
+        "patient_name": row["patient_name"],
+        "age": row["age"],
+        "phone_number": row["phone_number"],
+        "gender": row["gender"],
+        "nic": row["nic"],
+        "registration_date": row["registration_date"].isoformat(),
+        "created_at": row["created_at"].isoformat(),
+        "updated_at": row["updated_at"].isoformat()
+    }
+
+def _model_dict(patient: Patient) -> dict:
+    return patient_dict({c.name: getattr(patient, c.name) for c in Patient.__table__.columns})
+
+def find_by_nic(db: Session, nic: str) -> Optional[Patient]:
+    return db.query(Patient).filter(Patient.nic == nic).first()
+
+def insert_patient(db: Session, patient: PatientCreate) -> dict:
+    """INSERT the patient and commit; raises PatientExists on a NIC conflict"""
+    now = datetime.utcnow()
+    values = {
+        "patient_name": patient.patient_name,
+        "age": patient.age,
+        "phone_number": patient.phone_number,
+        "gender": patient.gender,
+        "nic": patient.nic,
+        "registration_date": patient.registration_date or date.today(),
+        "created_at": now,
+        "updated_at": now
+    }
+    table = Patient.__table__
+    stmt = insert(table).values(**values)
+    use_returning = db.get_bind().dialect.insert_returning
+
+    try:
+        if use_returning:
+            row = dict(db.execute(stmt.returning(*table.c)).mappings().one())
+        else:
+            result = db.execute(stmt)
+            row = {**values, "patient_id": result.inserted_primary_key[0]}
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = find_by_nic(db, patient.nic)
+        if existing is None:
+            # Some other constraint failed
+            raise
+        raise PatientExists(existing)
+    return patient_dict(row)
+
+def get_or_create_patient(db: Session, patient: PatientCreate):
+    """(patient dict, created) - registers the NIC or returns who already holds it"""
+    try:
+        return insert_patient(db, patient), True
+    except PatientExists as e:
+        return _model_dict(e.patient), False
@@ -0,0 +1,308 @@
+"""
+Batch bill receipt rendering (HTML / PDF)
+
+Receipt data for any number of bills is loaded in two queries (bills with
+appointment, patient and doctor joined; then every additional expense for
+those appointments). The HTML template is compiled once per process with the
+hospital details from Settings baked in. Rendering is split into chunks that
+run in a process pool; output is either one merged document or a zip with a
+file per bill.
+
+A merged PDF is drawn by a single pool task: reportlab cannot import pages
+from other PDFs, and no PDF merging library is a dependency.
+"""
+import html
+import io
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import lru_cache
+from string import Template
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import Bill, Appointment, Patient, Doctor, AdditionalExpense
+
+FORMATS = ("html", "pdf")
+OUTPUTS = ("merged", "zip")
+
+# =====================================================
+# DATA
+# =====================================================
+def load_receipts(db: Session, bill_ids: Optional[List[int]] = None,
+                  bill_date: Optional[date] = None) -> List[dict]:
+    """Plain dicts (picklable for the pool) for the selected bills, in bill_id order"""
+    query = (
+        db.query(Bill, Appointment.token_number, Patient, Doctor.doctor_name, Doctor.specialization)
+        .outerjoin(Appointment, Appointment.appointment_id == Bill.appointment_id)
+        .outerjoin(Patient, Patient.patient_id == Appointment.patient_id)
+        .outerjoin(Doctor, Doctor.doctor_id == Appointment.doctor_id)
+    )
+    if bill_ids:
+        query = query.filter(Bill.bill_id.in_(bill_ids))
+    if bill_date:
+        query = query.filter(Bill.bill_date == bill_date)
+    rows = query.order_by(Bill.bill_id).all()
+
+    expenses: Dict[int, list] = {}
+    appointment_ids = [bill.appointment_id for bill, *_ in rows]
+    if appointment_ids:
+        for e in db.query(
+            AdditionalExpense.appointment_id,
+            AdditionalExpense.service_type,
+            AdditionalExpense.service_description,
+            AdditionalExpense.amount
+        ).filter(AdditionalExpense.appointment_id.in_(appointment_ids)).order_by(AdditionalExpense.expense_id):
+            expenses.setdefault(e.appointment_id, []).append({
+                "description": e.service_description or e.service_type,
+                "amount": float(e.amount)
+            })
+
+    receipts = []
+    for bill, token_number, patient, doctor_name, specialization in rows:
+        receipts.append({
+            "bill_id": bill.bill_id,
+            "bill_date": bill.bill_date.isoformat(),
+            "bill_time": bill.bill_time.strftime("%H:%M") if bill.bill_time else "",
+            "token_number": token_number or "",
+            "patient_name": patient.patient_name if patient else "N/A",
+            "age": patient.age if patient else "",
+            "nic": patient.nic if patient else "",
+            "phone_number": patient.phone_number if patient else "",
+            "doctor_name": doctor_name or "N/A",
+            "specialization": specialization or "",
+            "doctor_charges": float(bill.doctor_charges),
+            "hospital_charges": float(bill.hospital_charges),
+            "additional_expenses": expenses.get(bill.appointment_id, []),
+            "total_amount": float(bill.total_amount),
+            "payment_status": bill.payment_status
+        })
+    return receipts
+
+# =====================================================
+# TEMPLATES
+# =====================================================
+DOCUMENT = Template("""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>$title</title>
+<style>
+body { font-family: Arial, sans-serif; color: #111; }
+.receipt { max-width: 560px; margin: 0 auto 24px; padding: 16px; page-break-after: always; }
+.receipt:last-child { page-break-after: auto; }
+.header { text-align: center; margin-bottom: 16px; }
+.header h3 { margin: 0 0 4px; }
+.header p { margin: 2px 0; font-size: 12px; color: #555; }
+table { width: 100%; border-collapse: collapse; margin: 12px 0; }
+th, td { border: 1px solid #ddd; padding: 6px 8px; }
+td.amount, th.amount { text-align: right; }
+tr.total { background: #f0f0f0; font-weight: bold; }
+.footer { text-align: center; font-size: 12px; color: #666; }
+</style></head><body>
+$body
+</body></html>""")
+
+RECEIPT = Template("""<div class="receipt">
+<div class="header">$header
+<p><strong>Receipt #$bill_id</strong> | $bill_date $bill_time</p>
+</div>
+<div><strong>Token Number:</strong> $token_number<br>
+<strong>Patient:</strong> $patient_name<br>
+<strong>Age:</strong> $age<br>
+<strong>NIC:</strong> $nic<br>
+<strong>Phone:</strong> $phone_number</div>
+<div style="margin-top: 8px;"><strong>Doctor:</strong> $doctor_name<br>
+<strong>Specialization:</strong> $specialization</div>
+<table>
+<thead><tr><th>Service</th><th class="amount">Amount</th></tr></thead>
+<tbody>
+$lines
+<tr class="total"><td>Total Amount</td><td class="amount">$total_amount</td></tr>
+</tbody>
+</table>
+<div><strong>Payment Status:</strong> $payment_status</div>
+<div class="footer">Thank you for choosing our hospital!</div>
+</div>""")
+
+LINE = Template('<tr><td>$description</td><td class="amount">$amount</td></tr>')
+
+@lru_cache(maxsize=1)
+def _receipt_template() -> Template:
+    """RECEIPT with the (static) hospital header substituted once per process"""
+    header = (
+        f"<h3>{html.escape(settings.hospital_name)}</h3>"
+        f"<p>{html.escape(settings.hospital_address)}</p>"
+        f"<p>{html.escape(settings.hospital_phone)} | {html.escape(settings.hospital_email)}</p>"
+    )
+    return Template(RECEIPT.safe_substitute(header=header))
+
+def _line_items(r: dict) -> List[tuple]:
+    items = [("Doctor Consultation", r["doctor_charges"]), ("Hospital Charges", r["hospital_charges"])]
+    items += [(e["description"], e["amount"]) for e in r["additional_expenses"]]
+    return items
+
+def render_receipt_html(r: dict) -> str:
+    lines = "\n".join(
+        LINE.substitute(description=html.escape(str(desc)), amount=f"{amount:,.2f}")
+        for desc, amount in _line_items(r)
+    )
+    values = {k: html.escape(str(v)) for k, v in r.items() if not isinstance(v, list)}
+    values["total_amount"] = f"{r['total_amount']:,.2f}"
+    return _receipt_template().substitute(values, lines=lines)
+
+def wrap_document(body: str, title: str) -> str:
+    return DOCUMENT.substitute(title=html.escape(title), body=body)
+
+# =====================================================
+# PDF
+# =====================================================
+def _draw_receipt(c, r: dict):
+    from reportlab.lib.pagesizes import A5
+    width, height = A5
+    y = height - 40
+
+    def text(value, x, size=10, bold=False, align="left"):
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        if align == "center":
+            c.drawCentredString(x, y, str(value))
+        elif align == "right":
+            c.drawRightString(x, y, str(value))
+        else:
+            c.drawString(x, y, str(value))
+
+    text(settings.hospital_name, width / 2, 14, True, "center"); y -= 16
+    text(settings.hospital_address, width / 2, 9, align="center"); y -= 12
+    text(f"{settings.hospital_phone} | {settings.hospital_email}", width / 2, 9, align="center"); y -= 18
+    text(f"Receipt #{r['bill_id']}   {r['bill_date']} {r['bill_time']}", width / 2, 10, True, "center"); y -= 24
+
+    for label, value in (("Token Number", r["token_number"]), ("Patient", r["patient_name"]),
+                         ("Age", r["age"]), ("NIC", r["nic"]), ("Phone", r["phone_number"]),
+                         ("Doctor", r["doctor_name"]), ("Specialization", r["specialization"])):
+        text(f"{label}:", 36, bold=True)
+        text(value, 130)
+        y -= 14
+    y -= 8
+
+    c.line(36, y + 10, width - 36, y + 10)
+    text("Service", 40, bold=True); text("Amount", width - 40, bold=True, align="right"); y -= 16
+    for desc, amount in _line_items(r):
+        text(str(desc)[:60], 40); text(f"{amount:,.2f}", width - 40, align="right"); y -= 14
+        if y < 80:
+            c.showPage()
+            y = height - 40
+    c.line(36, y + 10, width - 36, y + 10)
+    text("Total Amount", 40, bold=True); text(f"{r['total_amount']:,.2f}", width - 40, bold=True, align="right"); y -= 18
+    text(f"Payment Status: {r['payment_status']}", 40); y -= 28
+    text("Thank you for choosing our hospital!", width / 2, 9, align="center")
+    c.showPage()
+
+def render_pdf(receipts: List[dict]) -> bytes:
+    """One PDF with a page per receipt"""
+    from reportlab.lib.pagesizes import A5
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A5, pageCompression=1)
+    c.setTitle(f"Receipts - {settings.hospital_name}")
+    for r in receipts:
+        _draw_receipt(c, r)
+    c.save()
+    return buffer.getvalue()
+
+# =====================================================
+# POOL
+# =====================================================
+def _render_chunk(receipts: List[dict], fmt: str, per_bill: bool):
+    """Runs in a pool process: list of (bill_id, rendered) or one merged piece"""
+    if fmt == "pdf":
+        if per_bill:
+            return [(r["bill_id"], render_pdf([r])) for r in receipts]
+        return [(None, render_pdf(receipts))]
+    rendered = [(r["bill_id"], render_receipt_html(r)) for r in receipts]
+    if per_bill:
+        return [(bill_id, wrap_document(body, f"Receipt #{bill_id}").encode()) for bill_id, body in rendered]
+    return [(None, "\n".join(body for _, body in rendered))]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.receipt_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _chunks(receipts: List[dict], size: int) -> List[List[dict]]:
+    return [receipts[i:i + size] for i in range(0, len(receipts), size)]
+
+def render_batch(receipts: List[dict], fmt: str, output: str) -> Iterator[tuple]:
+    """
+    Yield (bill_id, bytes) per bill for zip output, or a single (None, bytes)
+    for merged output. Small batches render in-process; pool start-up costs more.
+    """
+    per_bill = output == "zip"
+    if fmt == "pdf" and not per_bill:
+        chunks = [receipts]
+    else:
+        chunks = _chunks(receipts, settings.receipt_chunk_size)
+
+    if len(chunks) == 1 and len(receipts) <= settings.receipt_chunk_size:
+        results = [_render_chunk(chunks[0], fmt, per_bill)]
+    else:
+        pool = _get_pool()
+        results = pool.map(_render_chunk, chunks, [fmt] * len(chunks), [per_bill] * len(chunks))
+
+    if per_bill:
+        for chunk in results:
+            yield from chunk
+        return
+    if fmt == "pdf":
+        yield None, next(iter(results))[0][1]
+        return
+    body = "\n".join(chunk[0][1] for chunk in results)
+    yield None, wrap_document(body, f"Receipts - {settings.hospital_name}").encode()
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink for zipfile; data is drained after each member"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def zip_stream(files: Iterator[tuple], fmt: str) -> Iterator[bytes]:
+    """Stream a zip archive member by member without building it in memory"""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for bill_id, data in files:
+            archive.writestr(f"receipt-{bill_id}.{fmt}", data)
+            yield sink.drain()
+    yield sink.drain()
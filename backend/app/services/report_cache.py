@@ -0,0 +1,142 @@
+"""
+Per-day report result cache
+
+Report ranges are normalized into single days. Days before today are closed:
+their pieces are cached until a backdated edit invalidates them, or for at
+most the closed TTL, since invalidate() only reaches the worker that handled
+the edit. Today (and any future day, which can still receive bookings) is
+cached with a short TTL.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..config import settings
+
+def iter_days(start_date: date, end_date: date) -> List[date]:
+    days = []
+    current = start_date
+    while current <= end_date:
+        days.append(current)
+        current += timedelta(days=1)
+    return days
+
+class ReportCache:
+    """Thread-safe store of per-(endpoint, day) report pieces"""
+
+    def __init__(self, open_ttl_seconds: int, closed_ttl_seconds: int, settle_seconds: int = 0):
+        self.open_ttl_seconds = open_ttl_seconds
+        # Bounds how long other workers serve a closed day after an edit to it
+        self.closed_ttl_seconds = closed_ttl_seconds
+        # A day invalidated less than this long ago is cached with the open TTL
+        # only, since a lagging read replica may not have the edit yet
+        self.settle_seconds = settle_seconds
+        self._entries = {}  # (endpoint, day) -> (expires_at, closed, piece)
+        self._invalidated_at = {}  # day -> monotonic time of last invalidation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_many(self, endpoint: str, days: Iterable[date]) -> Dict[date, dict]:
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for day in days:
+                entry = self._entries.get((endpoint, day))
+                if entry is None:
+                    self.misses += 1
+                    continue
+                expires_at, _, piece = entry
+                if expires_at <= now:
+                    del self._entries[(endpoint, day)]
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                found[day] = piece
+        return found
+
+    def put_many(self, endpoint: str, pieces: Dict[date, dict], today: Optional[date] = None):
+        today = today or date.today()
+        now = time.monotonic()
+        expires_open = now + self.open_ttl_seconds
+        expires_closed = now + self.closed_ttl_seconds
+        with self._lock:
+            for day, piece in pieces.items():
+                settling = now - self._invalidated_at.get(day, float("-inf")) < self.settle_seconds
+                closed = day < today and not settling
+                self._entries[(endpoint, day)] = (expires_closed if closed else expires_open, closed, piece)
+
+    def invalidate(self, *days: Optional[date]):
+        """Drop every endpoint's piece for the given days (backdated edits)"""
+        targets = set()
+        for d in days:
+            if d is None:
+                continue
+            targets.add(d.date() if isinstance(d, datetime) else d)
+        if not targets:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self.settle_seconds:
+                for day in targets:
+                    self._invalidated_at[day] = now
+            for key in [k for k in self._entries if k[1] in targets]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            closed = sum(1 for _, is_closed, _ in self._entries.values() if is_closed)
+            return {
+                "entries": len(self._entries),
+                "closed_entries": closed,
+                "open_entries": len(self._entries) - closed,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "open_ttl_seconds": self.open_ttl_seconds,
+                "closed_ttl_seconds": self.closed_ttl_seconds
+            }
+
+    def fetch(
+        self,
+        endpoint: str,
+        start_date: date,
+        end_date: date,
+        compute: Callable[[date, date], Dict[date, dict]],
+        empty: Callable[[], dict]
+    ) -> List[dict]:
+        """
+        Return one piece per day in the range. Missing closed days are computed
+        in a single grouped call spanning them; open days are computed on their own
+        so a long range costs one small query for today once warmed.
+        """
+        today = date.today()
+        days = iter_days(start_date, end_date)
+        pieces = self.get_many(endpoint, days)
+
+        missing_closed = [d for d in days if d not in pieces and d < today]
+        missing_open = [d for d in days if d not in pieces and d >= today]
+
+        for missing in (missing_closed, missing_open):
+            if not missing:
+                continue
+            lo, hi = missing[0], missing[-1]
+            computed = compute(lo, hi)
+            fresh = {d: computed.get(d) or empty() for d in iter_days(lo, hi) if d not in pieces}
+            self.put_many(endpoint, fresh, today)
+            pieces.update(fresh)
+
+        return [pieces[d] for d in days]
+
+report_cache = ReportCache(
+    settings.report_cache_open_ttl_seconds,
+    settings.report_cache_closed_ttl_seconds,
+    settle_seconds=settings.replica_max_lag_seconds if settings.read_replica_urls else 0
+)
@@ -0,0 +1,309 @@
+"""
+Report computations split into per-day pieces that can be cached and merged.
+Closed days (see day_close) come from their snapshots, not raw rows; ranges
+reaching archived dates (see archive) add the archive tables' pieces.
+"""
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from ..models import Patient, Doctor, Voucher, Service
+from .report_cache import ReportCache, report_cache
+from .day_close import with_snapshots
+from .archive import Tables, HOT_TABLES, with_archive
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+# =====================================================
+# SUMMARY
+# =====================================================
+def empty_summary_piece() -> dict:
+    return {
+        "appointments": 0, "completed": 0, "cancelled": 0, "no_show": 0,
+        "total_collected": 0.0, "doctor_fees": 0.0, "hospital_charges": 0.0,
+        "additional_services": 0.0, "pending_amount": 0.0,
+        "new_registrations": 0
+    }
+
+def compute_summary_pieces(db: Session, start_date: date, end_date: date,
+                           tables: Tables = HOT_TABLES) -> Dict[date, dict]:
+    """Summary figures grouped by day: one query per source table"""
+    Appointment, Bill = tables.appointment, tables.bill
+    pieces: Dict[date, dict] = {}
+
+    def piece(day) -> dict:
+        day = _as_date(day)
+        if day not in pieces:
+            pieces[day] = empty_summary_piece()
+        return pieces[day]
+
+    appointment_rows = db.query(
+        Appointment.appointment_date,
+        func.count(Appointment.appointment_id),
+        func.sum(case((Appointment.status == "Completed", 1), else_=0)),
+        func.sum(case((Appointment.status == "Cancelled", 1), else_=0)),
+        func.sum(case((Appointment.status == "No Show", 1), else_=0))
+    ).filter(
+        Appointment.appointment_date.between(start_date, end_date)
+    ).group_by(Appointment.appointment_date).all()
+    for day, total, completed, cancelled, no_show in appointment_rows:
+        p = piece(day)
+        p["appointments"] = int(total or 0)
+        p["completed"] = int(completed or 0)
+        p["cancelled"] = int(cancelled or 0)
+        p["no_show"] = int(no_show or 0)
+
+    paid = Bill.payment_status == "Paid"
+    bill_rows = db.query(
+        Bill.bill_date,
+        func.sum(case((paid, Bill.total_amount), else_=0)),
+        func.sum(case((paid, Bill.doctor_charges), else_=0)),
+        func.sum(case((paid, Bill.hospital_charges), else_=0)),
+        func.sum(case((paid, Bill.additional_expenses_total), else_=0)),
+        func.sum(case((Bill.payment_status == "Pending", Bill.total_amount), else_=0))
+    ).filter(
+        Bill.bill_date.between(start_date, end_date)
+    ).group_by(Bill.bill_date).all()
+    for day, collected, doctor_fees, hospital_charges, additional, pending in bill_rows:
+        p = piece(day)
+        p["total_collected"] = float(collected or 0)
+        p["doctor_fees"] = float(doctor_fees or 0)
+        p["hospital_charges"] = float(hospital_charges or 0)
+        p["additional_services"] = float(additional or 0)
+        p["pending_amount"] = float(pending or 0)
+
+    if tables is not HOT_TABLES:
+        # Patients are never archived
+        return pieces
+
+    patient_rows = db.query(
+        Patient.registration_date,
+        func.count(Patient.patient_id)
+    ).filter(
+        Patient.registration_date.between(start_date, end_date)
+    ).group_by(Patient.registration_date).all()
+    for day, count in patient_rows:
+        piece(day)["new_registrations"] = int(count or 0)
+
+    return pieces
+
+def merge_summary_pieces(pieces: List[dict], start_date: date, end_date: date) -> dict:
+    totals = empty_summary_piece()
+    for p in pieces:
+        for key in totals:
+            totals[key] += p.get(key, 0)
+
+    total_appointments = totals["appointments"]
+    completed = totals["completed"]
+    cancelled = totals["cancelled"]
+    no_show = totals["no_show"]
+
+    return {
+        "period": {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat()
+        },
+        "appointments": {
+            "total": total_appointments,
+            "completed": completed,
+            "cancelled": cancelled,
+            "no_show": no_show,
+            "scheduled": total_appointments - completed - cancelled - no_show,
+            "completion_rate": round((completed / total_appointments * 100) if total_appointments else 0, 2)
+        },
+        "revenue": {
+            "total_collected": round(totals["total_collected"], 2),
+            "doctor_fees": round(totals["doctor_fees"], 2),
+            "hospital_charges": round(totals["hospital_charges"], 2),
+            "additional_services": round(totals["additional_services"], 2),
+            "pending_amount": round(totals["pending_amount"], 2)
+        },
+        "patients": {
+            "new_registrations": totals["new_registrations"]
+        }
+    }
+
+def report_summary(db: Session, start_date: date, end_date: date, cache: Optional[ReportCache] = None) -> dict:
+    pieces = (cache or report_cache).fetch(
+        "summary", start_date, end_date,
+        lambda lo, hi: with_snapshots("summary", with_archive(compute_summary_pieces), db, lo, hi),
+        empty_summary_piece
+    )
+    return merge_summary_pieces(pieces, start_date, end_date)
+
+# =====================================================
+# DOCTOR-WISE
+# =====================================================
+def compute_doctor_pieces(db: Session, start_date: date, end_date: date,
+                          tables: Tables = HOT_TABLES) -> Dict[date, dict]:
+    """Appointment count and fees per doctor, grouped by day"""
+    Appointment = tables.appointment
+    rows = db.query(
+        Appointment.appointment_date,
+        Appointment.doctor_id,
+        func.count(Appointment.appointment_id),
+        func.sum(Appointment.doctor_charges)
+    ).filter(
+        Appointment.appointment_date.between(start_date, end_date)
+    ).group_by(Appointment.appointment_date, Appointment.doctor_id).all()
+
+    pieces: Dict[date, dict] = {}
+    for day, doctor_id, count, fees in rows:
+        pieces.setdefault(_as_date(day), {})[doctor_id] = [int(count or 0), float(fees or 0)]
+    return pieces
+
+def report_doctor_wise(db: Session, start_date: date, end_date: date,
+                       cache: Optional[ReportCache] = None) -> List[dict]:
+    pieces = (cache or report_cache).fetch(
+        "doctor-wise", start_date, end_date,
+        lambda lo, hi: with_snapshots("doctor-wise", with_archive(compute_doctor_pieces), db, lo, hi),
+        dict
+    )
+
+    totals: Dict[str, list] = {}
+    for p in pieces:
+        for doctor_id, (count, fees) in p.items():
+            t = totals.setdefault(doctor_id, [0, 0.0])
+            t[0] += count
+            t[1] += fees
+    if not totals:
+        return []
+
+    # Names and voucher status are looked up live so doctor edits and
+    # voucher payments never need to invalidate cached days
+    doctors = {
+        d.doctor_id: d for d in db.query(
+            Doctor.doctor_id, Doctor.doctor_name, Doctor.specialization
+        ).filter(Doctor.doctor_id.in_(list(totals))).all()
+    }
+    vouchers = {}
+    for v in db.query(Voucher).filter(
+        Voucher.doctor_id.in_(list(totals)),
+        Voucher.voucher_type == "DOCTOR_PAYMENT",
+        Voucher.status == "PAID",
+        Voucher.payment_period_start <= start_date,
+        Voucher.payment_period_end >= end_date
+    ).order_by(Voucher.voucher_id).all():
+        vouchers.setdefault(v.doctor_id, v)
+
+    doctor_reports = []
+    for doctor_id, (count, fees) in totals.items():
+        doctor = doctors.get(doctor_id)
+        paid_voucher = vouchers.get(doctor_id)
+        doctor_reports.append({
+            "doctor_id": doctor_id,
+            "doctor_name": doctor.doctor_name if doctor else None,
+            "specialization": doctor.specialization if doctor else None,
+            "total_appointments": count,
+            "total_doctor_fees": round(fees, 2),
+            "payment_status": "Paid" if paid_voucher else "Pending",
+            "voucher_number": paid_voucher.voucher_number if paid_voucher else None,
+            "paid_at": paid_voucher.paid_at.isoformat() if paid_voucher and paid_voucher.paid_at else None
+        })
+    return doctor_reports
+
+# =====================================================
+# SERVICE-WISE
+# =====================================================
+def compute_service_pieces(db: Session, start_date: date, end_date: date,
+                           tables: Tables = HOT_TABLES) -> Dict[date, dict]:
+    """
+    Expense count and amount per day, service and bill payment status: one
+    grouped query over the (service_date, appointment_id, ...) covering index
+    joined to the bills' (appointment_id, payment_status) index
+    """
+    AdditionalExpense, Bill = tables.expense, tables.bill
+    payment_status = func.coalesce(Bill.payment_status, "Pending")
+    rows = db.query(
+        AdditionalExpense.service_date,
+        AdditionalExpense.service_id,
+        AdditionalExpense.service_type,
+        payment_status,
+        func.count(AdditionalExpense.expense_id),
+        func.sum(AdditionalExpense.amount)
+    ).outerjoin(
+        Bill, Bill.appointment_id == AdditionalExpense.appointment_id
+    ).filter(
+        AdditionalExpense.service_date.between(start_date, end_date)
+    ).group_by(
+        AdditionalExpense.service_date, AdditionalExpense.service_id,
+        AdditionalExpense.service_type, payment_status
+    ).all()
+
+    pieces: Dict[date, dict] = {}
+    for d, service_id, service_type, status, count, amount in rows:
+        pieces.setdefault(_as_date(d), {})[(service_id, service_type, status)] = [int(count or 0), float(amount or 0)]
+    return pieces
+
+def _service_group() -> dict:
+    return {"count": 0, "total_amount": 0.0, "by_payment_status": {}}
+
+def _add_to_group(group: dict, status: str, count: int, amount: float):
+    group["count"] += count
+    group["total_amount"] += amount
+    group["by_payment_status"][status] = group["by_payment_status"].get(status, 0.0) + amount
+
+def _round_group(group: dict) -> dict:
+    group["total_amount"] = round(group["total_amount"], 2)
+    group["by_payment_status"] = {k: round(v, 2) for k, v in sorted(group["by_payment_status"].items())}
+    return group
+
+def report_service_wise(db: Session, start_date: date, end_date: date,
+                        cache: Optional[ReportCache] = None) -> dict:
+    """Expenses per catalog service, with per-category and overall subtotals by payment status"""
+    pieces = (cache or report_cache).fetch(
+        "service-wise", start_date, end_date,
+        lambda lo, hi: with_snapshots("service-wise", with_archive(compute_service_pieces), db, lo, hi),
+        dict
+    )
+
+    totals: Dict[tuple, list] = {}
+    for p in pieces:
+        for key, (count, amount) in p.items():
+            t = totals.setdefault(key, [0, 0.0])
+            t[0] += count
+            t[1] += amount
+
+    # Names and categories are looked up live so catalog edits never need to
+    # invalidate cached days; expenses without a service_id keep their free-text type
+    service_ids = {service_id for service_id, _, _ in totals if service_id is not None}
+    catalog = {
+        s.id: s for s in db.query(Service.id, Service.name, Service.category)
+        .filter(Service.id.in_(service_ids)).all()
+    } if service_ids else {}
+
+    categories: Dict[str, dict] = {}
+    overall = _service_group()
+    for (service_id, service_type, status), (count, amount) in totals.items():
+        service = catalog.get(service_id)
+        category_name = service.category if service else "Uncategorized"
+        category = categories.setdefault(category_name, {**_service_group(), "services": {}})
+        key = service_id if service else service_type
+        entry = category["services"].setdefault(key, {
+            "service_id": service.id if service else None,
+            "service_name": service.name if service else service_type,
+            **_service_group()
+        })
+        for group in (entry, category, overall):
+            _add_to_group(group, status, count, amount)
+
+    result = []
+    for category_name, category in sorted(categories.items()):
+        services = sorted(category.pop("services").values(), key=lambda e: -e["total_amount"])
+        result.append({
+            "category": category_name,
+            **_round_group(category),
+            "services": [_round_group(e) for e in services]
+        })
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "categories": result,
+        "totals": _round_group(overall)
+    }
@@ -0,0 +1,88 @@
+"""
+One-time startup work shared across server workers
+
+start.py sets HMS_LAUNCH_ID for every production launch. Workers forked from
+that launch take a file lock before running a named task; the first one runs
+it and leaves a marker so the rest skip it. Without a launch id (dev mode,
+plain `uvicorn app.main:app`) tasks simply run in-process.
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+LAUNCH_ID_ENV = "HMS_LAUNCH_ID"
+
+def _lock_file(fh):
+    if os.name == "nt":
+        import msvcrt
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+
+def try_lock_file(fh) -> bool:
+    """Non-blocking exclusive lock; False if another process holds it"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+def unlock_file(fh):
+    if os.name == "nt":
+        import msvcrt
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+def state_dir() -> Path:
+    return Path(tempfile.gettempdir())
+
+def state_files(launch_id: str):
+    """Lock and marker files belonging to one launch (for cleanup on exit)"""
+    return list(state_dir().glob(f"hms-{launch_id}-*"))
+
+def run_once(name: str, task: Callable[[], None]) -> bool:
+    """
+    Run `task` once per launch across all workers.
+    Returns True if this process ran it, False if another worker already had.
+    A task that raises leaves no marker, so the next worker retries it.
+    """
+    launch_id = os.getenv(LAUNCH_ID_ENV)
+    if not launch_id:
+        task()
+        return True
+
+    lock_path = state_dir() / f"hms-{launch_id}-{name}.lock"
+    marker_path = state_dir() / f"hms-{launch_id}-{name}.done"
+
+    with open(lock_path, "a+") as fh:
+        _lock_file(fh)
+        try:
+            if marker_path.exists():
+                return False
+            task()
+            marker_path.touch()
+            return True
+        finally:
+            unlock_file(fh)
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity/cgroup pinning where exposed)"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+def resolve_workers(configured: int) -> int:
+    """Explicit worker count from settings, or one per available CPU when 0"""
+    return configured if configured > 0 else available_cpus()
@@ -0,0 +1,177 @@
+"""
+Monthly RANGE partitioning of appointments and bills (MySQL)
+
+With CLINICAL_PARTITIONING on MySQL, appointments is partitioned on
+TO_DAYS(appointment_date) and bills on TO_DAYS(bill_date), so report queries
+over a date range only read the partitions of the months they cover.
+
+MySQL wants the partitioning column in every primary and unique key and does
+not allow foreign keys on, or pointing into, a partitioned InnoDB table. The
+one-time conversion therefore:
+- drops the foreign keys of appointments and bills and those referencing them
+  (additional_expenses.appointment_id); the services keep these links
+- widens the keys to appointments (appointment_id, appointment_date) with
+  (token_number, appointment_date) unique, and bills (bill_id, bill_date) with
+  (appointment_id, bill_date) unique. Tokens embed their date and every bill
+  is created with its appointment, so both stay unique in practice.
+
+Conversion rebuilds both tables and is only run on request (partition_tables.py
+convert, or the clinical_partitions job with convert=true). Maintenance splits
+CLINICAL_PARTITIONS_AHEAD future months out of the catch-all `pmax` and folds
+whole years older than CLINICAL_PARTITION_MERGE_AFTER_MONTHS into one
+partition per year, so the partition count stays bounded. SQLite and tables
+that were never converted are left alone.
+"""
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from ..config import settings
+from ..database import engine
+from .audit_partitions import (
+    _mysql_partitions, _partition_clause, _to_days, add_months, month_key, month_start
+)
+
+# table -> (id column, partitioning date column)
+PARTITIONED_TABLES = {
+    "appointments": ("appointment_id", "appointment_date"),
+    "bills": ("bill_id", "bill_date"),
+}
+MONTHLY_PARTITION = re.compile(r"^p(\d{4})(\d{2})$")
+
+def is_enabled() -> bool:
+    return settings.clinical_partitioning and engine.dialect.name == "mysql"
+
+def merge_horizon(today: Optional[date] = None) -> date:
+    """Whole years ending on or before this date are folded into yearly partitions"""
+    return add_months(month_start(today or date.today()), -settings.clinical_partition_merge_after_months)
+
+# =====================================================
+# CONVERSION
+# =====================================================
+def _drop_foreign_keys(conn) -> List[str]:
+    rows = conn.execute(text("""
+        SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE()
+          AND (TABLE_NAME IN ('appointments', 'bills') OR REFERENCED_TABLE_NAME IN ('appointments', 'bills'))
+    """)).fetchall()
+    dropped = []
+    for table, fk_name in rows:
+        conn.execute(text(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{fk_name}`"))
+        dropped.append(f"{table}.{fk_name}")
+    return dropped
+
+def _unique_keys(conn, table: str) -> Dict[str, List[str]]:
+    keys: Dict[str, List[str]] = {}
+    for index_name, column in conn.execute(text("""
+        SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+          AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """), {"table": table}):
+        keys.setdefault(index_name, []).append(column)
+    return keys
+
+def _convert_table(conn, table: str):
+    id_column, date_column = PARTITIONED_TABLES[table]
+    print(f"🔧 Converting {table} to monthly RANGE partitions on {date_column}...")
+    changes = [f"DROP PRIMARY KEY, ADD PRIMARY KEY ({id_column}, {date_column})"]
+    for index_name, columns in _unique_keys(conn, table).items():
+        if date_column not in columns:
+            widened = ", ".join(columns + [date_column])
+            changes.append(f"DROP INDEX `{index_name}`, ADD UNIQUE INDEX `{index_name}` ({widened})")
+    conn.execute(text(f"ALTER TABLE {table} " + ", ".join(changes)))
+
+    oldest = conn.execute(text(f"SELECT MIN({date_column}) FROM {table}")).scalar()
+    first = max(month_start(oldest or date.today()), merge_horizon())
+    last = add_months(month_start(date.today()), settings.clinical_partitions_ahead)
+    months = []
+    m = first
+    while m <= last:
+        months.append(m)
+        m = add_months(m, 1)
+    # Rows before the first monthly partition land in p_old
+    clause = f"PARTITION p_old VALUES LESS THAN ({_to_days(first)}), " + _partition_clause(months)
+    conn.execute(text(f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS({date_column})) ({clause})"))
+    print(f"✅ {table} partitioned ({len(months)} monthly partitions)")
+
+# =====================================================
+# MAINTENANCE
+# =====================================================
+def _create_ahead(conn, table: str, partitions: List[dict]) -> List[str]:
+    bounded = [p["upper_bound"] for p in partitions if p["upper_bound"]]
+    highest = max(bounded) if bounded else month_start(date.today())
+    target = add_months(month_start(date.today()), settings.clinical_partitions_ahead + 1)
+    months = []
+    m = highest
+    while m < target:
+        months.append(m)
+        m = add_months(m, 1)
+    if months:
+        # Split the new months out of the (empty) catch-all partition
+        conn.execute(text(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({_partition_clause(months)})"))
+    return [f"p{month_key(m)}" for m in months]
+
+def _merge_old(conn, table: str, partitions: List[dict]) -> List[str]:
+    horizon = merge_horizon()
+    by_year: Dict[int, List[dict]] = {}
+    for p in partitions:
+        match = MONTHLY_PARTITION.match(p["name"])
+        if match:
+            by_year.setdefault(int(match.group(1)), []).append(p)
+    merged = []
+    for year, members in sorted(by_year.items()):
+        year_end = date(year + 1, 1, 1)
+        # REORGANIZE must cover exactly the same range, so the year's last month has to be there
+        if year_end > horizon or members[-1]["upper_bound"] != year_end:
+            continue
+        names = ", ".join(p["name"] for p in members)
+        conn.execute(text(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {names} "
+            f"INTO (PARTITION y{year} VALUES LESS THAN ({_to_days(year_end)}))"
+        ))
+        merged.append(f"y{year}")
+    return merged
+
+def maintain_partitions(convert: bool = False) -> dict:
+    """Create upcoming months and fold old ones into years; convert unpartitioned tables if asked"""
+    result = {"converted": [], "dropped_foreign_keys": [], "created": {}, "merged": {}, "unpartitioned": []}
+    if not is_enabled():
+        return result
+    with engine.begin() as conn:
+        pending = [table for table in PARTITIONED_TABLES if not _mysql_partitions(conn, table)]
+        if pending and convert:
+            result["dropped_foreign_keys"] = _drop_foreign_keys(conn)
+            for table in pending:
+                _convert_table(conn, table)
+                result["converted"].append(table)
+        for table in PARTITIONED_TABLES:
+            partitions = _mysql_partitions(conn, table)
+            if not partitions:
+                result["unpartitioned"].append(table)
+                continue
+            result["created"][table] = _create_ahead(conn, table, partitions)
+            result["merged"][table] = _merge_old(conn, table, _mysql_partitions(conn, table))
+    if result["unpartitioned"]:
+        print(f"⚠️ Not partitioned yet: {', '.join(result['unpartitioned'])} "
+              f"(run: python partition_tables.py convert)")
+    return result
+
+def list_partitions() -> Dict[str, List[dict]]:
+    """Partitions of appointments and bills with their upper bound and approximate size"""
+    if engine.dialect.name != "mysql":
+        return {table: [] for table in PARTITIONED_TABLES}
+    result = {}
+    with engine.connect() as conn:
+        for table in PARTITIONED_TABLES:
+            result[table] = [
+                {
+                    "name": p["name"],
+                    "before": p["upper_bound"].isoformat() if p["upper_bound"] else None,
+                    "approx_rows": p["rows"]
+                }
+                for p in _mysql_partitions(conn, table)
+            ]
+    return result
@@ -0,0 +1,160 @@
+"""
+Time-series helpers for reports: SQL date bucketing and calendar gap-filling.
+Ranges reaching archived dates also bucket the archive tables.
+"""
+from sqlalchemy import func, literal, select, union_all, cast, String
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from ..database import engine
+from ..models import Patient
+from .archive import Tables, HOT_TABLES, ARCHIVE_TABLES, archive_range, archive_session
+
+BUCKETS = ("day", "week", "month")
+METRICS = ("appointments", "revenue", "new_patients", "expenses")
+
+def bucket_start(value: date, bucket: str) -> date:
+    """Return the first calendar day of the bucket containing `value`"""
+    if bucket == "week":
+        return value - timedelta(days=value.weekday())
+    if bucket == "month":
+        return value.replace(day=1)
+    return value
+
+def calendar_series(start_date: date, end_date: date, bucket: str) -> List[date]:
+    """Every bucket start between two dates, so empty periods show up as zeros"""
+    series = []
+    current = bucket_start(start_date, bucket)
+    while current <= end_date:
+        series.append(current)
+        if bucket == "month":
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        elif bucket == "week":
+            current += timedelta(days=7)
+        else:
+            current += timedelta(days=1)
+    return series
+
+def bucket_expr(column, bucket: str, dialect: Optional[str] = None):
+    """Dialect-specific SQL expression truncating a date/datetime column to its bucket"""
+    dialect = dialect or engine.dialect.name
+    if dialect == "sqlite":
+        if bucket == "week":
+            # Advance to Sunday, then step back to that week's Monday
+            return func.date(column, "weekday 0", "-6 days")
+        if bucket == "month":
+            return func.strftime("%Y-%m-01", column)
+        return func.date(column)
+    if dialect == "mysql":
+        if bucket == "week":
+            return func.subdate(func.date(column), func.weekday(column))
+        if bucket == "month":
+            return func.date_format(column, "%Y-%m-01")
+        return func.date(column)
+    # PostgreSQL and anything else supporting date_trunc
+    return cast(func.date_trunc(bucket, column), String)
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _metric_query(metric: str, bucket: str, start_date: date, end_date: date, doctor_id: Optional[str],
+                  tables: Tables = HOT_TABLES, dialect: Optional[str] = None):
+    """Grouped (metric, bucket, value) select for a single metric"""
+    Appointment, Bill, AdditionalExpense = tables
+    if metric == "appointments":
+        b = bucket_expr(Appointment.appointment_date, bucket, dialect)
+        q = select(literal(metric).label("metric"), b.label("bucket"),
+                   func.count(Appointment.appointment_id).label("value")).where(
+            Appointment.appointment_date.between(start_date, end_date)
+        )
+        if doctor_id:
+            q = q.where(Appointment.doctor_id == doctor_id)
+    elif metric == "revenue":
+        b = bucket_expr(Bill.bill_date, bucket, dialect)
+        q = select(literal(metric).label("metric"), b.label("bucket"),
+                   func.coalesce(func.sum(Bill.total_amount), 0).label("value")).where(
+            Bill.bill_date.between(start_date, end_date),
+            Bill.payment_status == "Paid"
+        )
+        if doctor_id:
+            q = q.join(Appointment, Appointment.appointment_id == Bill.appointment_id).where(
+                Appointment.doctor_id == doctor_id
+            )
+    elif metric == "new_patients":
+        # Patients are not tied to a doctor, so doctor_id does not narrow this metric
+        b = bucket_expr(Patient.registration_date, bucket, dialect)
+        q = select(literal(metric).label("metric"), b.label("bucket"),
+                   func.count(Patient.patient_id).label("value")).where(
+            Patient.registration_date.between(start_date, end_date)
+        )
+    else:
+        b = bucket_expr(AdditionalExpense.service_date, bucket, dialect)
+        q = select(literal(metric).label("metric"), b.label("bucket"),
+                   func.coalesce(func.sum(AdditionalExpense.amount), 0).label("value")).where(
+            AdditionalExpense.service_date.between(start_date, end_date)
+        )
+        if doctor_id:
+            q = q.join(Appointment, Appointment.appointment_id == AdditionalExpense.appointment_id).where(
+                Appointment.doctor_id == doctor_id
+            )
+    return q.group_by(b)
+
+def build_timeseries(
+    db: Session,
+    metrics: List[str],
+    bucket: str,
+    start_date: date,
+    end_date: date,
+    doctor_id: Optional[str] = None
+) -> Dict:
+    """
+    Bucket every requested metric in one UNION ALL round trip and gap-fill the
+    result against a calendar series, returned as a columnar payload
+    """
+    query = union_all(*[
+        _metric_query(m, bucket, start_date, end_date, doctor_id) for m in metrics
+    ])
+    rows = db.execute(query).fetchall()
+
+    span = archive_range(start_date, end_date)
+    archived_metrics = [m for m in metrics if m != "new_patients"]
+    if span and archived_metrics:
+        with archive_session(db) as cold:
+            dialect = cold.get_bind().dialect.name
+            rows += cold.execute(union_all(*[
+                _metric_query(m, bucket, span[0], span[1], doctor_id, ARCHIVE_TABLES, dialect)
+                for m in archived_metrics
+            ])).fetchall()
+
+    series = calendar_series(start_date, end_date, bucket)
+    position = {d: i for i, d in enumerate(series)}
+    columns = {m: [0] * len(series) for m in metrics}
+
+    for metric, bucket_value, value in rows:
+        if bucket_value is None:
+            continue
+        i = position.get(_to_date(bucket_value))
+        if i is None:
+            continue
+        # Hot and archive rows can share a bucket
+        if metric in ("revenue", "expenses"):
+            columns[metric][i] += float(value or 0)
+        else:
+            columns[metric][i] += int(value or 0)
+
+    return {
+        "period": {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat()
+        },
+        "bucket": bucket,
+        "doctor_id": doctor_id,
+        "buckets": [d.isoformat() for d in series],
+        "series": columns,
+        "totals": {m: (round(sum(v), 2) if m in ("revenue", "expenses") else sum(v)) for m, v in columns.items()}
+    }
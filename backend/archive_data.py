@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Hot/Cold Archival for HMS
+Moves appointments (with their bills and expenses) older than
+ARCHIVE_AFTER_MONTHS into the archive tables; run from cron, e.g. monthly.
+
+    python archive_data.py status
+    python archive_data.py run [--dry-run] [--cutoff 2023-01-01]
+"""
+import argparse
+import sys
+from datetime import date
+
+from app.services.archive import archive_status, run_archival, ensure_archive_schema
+
+def main():
+    parser = argparse.ArgumentParser(description="HMS hot/cold archival")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="show the archive boundary and what is due to move")
+    run = sub.add_parser("run", help="move rows dated before the cutoff to the archive")
+    run.add_argument("--dry-run", action="store_true", help="only count what would move")
+    run.add_argument("--cutoff", type=date.fromisoformat, help="archive before this date instead of the horizon")
+    args = parser.parse_args()
+
+    ensure_archive_schema()
+    if args.command == "status":
+        for key, value in archive_status().items():
+            print(f"{key:<22} {value}")
+        return True
+
+    result = run_archival(dry_run=args.dry_run, cutoff=args.cutoff)
+    if args.dry_run:
+        print(f"🔍 {result['pending_appointments']} appointments dated before {result['cutoff']} would move")
+    else:
+        moved = result["moved"]
+        print(f"✅ Moved {moved['appointments']} appointments, {moved['bills']} bills and "
+              f"{moved['expenses']} expenses before {result['cutoff']} in {result['batches']} batches")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Audit Log Maintenance for HMS
+Run from cron (e.g. daily) to keep system_logs partitions ahead of time and
+archive/drop months past AUDIT_RETENTION_MONTHS.
+
+    python audit_logs.py maintain [--dry-run]
+    python audit_logs.py list
+    python audit_logs.py import archives/audit/system_logs_202501.ndjson.gz
+"""
+import argparse
+import sys
+
+from app.config import settings
+from app.services.audit_partitions import (
+    ensure_partitions, list_partitions, apply_retention, import_archive, RESTORED_TABLE
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="HMS audit log partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    maintain = sub.add_parser("maintain", help="create upcoming partitions and archive expired ones")
+    maintain.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    sub.add_parser("list", help="show partitions and their retention status")
+    restore = sub.add_parser("import", help=f"load an archive into {RESTORED_TABLE}")
+    restore.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_archive(args.path)
+        print(f"✅ Imported {count} audit rows into {RESTORED_TABLE}")
+        return True
+
+    if not settings.audit_partitioning:
+        print("⚠️ AUDIT_PARTITIONING is disabled; nothing to do")
+        return False
+
+    if args.command == "list":
+        for p in list_partitions():
+            status = "expired" if p["expired"] else "kept"
+            print(f"{p['name']:<24} before {p['before'] or 'MAXVALUE':<12} ~{p['approx_rows']} rows  {status}")
+        return True
+
+    if not args.dry_run:
+        for name in ensure_partitions():
+            print(f"🔧 Created {name}")
+    for entry in apply_retention(args.dry_run):
+        action = "Would archive" if args.dry_run else "Archived"
+        print(f"🗄️ {action} {entry['partition']} -> {entry['archive']}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
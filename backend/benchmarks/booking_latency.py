@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Appointment booking latency per path
+
+Books --bookings appointments through each booking path against a scratch
+database and prints the median and p95 latency and the statements/commits per
+booking:
+- previous: the old handler sequence (token counter committed on its own,
+  appointment committed and refreshed, then the bill committed)
+- transaction: services/booking.py, one transaction
+- procedure: sp_create_appointment_with_bill (MySQL only)
+
+SQLite by default (scratch file); pass --url for a scratch MySQL database
+(its name must contain "bench", it is emptied).
+
+Usage: python benchmarks/booking_latency.py [--bookings 2000] [--url mysql+pymysql://root:@localhost:3306/hms_bench]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="scratch MySQL database URL (default: temporary SQLite file)")
+    parser.add_argument("--bookings", type=int, default=2000, help="appointments booked per path")
+    args = parser.parse_args()
+    if args.url and (not args.url.startswith("mysql") or "bench" not in args.url.rsplit("/", 1)[-1]):
+        parser.error("--url must point at a scratch MySQL database whose name contains 'bench'")
+    return args
+
+ARGS = parse_args()
+SCRATCH_DIR = None if ARGS.url else tempfile.mkdtemp(prefix="hms-booking-")
+# The app builds its engine at import time, so point it at the scratch database first
+os.environ["DATABASE_URL"] = ARGS.url or f"sqlite:///{os.path.join(SCRATCH_DIR, 'booking.db')}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app.database import Base, SessionLocal, create_stored_procedures, engine  # noqa: E402
+from app.models import Appointment, Bill, Doctor, Patient, TokenCounter  # noqa: E402
+from app.services.booking import book_appointment, format_token  # noqa: E402
+
+DOCTORS = 20
+PATIENTS = 1000
+
+def seed():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO doctors (doctor_id, doctor_name, specialization, consultation_charges, "
+            "hospital_charges, status, created_at, updated_at) "
+            "VALUES (:id, :name, 'General', 1000, 500, 'Active', :now, :now)"
+        ), [{"id": f"DOC{i:03d}", "name": f"Doctor {i}", "now": now} for i in range(DOCTORS)])
+        conn.execute(text(
+            "INSERT INTO patients (patient_id, patient_name, age, phone_number, gender, nic, "
+            "registration_date, created_at, updated_at) "
+            "VALUES (:id, :name, 30, :phone, 'Male', :nic, :d, :now, :now)"
+        ), [
+            {"id": i, "name": f"Patient {i}", "phone": f"077{i:07d}", "nic": f"{i:09d}V", "d": date.today(), "now": now}
+            for i in range(1, PATIENTS + 1)
+        ])
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            create_stored_procedures(conn)
+
+def book_previous(db, patient_id: int, doctor_id: str, day: date) -> None:
+    """The booking handler before the booking service, minus its logging"""
+    db.query(Patient).filter(Patient.patient_id == patient_id).first()
+    doctor = db.query(Doctor).filter(Doctor.doctor_id == doctor_id, Doctor.status == "Active").first()
+    counter = db.query(TokenCounter).filter(
+        TokenCounter.doctor_id == doctor_id, TokenCounter.token_date == day
+    ).first()
+    if counter:
+        counter.last_token_number += 1
+    else:
+        counter = TokenCounter(doctor_id=doctor_id, token_date=day, last_token_number=1)
+        db.add(counter)
+    number = counter.last_token_number
+    db.commit()
+    charges, hospital = float(doctor.consultation_charges), float(doctor.hospital_charges)
+    appointment = Appointment(
+        patient_id=patient_id, doctor_id=doctor_id, appointment_date=day,
+        token_number=format_token(doctor_id, day, number),
+        doctor_charges=charges, hospital_charges=hospital, status="Scheduled"
+    )
+    db.add(appointment)
+    db.commit()
+    db.refresh(appointment)
+    db.add(Bill(
+        appointment_id=appointment.appointment_id, bill_date=day, doctor_charges=charges,
+        hospital_charges=hospital, additional_expenses_total=0, subtotal=charges + hospital,
+        total_amount=charges + hospital, payment_status="Pending"
+    ))
+    db.commit()
+
+PATHS = {
+    "previous": book_previous,
+    "transaction": lambda db, p, d, day: book_appointment(db, p, d, day, use_procedure=False),
+    "procedure": lambda db, p, d, day: book_appointment(db, p, d, day, use_procedure=True),
+}
+
+def run(path: str, first_day: date) -> dict:
+    book = PATHS[path]
+    counts = {"statements": 0, "commits": 0}
+
+    def on_statement(*args):
+        counts["statements"] += 1
+
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    samples = []
+    event.listen(engine, "before_cursor_execute", on_statement)
+    event.listen(engine, "commit", on_commit)
+    try:
+        for i in range(ARGS.bookings):
+            # New days as the run goes on, so both counter insert and increment are measured
+            day = first_day + timedelta(days=i // (DOCTORS * 10))
+            db = SessionLocal(expire_on_commit=path != "previous")
+            began = time.perf_counter()
+            try:
+                book(db, i % PATIENTS + 1, f"DOC{i % DOCTORS:03d}", day)
+            finally:
+                db.close()
+            samples.append(time.perf_counter() - began)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_statement)
+        event.remove(engine, "commit", on_commit)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+        "statements": counts["statements"] / ARGS.bookings,
+        "commits": counts["commits"] / ARGS.bookings,
+    }
+
+def main():
+    print(f"🔧 Booking {ARGS.bookings} appointments per path on {engine.url.render_as_string(hide_password=True)} ...")
+    seed()
+    paths = [p for p in PATHS if p != "procedure" or engine.dialect.name == "mysql"]
+    results = {}
+    for n, path in enumerate(paths):
+        # Each path books on its own days so token numbers do not collide
+        results[path] = run(path, date.today() + timedelta(days=1 + n * 400))
+
+    with engine.connect() as conn:
+        orphans = conn.execute(text(
+            "SELECT COUNT(*) FROM appointments a LEFT JOIN bills b ON b.appointment_id = a.appointment_id "
+            "WHERE b.bill_id IS NULL"
+        )).scalar()
+    engine.dispose()
+    if SCRATCH_DIR:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    print(f"\n{'path':<12} {'median ms':>9} {'p95 ms':>8} {'stmts':>6} {'commits':>7}")
+    for path, r in results.items():
+        print(f"{path:<12} {r['median_ms']:>9.2f} {r['p95_ms']:>8.2f} {r['statements']:>6.1f} {r['commits']:>7.1f}")
+    if "procedure" not in results:
+        print("ℹ️ procedure path needs MySQL (--url)")
+    print(f"{'✅' if not orphans else '❌'} {orphans} appointments without a bill")
+    return orphans == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Partition pruning benchmark (MySQL)
+
+Seeds appointments and bills over --months months into a scratch MySQL
+database, then runs the queries behind /api/reports/summary, doctor-wise,
+service-wise and timeseries for a one-month range, before and after
+converting both tables to monthly partitions. For every statement it prints
+the EXPLAIN `partitions` column (which partitions MySQL will read) and the
+median time of each report computation.
+
+The scratch database is emptied: its name must contain "bench".
+
+Usage: python benchmarks/partition_pruning.py --url mysql+pymysql://root:@localhost:3306/hms_bench
+       [--rows 500000] [--months 24] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=os.getenv("BENCH_DATABASE_URL"), help="scratch MySQL database URL")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not args.url or not args.url.startswith("mysql") or "bench" not in args.url.rsplit("/", 1)[-1]:
+        parser.error("--url must point at a scratch MySQL database whose name contains 'bench'")
+    return args
+
+ARGS = parse_args()
+# The app builds its engine at import time, so configure it first
+os.environ["DATABASE_URL"] = ARGS.url
+os.environ["CLINICAL_PARTITIONING"] = "true"
+# Keep every seeded month in its own partition instead of folding old years
+os.environ["CLINICAL_PARTITION_MERGE_AFTER_MONTHS"] = str(ARGS.months + 12)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, text  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.services.reports import (  # noqa: E402
+    compute_summary_pieces, compute_doctor_pieces, compute_service_pieces
+)
+from app.services.table_partitions import maintain_partitions  # noqa: E402
+from app.services.timeseries import METRICS, build_timeseries  # noqa: E402
+
+def seed(rows: int, months: int) -> date:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = date.today() - timedelta(days=months * 30)
+    span = (date.today() - start).days
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO doctors (doctor_id, doctor_name, specialization, consultation_charges, "
+            "hospital_charges, status, created_at, updated_at) "
+            "VALUES (:id, :name, 'General', 1000, 500, 'Active', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), [{"id": f"DOC{i:03d}", "name": f"Doctor {i}"} for i in range(20)])
+        conn.execute(text(
+            "INSERT INTO patients (patient_id, patient_name, age, phone_number, gender, nic, "
+            "registration_date, created_at, updated_at) "
+            "VALUES (1, 'Bench Patient', 30, '0771234567', 'Male', '123456789V', :d, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), {"d": start})
+        batch = []
+        for i in range(1, rows + 1):
+            d = start + timedelta(days=i % span)
+            batch.append({"id": i, "doc": f"DOC{i % 20:03d}", "d": d, "tok": f"DOC{i % 20:03d}-{d:%Y%m%d}-{i}"})
+            if len(batch) == 10000 or i == rows:
+                conn.execute(text(
+                    "INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, "
+                    "appointment_time, token_number, doctor_charges, hospital_charges, status, created_at) "
+                    "VALUES (:id, 1, :doc, :d, :d, :tok, 1000, 500, 'Completed', :d)"
+                ), batch)
+                conn.execute(text(
+                    "INSERT INTO bills (bill_id, appointment_id, bill_date, bill_time, doctor_charges, "
+                    "hospital_charges, additional_expenses_total, subtotal, total_amount, payment_status, created_at) "
+                    "VALUES (:id, :id, :d, :d, 1000, 500, 0, 1500, 1500, 'Paid', :d)"
+                ), batch)
+                batch = []
+        conn.execute(text("ANALYZE TABLE appointments, bills"))
+    return start
+
+def report_queries(lo: date, hi: date):
+    return {
+        "summary": lambda db: compute_summary_pieces(db, lo, hi),
+        "doctor-wise": lambda db: compute_doctor_pieces(db, lo, hi),
+        "service-wise": lambda db: compute_service_pieces(db, lo, hi),
+        "timeseries": lambda db: build_timeseries(db, list(METRICS), "day", lo, hi),
+    }
+
+def explain(queries) -> None:
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    for name, run in queries.items():
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        db = SessionLocal()
+        try:
+            run(db)
+        finally:
+            db.close()
+            event.remove(engine, "before_cursor_execute", capture)
+        print(f"   {name}")
+        with engine.connect() as conn:
+            for statement, parameters in captured:
+                if "appointments" not in statement and "bills" not in statement:
+                    continue
+                for row in conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings():
+                    if row["table"] in ("appointments", "bills"):
+                        print(f"      {row['table']:<13} type={row['type']:<6} rows~{row['rows']:<8} "
+                              f"partitions={row.get('partitions') or '-'}")
+
+def timings(queries, repeat: int) -> dict:
+    result = {}
+    for name, run in queries.items():
+        samples = []
+        for _ in range(repeat):
+            db = SessionLocal()
+            began = time.perf_counter()
+            try:
+                run(db)
+            finally:
+                db.close()
+            samples.append(time.perf_counter() - began)
+        result[name] = statistics.median(samples)
+    return result
+
+def main():
+    print(f"🔧 Seeding {ARGS.rows} appointments + bills over {ARGS.months} months ...")
+    start = seed(ARGS.rows, ARGS.months)
+    # One calendar month in the middle of the data
+    lo = (start + timedelta(days=ARGS.months * 15)).replace(day=1)
+    hi = (lo + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    queries = report_queries(lo, hi)
+
+    results = {}
+    for label in ("unpartitioned", "partitioned"):
+        if label == "partitioned":
+            maintain_partitions(convert=True)
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE TABLE appointments, bills"))
+        print(f"\n📊 {label}: {lo} .. {hi}")
+        explain(queries)
+        results[label] = timings(queries, ARGS.repeat)
+        for name, seconds in results[label].items():
+            print(f"   {name:<13} {seconds * 1000:8.1f} ms (median of {ARGS.repeat})")
+
+    print()
+    for name in queries:
+        before, after = results["unpartitioned"][name], results["partitioned"][name]
+        print(f"✅ {name:<13} {before * 1000:8.1f} ms -> {after * 1000:8.1f} ms ({before / after:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Database round trips per endpoint
+
+Seeds a scratch SQLite database, calls the read endpoints and a booking
+workflow of write endpoints through the app, and counts what each request
+sends to the database: statements, COMMITs and ROLLBACKs. On a server
+database every one of these is a network round trip.
+
+--save writes the counts as JSON; --baseline compares against a saved run,
+e.g. taken on the previous release:
+
+    python benchmarks/round_trips.py --save /tmp/before.json    # old checkout
+    python benchmarks/round_trips.py --baseline /tmp/before.json
+
+Usage: python benchmarks/round_trips.py [--save FILE] [--baseline FILE] [--verbose]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save", help="write the counts to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--verbose", action="store_true", help="print every statement")
+    return parser.parse_args()
+
+ARGS = parse_args()
+SCRATCH_DIR = tempfile.mkdtemp(prefix="hms-round-trips-")
+# The app builds its engine at import time, so point it at the scratch database first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'round_trips.db')}"
+os.environ["AUDIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+TODAY = date.today().isoformat()
+
+# (label, method, path, JSON body); {names} are filled from earlier responses
+STEPS = [
+    ("create doctor", "POST", "/api/doctors", {
+        "doctor_id": "DOC900", "doctor_name": "Round Trip", "specialization": "General",
+        "consultation_charges": 1000, "hospital_charges": 500
+    }),
+    ("update doctor", "PUT", "/api/doctors/DOC900", {"consultation_charges": 1200}),
+    ("create patient", "POST", "/api/patients", {
+        "patient_name": "Round Trip", "age": 40, "phone_number": "0771234567", "gender": "Female",
+        "nic": "900000001V"
+    }),
+    ("update patient", "PUT", "/api/patients/{patient_id}", {"age": 41}),
+    ("create service", "POST", "/api/services", {"name": "ECG", "price": 750, "category": "Cardiology"}),
+    ("book appointment", "POST", "/api/appointments", {
+        "patient_id": "{patient_id}", "doctor_id": "DOC900", "appointment_date": TODAY
+    }),
+    ("add expense", "POST", "/api/expenses", {
+        "appointment_id": "{appointment_id}", "service_id": "{id}", "service_type": "ECG", "amount": 750
+    }),
+    ("get bill", "GET", "/api/bills/appointment/{appointment_id}", None),
+    ("mark bill paid", "PATCH", "/api/bills/{bill_id}/payment-status", {"payment_status": "Paid"}),
+    ("delete expense", "DELETE", "/api/expenses/{expense_id}", None),
+    ("create voucher", "POST", "/api/vouchers", {
+        "voucher_type": "DOCTOR_PAYMENT", "doctor_id": "DOC900", "amount": 1200, "description": "Fees"
+    }),
+    ("get patient", "GET", "/api/patients/{patient_id}", None),
+    ("get doctor", "GET", "/api/doctors/DOC900", None),
+    ("list doctors", "GET", "/api/doctors", None),
+    ("list services", "GET", "/api/services", None),
+    ("get appointment", "GET", "/api/appointments/{appointment_id}", None),
+    ("today's appointments", "GET", "/api/appointments/today", None),
+    ("appointment expenses", "GET", "/api/expenses/appointment/{appointment_id}", None),
+    ("list bills", "GET", "/api/bills", None),
+    ("get voucher", "GET", "/api/vouchers/{voucher_id}", None),
+    ("dashboard", "GET", "/api/dashboard/stats", None),
+    ("summary report", "GET", f"/api/reports/summary?start_date={TODAY}&end_date={TODAY}", None),
+]
+
+def fill(value, ids: dict):
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}") and value[1:-1] in ids:
+        return ids[value[1:-1]]
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {k: fill(v, ids) for k, v in value.items()}
+    return value
+
+def main():
+    counts = {"statements": 0, "commits": 0, "rollbacks": 0}
+    log = []
+
+    def on_statement(conn, cursor, statement, parameters, context, executemany):
+        counts["statements"] += 1
+        log.append(" ".join(statement.split())[:160])
+
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    def on_rollback(conn):
+        counts["rollbacks"] += 1
+
+    results = {}
+    ids = {}
+    failed = False
+    with TestClient(app) as client:
+        event.listen(engine, "before_cursor_execute", on_statement)
+        event.listen(engine, "commit", on_commit)
+        event.listen(engine, "rollback", on_rollback)
+        for label, method, path, body in STEPS:
+            counts.update(statements=0, commits=0, rollbacks=0)
+            log.clear()
+            response = client.request(method, fill(path, ids), json=fill(body, ids))
+            if response.status_code >= 400:
+                print(f"❌ {label}: HTTP {response.status_code} {response.text[:200]}")
+                failed = True
+                continue
+            data = response.json()
+            if isinstance(data, dict):
+                ids.update({k: v for k, v in data.items() if k == "id" or k.endswith("_id")})
+            results[label] = dict(counts, total=sum(counts.values()))
+            if ARGS.verbose:
+                print(f"   {label}")
+                for statement in log:
+                    print(f"      {statement}")
+    engine.dispose()
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+    baseline = {}
+    if ARGS.baseline:
+        with open(ARGS.baseline) as f:
+            baseline = json.load(f)
+    print(f"\n{'endpoint':<22} {'stmts':>5} {'commit':>6} {'rollbk':>6} {'total':>5}"
+          + ("   baseline  change" if baseline else ""))
+    for label, c in results.items():
+        line = f"{label:<22} {c['statements']:>5} {c['commits']:>6} {c['rollbacks']:>6} {c['total']:>5}"
+        if label in baseline:
+            before = baseline[label]["total"]
+            line += f"   {before:>8}  {c['total'] - before:+6d}"
+        print(line)
+    if baseline:
+        now = sum(c["total"] for label, c in results.items() if label in baseline)
+        before = sum(baseline[label]["total"] for label in results if label in baseline)
+        print(f"\n✅ {before} -> {now} round trips over {len(baseline)} endpoints")
+
+    if ARGS.save:
+        with open(ARGS.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Saved counts to {ARGS.save}")
+    return not failed
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrent read benchmark
+
+Compares the old SQLite setup (StaticPool: every thread shares one connection)
+with create_sqlite_engine (one pooled connection per concurrent thread, WAL and
+tuned pragmas) by running report-style aggregate queries from many threads.
+
+Usage: python benchmarks/sqlite_concurrent_reads.py [--rows 200000] [--threads 8] [--queries 40]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# The app builds its engine at import time, so point it at a scratch file first
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="hms-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.database import Base, create_sqlite_engine  # noqa: E402
+from app import models  # noqa: E402,F401
+
+REPORT_QUERY = text("""
+    SELECT a.doctor_id, COUNT(*), SUM(a.doctor_charges), SUM(b.total_amount)
+    FROM appointments a
+    JOIN bills b ON b.appointment_id = a.appointment_id
+    WHERE a.appointment_date BETWEEN :start AND :end
+    GROUP BY a.doctor_id
+""")
+
+def seed(engine, rows: int):
+    Base.metadata.create_all(bind=engine)
+    start = date.today() - timedelta(days=365)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO doctors (doctor_id, doctor_name, specialization, consultation_charges, "
+            "hospital_charges, status, created_at, updated_at) "
+            "VALUES (:id, :name, 'General', 1000, 500, 'Active', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), [{"id": f"DOC{i:03d}", "name": f"Doctor {i}"} for i in range(20)])
+        conn.execute(text(
+            "INSERT INTO patients (patient_id, patient_name, age, phone_number, gender, nic, "
+            "registration_date, created_at, updated_at) "
+            "VALUES (1, 'Bench Patient', 30, '0771234567', 'Male', '123456789V', :d, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        ), {"d": start})
+        batch = []
+        for i in range(1, rows + 1):
+            d = start + timedelta(days=i % 365)
+            batch.append({"id": i, "doc": f"DOC{i % 20:03d}", "d": d, "tok": f"T{i}"})
+            if len(batch) == 10000 or i == rows:
+                conn.execute(text(
+                    "INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, "
+                    "appointment_time, token_number, doctor_charges, hospital_charges, status, created_at) "
+                    "VALUES (:id, 1, :doc, :d, CURRENT_TIMESTAMP, :tok, 1000, 500, 'Completed', CURRENT_TIMESTAMP)"
+                ), batch)
+                conn.execute(text(
+                    "INSERT INTO bills (bill_id, appointment_id, bill_date, bill_time, doctor_charges, "
+                    "hospital_charges, additional_expenses_total, subtotal, total_amount, payment_status, created_at) "
+                    "VALUES (:id, :id, :d, CURRENT_TIMESTAMP, 1000, 500, 0, 1500, 1500, 'Paid', CURRENT_TIMESTAMP)"
+                ), batch)
+                batch = []
+
+def run(engine, threads: int, queries: int) -> float:
+    end = date.today()
+    start = end - timedelta(days=365)
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(queries):
+            with engine.connect() as conn:
+                conn.execute(REPORT_QUERY, {"start": start, "end": end}).fetchall()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    began = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - began
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=40, help="queries per thread")
+    args = parser.parse_args()
+
+    url = f"sqlite:///{DB_PATH}"
+    tuned = create_sqlite_engine(url)
+    print(f"🔧 Seeding {args.rows} appointments + bills into {DB_PATH} ...")
+    seed(tuned, args.rows)
+
+    legacy = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    total = args.threads * args.queries
+
+    results = {}
+    for label, engine in (("StaticPool (old)", legacy), ("create_sqlite_engine", tuned)):
+        run(engine, 1, 2)  # warm the page cache
+        single = run(engine, 1, args.queries)
+        concurrent = run(engine, args.threads, args.queries)
+        results[label] = (single, concurrent)
+        print(f"\n📊 {label}")
+        print(f"   1 thread : {args.queries} queries in {single:.2f}s ({args.queries / single:.1f} q/s)")
+        print(f"   {args.threads} threads: {total} queries in {concurrent:.2f}s ({total / concurrent:.1f} q/s)")
+
+    for label, (single, concurrent) in results.items():
+        speedup = (total / concurrent) / (args.queries / single)
+        print(f"✅ {label}: concurrent throughput = {speedup:.2f}x single-thread")
+
+    legacy.dispose()
+    tuned.dispose()
+    shutil.rmtree(os.path.dirname(DB_PATH), ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+End-of-Day Close for HMS
+Run from cron after the last shift (defaults to today) or shortly after
+midnight with an explicit date:
+
+    python close_day.py
+    python close_day.py 2025-01-31
+    python close_day.py --reopen 2025-01-31
+
+Running server workers keep cached report days until they expire or the
+worker restarts; POST /api/admin/day-close also drops that worker's cache.
+"""
+import argparse
+import sys
+from datetime import date
+
+from app.database import SessionLocal
+from app.services.day_close import close_day, reopen_day, DayClosedError
+
+def main():
+    parser = argparse.ArgumentParser(description="HMS end-of-day close")
+    parser.add_argument("date", nargs="?", type=date.fromisoformat, default=date.today(),
+                        help="day to close (YYYY-MM-DD, default today)")
+    parser.add_argument("--reopen", action="store_true", help="drop the day's snapshots and unlock it")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.reopen:
+            reopen_day(db, args.date)
+            print(f"✅ Day {args.date} reopened")
+            return True
+        result = close_day(db, args.date)
+    except DayClosedError as e:
+        print(f"⚠️ {e.detail}")
+        return False
+    finally:
+        db.close()
+
+    summary = result["summary"]
+    print(f"✅ Day {result['date']} closed")
+    print(f"   Appointments: {summary['appointments']} ({summary['completed']} completed, "
+          f"{summary['cancelled']} cancelled, {summary['no_show']} no-show)")
+    print(f"   Settled: {result['stale_completed']} completed, {result['stale_no_show']} no-show")
+    print(f"   Collected: {summary['total_collected']:.2f}, pending: {summary['pending_amount']:.2f}")
+    print(f"   Bills locked: {result['bills_locked']}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
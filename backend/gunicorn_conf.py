@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for HMS production mode
+Used by: python start.py --prod  (gunicorn -c gunicorn_conf.py app.main:app)
+"""
+from app.config import settings
+from app.services.startup import resolve_workers
+
+bind = f"{settings.server_host}:{settings.server_port}"
+workers = resolve_workers(settings.workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master, then fork workers from it
+preload_app = True
+
+keepalive = settings.keepalive_timeout
+backlog = settings.backlog
+graceful_timeout = settings.graceful_timeout
+timeout = settings.worker_timeout
+
+accesslog = "-"
+errorlog = "-"
+
+def post_fork(server, worker):
+    """Forked workers must not share the master's pooled DB connections"""
+    from app.database import dispose_engines_after_fork
+    dispose_engines_after_fork()
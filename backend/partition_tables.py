@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Appointment/Bill Partition Maintenance for HMS (MySQL)
+Convert appointments and bills to monthly RANGE partitions once (rebuilds both
+tables - run in a maintenance window), then run `maintain` from cron (e.g.
+monthly) to add upcoming months and fold old ones into yearly partitions.
+
+    python partition_tables.py convert
+    python partition_tables.py maintain
+    python partition_tables.py list
+"""
+import argparse
+import sys
+
+from app.config import settings
+from app.services.table_partitions import is_enabled, list_partitions, maintain_partitions
+
+def main():
+    parser = argparse.ArgumentParser(description="HMS appointment/bill partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("convert", help="partition tables that are not yet, then maintain")
+    sub.add_parser("maintain", help="create upcoming partitions and merge old months")
+    sub.add_parser("list", help="show partitions of appointments and bills")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for table, partitions in list_partitions().items():
+            if not partitions:
+                print(f"{table}: not partitioned")
+            for p in partitions:
+                print(f"{table:<14} {p['name']:<10} before {p['before'] or 'MAXVALUE':<12} ~{p['approx_rows']} rows")
+        return True
+
+    if not is_enabled():
+        print("⚠️ Partitioning needs MySQL and CLINICAL_PARTITIONING=true; nothing to do")
+        return False
+
+    result = maintain_partitions(convert=args.command == "convert")
+    for fk in result["dropped_foreign_keys"]:
+        print(f"🔧 Dropped foreign key {fk}")
+    for table in result["converted"]:
+        print(f"✅ Converted {table}")
+    for table, names in result["created"].items():
+        for name in names:
+            print(f"🔧 Created {table}.{name}")
+    for table, names in result["merged"].items():
+        for name in names:
+            print(f"🗄️ Merged {table} months into {name}")
+    print(f"✅ Partitions kept {settings.clinical_partitions_ahead} months ahead")
+    return not result["unpartitioned"]
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
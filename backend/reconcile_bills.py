@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Bill Integrity Reconciliation for HMS
+Compares every bill with its appointment charges and summed additional
+expenses; run nightly from cron.
+
+    python reconcile_bills.py                     # report only
+    python reconcile_bills.py --fix
+    python reconcile_bills.py --csv mismatches.csv --start-id 1 --end-id 500000
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from app.database import SessionLocal
+from app.services.bill_reconcile import reconcile_bills, FIELDS
+
+def main():
+    parser = argparse.ArgumentParser(description="HMS bill reconciliation")
+    parser.add_argument("--fix", action="store_true", help="rewrite mismatching bills (closed days are skipped)")
+    parser.add_argument("--start-id", type=int)
+    parser.add_argument("--end-id", type=int)
+    parser.add_argument("--csv", help="write every mismatch to this CSV file")
+    args = parser.parse_args()
+
+    writer = None
+    fh = None
+    if args.csv:
+        fh = open(args.csv, "w", newline="")
+        writer = csv.writer(fh)
+        writer.writerow(["bill_id", "bill_date", "locked"] + [f"{f}_{k}" for f in FIELDS for k in ("stored", "expected")])
+
+    def write_row(m: dict):
+        cells = []
+        for field in FIELDS:
+            d = m["differences"].get(field)
+            cells += [d["stored"], d["expected"]] if d else ["", ""]
+        writer.writerow([m["bill_id"], m["bill_date"], m["locked"]] + cells)
+
+    started = time.time()
+    db = SessionLocal()
+    try:
+        result = reconcile_bills(db, args.fix, args.start_id, args.end_id, sample_size=0,
+                                 on_mismatch=write_row if writer else None)
+    finally:
+        db.close()
+        if fh:
+            fh.close()
+
+    print(f"🔍 Checked bill_id range {result['checked_range']} in {result['chunks']} chunks "
+          f"({time.time() - started:.1f}s)")
+    print(f"   Mismatched: {result['mismatched']} (locked: {result['locked']}), fixed: {result['fixed']}")
+    print(f"   By field: {json.dumps(result['fields'])}")
+    if args.csv:
+        print(f"   Details: {args.csv}")
+    return result["mismatched"] == 0 or args.fix
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -4,6 +4,8 @@ HMS Application Startup Script
 """
 import os
 import sys
+import uuid
+import argparse
 import subprocess
 from pathlib import Path
 
@@ -52,8 +54,56 @@ def check_env_file():
         print("Consider copying .env.example to .env and updating values")
         return True
 
+def build_dev_command():
+    """Single auto-reloading worker for development"""
+    return [
+        sys.executable, "-m", "uvicorn", 
+        "app.main:app", 
+        "--reload", 
+        "--port", "8000",
+        "--host", "127.0.0.1"
+    ]
+
+def build_prod_command(workers=None):
+    """Multi-worker command: gunicorn with a preloaded app, or uvicorn workers on Windows"""
+    from app.config import settings
+    from app.services.startup import resolve_workers
+    
+    worker_count = workers or resolve_workers(settings.workers)
+    
+    try:
+        if os.name == "nt":
+            raise ImportError("gunicorn is not supported on Windows")
+        import gunicorn  # noqa: F401
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "app.main:app"]
+        if workers:
+            command += ["--workers", str(workers)]
+        return command, worker_count, "gunicorn (preloaded app)"
+    except ImportError:
+        return [
+            sys.executable, "-m", "uvicorn",
+            "app.main:app",
+            "--host", settings.server_host,
+            "--port", str(settings.server_port),
+            "--workers", str(worker_count),
+            "--backlog", str(settings.backlog),
+            "--timeout-keep-alive", str(settings.keepalive_timeout),
+            "--timeout-graceful-shutdown", str(settings.graceful_timeout),
+            "--no-access-log"
+        ], worker_count, "uvicorn workers"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the HMS API server")
+    parser.add_argument("--prod", action="store_true",
+                        help="production mode: multiple workers, no auto-reload")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker count for --prod (default: WORKERS setting or one per CPU)")
+    return parser.parse_args()
+
 def main():
     """Main startup function"""
+    args = parse_args()
+    
     print("🏥 HMS Application Startup")
     print("=" * 40)
     
@@ -70,26 +120,41 @@ def main():
         print("python init_database.py")
         return False
     
-    print("\n🚀 Starting HMS Application...")
-    print("Access the API at: http://localhost:8000")
-    print("API Documentation: http://localhost:8000/docs")
+    env = os.environ.copy()
+    launch_id = None
+    if args.prod:
+        command, worker_count, server = build_prod_command(args.workers)
+        # Lets workers of this launch run one-time startup work only once
+        launch_id = uuid.uuid4().hex
+        env["HMS_LAUNCH_ID"] = launch_id
+        
+        from app.config import settings
+        print(f"\n🚀 Starting HMS Application (production, {worker_count} workers via {server})...")
+        print(f"Access the API at: http://{settings.server_host}:{settings.server_port}")
+    else:
+        command = build_dev_command()
+        print("\n🚀 Starting HMS Application...")
+        print("Access the API at: http://localhost:8000")
+        print("API Documentation: http://localhost:8000/docs")
     print("Press Ctrl+C to stop the server")
     print("-" * 40)
     
     # Start the application
     try:
-        subprocess.run([
-            sys.executable, "-m", "uvicorn", 
-            "app.main:app", 
-            "--reload", 
-            "--port", "8000",
-            "--host", "127.0.0.1"
-        ])
+        subprocess.run(command, env=env, cwd=str(Path(__file__).parent))
     except KeyboardInterrupt:
         print("\n👋 HMS Application stopped")
+    finally:
+        if launch_id:
+            from app.services.startup import state_files
+            for path in state_files(launch_id):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
     
     return True
 
 if __name__ == "__main__":
     success = main()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
@@ -0,0 +1,56 @@
+"""
+Test configuration: the app builds its engines from Settings at import time,
+so point it at scratch SQLite files (a primary and one read replica) first.
+"""
+import json
+import os
+import sys
+import tempfile
+
+DB_DIR = tempfile.mkdtemp(prefix="hms-tests-")
+PRIMARY_URL = f"sqlite:///{os.path.join(DB_DIR, 'primary.db')}"
+REPLICA_URL = f"sqlite:///{os.path.join(DB_DIR, 'replica.db')}"
+
+os.environ["DATABASE_URL"] = PRIMARY_URL
+os.environ["READ_REPLICA_URLS"] = json.dumps([REPLICA_URL])
+os.environ["AUDIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import main
+from app.config import settings
+from app.database import Base, engine, read_router
+from app.main import app
+from app.services.jobs import JobRunner
+
+@pytest.fixture(autouse=True)
+def primary_reads(monkeypatch):
+    """Reads go to the primary the tests seed; the replica tests opt back in"""
+    monkeypatch.setattr(read_router, "replicas", [])
+
+@pytest.fixture
+def db():
+    """Session on an empty primary database holding every model's table"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+def runner(monkeypatch, tmp_path):
+    """A job runner of its own with one pool process, serving /api/jobs"""
+    monkeypatch.setattr(settings, "job_results_dir", str(tmp_path / "jobs"))
+    # Spawned pool processes build their settings and router from the environment
+    monkeypatch.setenv("JOB_RESULTS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("READ_REPLICA_URLS", "[]")
+    runner = JobRunner(1, {"reports": 1, "exports": 1, "maintenance": 1})
+    monkeypatch.setattr(main, "job_runner", runner)
+    yield runner
+    runner.shutdown()
@@ -0,0 +1,141 @@
+"""
+Row builders shared by the tests (a doctor, a patient and a billed visit), a
+year of bulk clinic data for plan checks, plus polling for background jobs
+"""
+import random
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.models import Doctor, Patient, Appointment, Bill, AdditionalExpense
+from app.services.jobs import read_status
+
+_serial = count(1)
+
+def add_doctor(db, doctor_id: str = "DOC001", consultation: float = 1000, hospital: float = 500) -> Doctor:
+    doctor = Doctor(
+        doctor_id=doctor_id, doctor_name=f"Doctor {doctor_id}", specialization="General",
+        consultation_charges=consultation, hospital_charges=hospital
+    )
+    db.add(doctor)
+    db.flush()
+    return doctor
+
+def add_patient(db, nic: str = None, registered: date = None) -> Patient:
+    n = next(_serial)
+    patient = Patient(
+        patient_name=f"Patient {n}", age=30, phone_number="0771234567", gender="Female",
+        nic=nic or f"{900000000 + n}V", registration_date=registered or date.today()
+    )
+    db.add(patient)
+    db.flush()
+    return patient
+
+def add_visit(db, doctor: Doctor, patient: Patient, day: date, status: str = "Pending",
+              expenses: dict = None) -> Bill:
+    """An appointment on `day` with its bill and optional {service_type: amount} expenses"""
+    n = next(_serial)
+    appointment = Appointment(
+        patient_id=patient.patient_id, doctor_id=doctor.doctor_id, appointment_date=day,
+        appointment_time=datetime.combine(day, datetime.min.time()), token_number=f"T{n:06d}",
+        doctor_charges=doctor.consultation_charges, hospital_charges=doctor.hospital_charges
+    )
+    db.add(appointment)
+    db.flush()
+    extra = 0
+    for service_type, amount in (expenses or {}).items():
+        db.add(AdditionalExpense(
+            appointment_id=appointment.appointment_id, service_type=service_type, amount=amount,
+            service_date=day, created_at=datetime.combine(day, datetime.min.time())
+        ))
+        extra += amount
+    subtotal = float(doctor.consultation_charges) + float(doctor.hospital_charges) + extra
+    bill = Bill(
+        appointment_id=appointment.appointment_id, bill_date=day,
+        bill_time=datetime.combine(day, datetime.min.time()),
+        doctor_charges=doctor.consultation_charges, hospital_charges=doctor.hospital_charges,
+        additional_expenses_total=extra, subtotal=subtotal, total_amount=subtotal, payment_status=status
+    )
+    db.add(bill)
+    db.flush()
+    return bill
+
+def wait_for_job(job_id: str, timeout: float = 60) -> dict:
+    """Status of the job once it has completed or failed"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = read_status(job_id)
+        if status["status"] in ("completed", "failed"):
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} still {status['status']}")
+
+
+def seed_clinic(rows: int, today: date = None):
+    """
+    `rows` appointments (with bills, a third with an expense) spread over the
+    year up to `today`, 20 doctors, one patient per ten visits and 500 services,
+    mostly inactive. Written with bulk INSERTs straight to the primary, which
+    must already hold the tables, and ANALYZEd like a long-running database.
+    """
+    today = today or date.today()
+    rng = random.Random(42)
+    start = today - timedelta(days=365)
+    now = datetime.now()
+    patients = rows // 10 + 1
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO doctors (doctor_id, doctor_name, specialization, consultation_charges, "
+            "hospital_charges, status, created_at, updated_at) "
+            "VALUES (:id, :name, 'General', 1000, 500, 'Active', :now, :now)"
+        ), [{"id": f"DOC{i:03d}", "name": f"Doctor {i}", "now": now} for i in range(20)])
+        conn.execute(text(
+            "INSERT INTO patients (patient_id, patient_name, age, phone_number, gender, nic, "
+            "registration_date, created_at, updated_at) "
+            "VALUES (:id, :name, 30, :phone, 'Male', :nic, :d, :now, :now)"
+        ), [
+            {"id": i, "name": f"Patient {i}", "phone": f"077{i:07d}", "nic": f"{i:09d}V",
+             "d": start + timedelta(days=i % 366), "now": now}
+            for i in range(1, patients + 1)
+        ])
+        # Deleting a service only marks it Inactive, so inactive rows accumulate
+        conn.execute(text(
+            "INSERT INTO services (id, name, price, category, created_at, updated_at, is_active) "
+            "VALUES (:id, :name, 500, 'Other', :now, :now, :active)"
+        ), [
+            {"id": i, "name": f"Service {i}", "now": now, "active": "Active" if i % 10 == 0 else "Inactive"}
+            for i in range(1, 501)
+        ])
+
+        appointments, bills, expenses = [], [], []
+        for i in range(1, rows + 1):
+            d = start + timedelta(days=i * 366 // rows)
+            t = datetime.combine(d, datetime.min.time())
+            doctor = f"DOC{i % 20:03d}"
+            status = "Scheduled" if d >= today else rng.choice(["Completed"] * 8 + ["Cancelled", "No Show"])
+            appointments.append({"id": i, "patient": i % patients + 1, "doc": doctor, "d": d, "t": t,
+                                 "tok": f"{doctor}-{d:%Y%m%d}-{i}", "status": status})
+            extra = 250 if i % 3 == 0 else 0
+            bills.append({"id": i, "d": d, "t": t, "extra": extra, "total": 1500 + extra,
+                          "status": "Paid" if status == "Completed" else "Pending"})
+            if extra:
+                expenses.append({"apt": i, "type": rng.choice(["Lab", "X-Ray", "ECG", "Dressing"]),
+                                 "d": d, "t": t + timedelta(hours=10)})
+        conn.execute(text(
+            "INSERT INTO appointments (appointment_id, patient_id, doctor_id, appointment_date, "
+            "appointment_time, token_number, doctor_charges, hospital_charges, status, created_at) "
+            "VALUES (:id, :patient, :doc, :d, :t, :tok, 1000, 500, :status, :t)"
+        ), appointments)
+        conn.execute(text(
+            "INSERT INTO bills (bill_id, appointment_id, bill_date, bill_time, doctor_charges, "
+            "hospital_charges, additional_expenses_total, subtotal, total_amount, payment_status, created_at) "
+            "VALUES (:id, :id, :d, :t, 1000, 500, :extra, :total, :total, :status, :t)"
+        ), bills)
+        conn.execute(text(
+            "INSERT INTO additional_expenses (appointment_id, service_type, amount, service_date, created_at) "
+            "VALUES (:apt, :type, 250, :d, :t)"
+        ), expenses)
+        conn.execute(text("ANALYZE"))
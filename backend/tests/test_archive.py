@@ -0,0 +1,98 @@
+"""
+Hot/cold archival: rows move in batches, reports and history read both sides
+across the boundary, and expenses dated after the cutoff keep their
+appointment hot
+"""
+from datetime import date, datetime
+
+import pytest
+
+from app.database import engine
+from app.models import Appointment, AdditionalExpense, AppointmentArchive
+from app.models.archive import ArchiveBase
+from app.services import archive
+from app.services.archive import run_archival
+from app.services.patient_history import history_cache
+from app.services.report_cache import report_cache
+from factories import add_doctor, add_patient, add_visit
+
+CUTOFF = date(2024, 2, 1)
+
+@pytest.fixture(autouse=True)
+def fresh_archive(db, monkeypatch):
+    ArchiveBase.metadata.drop_all(bind=engine)
+    monkeypatch.setattr(archive, "BOUNDARY_TTL_SECONDS", 0)
+    monkeypatch.setattr("app.config.settings.archive_batch_size", 1)
+    monkeypatch.setattr("app.config.settings.archive_batch_pause_ms", 0)
+    archive._boundary_cache.update(expires=0.0, value=None)
+    report_cache.clear()
+    history_cache._patients.clear()
+    yield
+    report_cache.clear()
+
+@pytest.fixture
+def visits(db):
+    """January visits (one with an expense booked on February 1st) and one in February"""
+    doctor, patient = add_doctor(db), add_patient(db)
+    early = add_visit(db, doctor, patient, date(2024, 1, 10), status="Paid", expenses={"ECG": 300})
+    late = add_visit(db, doctor, patient, date(2024, 1, 31), expenses={"ECG": 200})
+    db.add(AdditionalExpense(appointment_id=late.appointment_id, service_type="X-Ray", amount=700,
+                             service_date=date(2024, 2, 1), created_at=datetime(2024, 2, 1, 9, 30)))
+    add_visit(db, doctor, patient, date(2024, 2, 15))
+    db.commit()
+    return patient, early, late
+
+def reports(client, start: str, end: str) -> tuple:
+    params = {"start_date": start, "end_date": end}
+    return (client.get("/api/reports/summary", params=params).json(),
+            client.get("/api/reports/service-wise", params=params).json())
+
+def test_archival_moves_rows_in_batches(visits, db):
+    early, late = visits[1].appointment_id, visits[2].appointment_id
+
+    result = run_archival(cutoff=CUTOFF)
+
+    assert result["moved"] == {"appointments": 1, "bills": 1, "expenses": 1}
+    db.expire_all()
+    assert db.get(Appointment, early) is None
+    assert db.get(AppointmentArchive, early) is not None
+    # Its X-Ray is counted on February 1st, after the boundary: the visit stays hot
+    assert db.get(Appointment, late) is not None
+    assert archive.pending_count(CUTOFF) == 0
+
+def test_reports_are_unchanged_across_the_boundary(visits, client):
+    ranges = [("2024-01-01", "2024-01-31"), ("2024-02-01", "2024-02-01"), ("2024-01-01", "2024-02-29")]
+    before = [reports(client, *r) for r in ranges]
+
+    run_archival(cutoff=CUTOFF)
+    report_cache.clear()
+
+    assert [reports(client, *r) for r in ranges] == before
+    _, february_first = reports(client, "2024-02-01", "2024-02-01")
+    [category] = february_first["categories"]
+    assert [(e["service_name"], e["count"], e["total_amount"]) for e in category["services"]] == [("X-Ray", 1, 700.0)]
+
+def test_history_reads_archived_visits(visits, client):
+    patient = visits[0]
+    url = f"/api/patients/{patient.patient_id}/history"
+    before = client.get(url).json()["visits"]
+
+    run_archival(cutoff=CUTOFF)
+    history_cache._patients.clear()
+
+    after = client.get(url).json()["visits"]
+    assert [v["appointment_id"] for v in after] == [v["appointment_id"] for v in before]
+
+def test_dry_run_moves_nothing(visits, client):
+    result = run_archival(dry_run=True, cutoff=CUTOFF)
+
+    assert result["pending_appointments"] == 1
+    assert result["moved"]["appointments"] == 0
+    assert archive.archive_boundary() is None
+
+def test_archived_days_cannot_be_closed(visits, client):
+    run_archival(cutoff=CUTOFF)
+
+    response = client.post("/api/admin/day-close", json={"date": "2024-01-10"})
+    assert response.status_code == 400
+    assert "archived" in response.json()["detail"]
@@ -0,0 +1,80 @@
+"""
+Audit middleware and buffered writer: successful mutations are queued and
+written to system_logs in bulk
+"""
+from datetime import date
+
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+from app.config import settings
+from app.models import SystemLog
+from app.models.user import AdminUser
+from app.services.audit import AuditWriter, audit_writer, describe_route
+from factories import add_doctor, add_patient, add_visit
+
+# The installed bcrypt backend may not match passlib; the audit trail does not depend on the scheme
+PLAINTEXT = CryptContext(schemes=["plaintext"])
+
+@pytest.fixture
+def audit(db, monkeypatch):
+    monkeypatch.setattr(settings, "audit_enabled", True)
+    monkeypatch.setattr("passlib.context.CryptContext", lambda **kwargs: PLAINTEXT)
+    audit_writer.flush()
+
+    def logged():
+        audit_writer.flush()
+        db.expire_all()
+        return db.execute(select(
+            SystemLog.action_type, SystemLog.table_name, SystemLog.record_id, SystemLog.admin_id
+        ).order_by(SystemLog.log_id)).all()
+    return logged
+
+@pytest.fixture
+def admin(db):
+    user = AdminUser(username="reception", password_hash=PLAINTEXT.hash("secret1"), full_name="Reception")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_successful_mutation_is_logged(audit, client):
+    response = client.post("/api/doctors", json={
+        "doctor_id": "DOC001", "doctor_name": "Doctor One", "specialization": "General",
+        "consultation_charges": 1000, "hospital_charges": 500
+    })
+    client.post("/api/doctors", json={"doctor_id": "DOC002"})  # rejected: not logged
+
+    assert response.status_code == 200
+    assert audit() == [("CREATE", "doctors", None, None)]
+
+def test_login_is_logged_as_login_by_that_admin(audit, admin, client):
+    assert client.post("/api/auth/login", json={"username": "reception", "password": "wrong"}).status_code == 401
+    assert client.post("/api/auth/login", json={"username": "reception", "password": "secret1"}).status_code == 200
+
+    assert audit() == [("LOGIN", "admin_users", admin.admin_id, admin.admin_id)]
+
+def test_password_reset_is_not_logged_as_create(audit, admin, client):
+    response = client.post("/api/auth/reset-password", json={"username": "reception", "new_password": "secret2"})
+
+    assert response.status_code == 200
+    assert audit() == [("PASSWORD_RESET", "admin_users", admin.admin_id, None)]
+
+def test_receipt_rendering_is_not_logged(audit, db, client):
+    bill = add_visit(db, add_doctor(db), add_patient(db), date(2024, 3, 1))
+    db.commit()
+
+    response = client.post("/api/bills/receipts", json={"bill_ids": [bill.bill_id], "format": "html"})
+
+    assert response.status_code == 200
+    assert audit() == []
+
+def test_action_sub_routes_name_the_action():
+    assert describe_route("POST", "/api/vouchers/{voucher_id}/approve", {"voucher_id": "7"}) == ("APPROVE", "vouchers", 7)
+    assert describe_route("DELETE", "/api/expenses/{expense_id}", {"expense_id": "3"}) == ("DELETE", "additional_expenses", 3)
+
+def test_full_queue_drops_instead_of_blocking():
+    writer = AuditWriter(queue_size=2, batch_size=10, flush_interval_ms=500)
+
+    assert [writer.enqueue(None, "CREATE") for _ in range(3)] == [True, True, False]
+    assert writer.stats()["dropped"] == 1
@@ -0,0 +1,83 @@
+"""
+Monthly audit tables on SQLite: routing, retention to gzip NDJSON archives
+and re-import into system_logs_restored
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app.config import settings
+from app.database import engine
+from app.models import SystemLog
+from app.services import audit_partitions
+from app.services.audit_partitions import (
+    apply_retention, add_months, ensure_partitions, import_archive, insert_events, month_key, month_start
+)
+
+def event(created_at: datetime, action: str = "CREATE") -> dict:
+    return {"admin_id": None, "action_type": action, "table_name": "patients", "record_id": 1,
+            "description": None, "ip_address": None, "created_at": created_at}
+
+def monthly_tables():
+    return sorted(n for n in inspect(engine).get_table_names() if n.startswith("system_logs_2"))
+
+@pytest.fixture
+def partitioned(db, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "audit_partitioning", True)
+    monkeypatch.setattr(settings, "audit_partitions_ahead", 1)
+    monkeypatch.setattr(settings, "audit_retention_months", 12)
+    monkeypatch.setattr(settings, "audit_archive_dir", str(tmp_path / "archives"))
+    yield tmp_path / "archives"
+    with engine.begin() as conn:
+        for name in monthly_tables() + ["system_logs_restored"]:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    audit_partitions._known_tables.clear()
+
+def test_upcoming_months_get_their_tables(partitioned):
+    current = month_start(date.today())
+
+    ensure_partitions()
+
+    assert monthly_tables() == [f"system_logs_{month_key(add_months(current, i))}" for i in (0, 1)]
+
+def test_rows_from_before_partitioning_move_to_their_month(partitioned, db):
+    with engine.begin() as conn:
+        conn.execute(SystemLog.__table__.insert(), [event(datetime(2020, 3, 5))])
+
+    ensure_partitions()
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM system_logs")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM system_logs_202003")).scalar() == 1
+
+def test_expired_months_are_archived_and_dropped(partitioned):
+    old, recent = datetime(2020, 3, 5), datetime.combine(month_start(date.today()), datetime.min.time())
+    with engine.begin() as conn:
+        insert_events(conn, [event(old), event(old, "DELETE"), event(recent)])
+
+    [archived] = apply_retention()
+
+    assert archived["partition"] == "system_logs_202003"
+    assert archived["rows"] == 2
+    assert (partitioned / "system_logs_202003.ndjson.gz").exists()
+    assert "system_logs_202003" not in monthly_tables()
+    assert f"system_logs_{month_key(recent)}" in monthly_tables()
+
+def test_reimporting_an_archive_keeps_the_other_archives_rows(partitioned):
+    # Each month's table numbers log_id from 1, so both archives hold log_id 1
+    with engine.begin() as conn:
+        insert_events(conn, [event(datetime(2020, 3, 5))])
+        insert_events(conn, [event(datetime(2020, 4, 5)), event(datetime(2020, 4, 6))])
+    apply_retention()
+    march, april = (str(partitioned / f"system_logs_2020{m}.ndjson.gz") for m in ("03", "04"))
+
+    assert import_archive(march) == 1
+    assert import_archive(april) == 2
+    assert import_archive(march) == 1
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT source, log_id FROM system_logs_restored ORDER BY source, log_id"
+        )).fetchall()
+    assert rows == [("system_logs_202003", 1), ("system_logs_202004", 1), ("system_logs_202004", 2)]
@@ -0,0 +1,104 @@
+"""
+Bill reconciliation: mismatches found set-based per bill_id range, fixed in
+place, closed days left alone, and the job writing to the primary
+"""
+import json
+from datetime import date
+
+from sqlalchemy.orm import Session
+
+from app.database import Base, read_router
+from app.models import Bill, DayClose
+from app.services import jobs
+from app.services.bill_reconcile import reconcile_bills
+from factories import add_doctor, add_patient, add_visit, wait_for_job
+
+PAST = date(2024, 3, 1)
+REPLICA = read_router.replicas[0]
+
+def corrupt(db, bill: Bill, **values):
+    for field, value in values.items():
+        setattr(bill, field, value)
+    db.commit()
+
+def billed(db, count: int = 3):
+    doctor, patient = add_doctor(db), add_patient(db)
+    bills = [add_visit(db, doctor, patient, PAST, expenses={"ECG": 300}) for _ in range(count)]
+    db.commit()
+    return bills
+
+def test_clean_bills_have_no_mismatches(db):
+    billed(db)
+
+    result = reconcile_bills(db)
+
+    assert result["mismatched"] == 0
+    assert result["checked_range"] == [1, 3]
+
+def test_mismatches_are_reported_by_field(db):
+    bills = billed(db)
+    corrupt(db, bills[1], additional_expenses_total=0, subtotal=1500, total_amount=1500)
+
+    result = reconcile_bills(db)
+
+    assert result["mismatched"] == 1
+    assert result["fields"]["additional_expenses_total"] == 1
+    [mismatch] = result["sample"]
+    assert mismatch["bill_id"] == bills[1].bill_id
+    assert mismatch["differences"]["total_amount"] == {"stored": 1500.0, "expected": 1800.0}
+
+def test_fix_rewrites_mismatches_in_chunks(db, monkeypatch):
+    monkeypatch.setattr("app.config.settings.reconcile_chunk_size", 2)
+    bills = billed(db, 5)
+    for bill in bills[::2]:
+        corrupt(db, bill, doctor_charges=0)
+
+    result = reconcile_bills(db, fix=True)
+
+    assert (result["chunks"], result["fixed"]) == (3, 3)
+    assert result["touched_days"] == [PAST]
+    assert reconcile_bills(db)["mismatched"] == 0
+
+def test_closed_days_are_reported_not_fixed(db):
+    [bill] = billed(db, 1)
+    corrupt(db, bill, total_amount=1)
+    db.add(DayClose(close_date=PAST))
+    db.commit()
+
+    result = reconcile_bills(db, fix=True)
+
+    assert (result["mismatched"], result["locked"], result["fixed"]) == (1, 1, 0)
+    db.expire_all()
+    assert float(db.get(Bill, bill.bill_id).total_amount) == 1
+
+def test_reconcile_job_fixes_the_primary(db, runner, client):
+    [bill] = billed(db, 1)
+    corrupt(db, bill, total_amount=1)
+
+    job = client.post("/api/admin/bills/reconcile", params={"fix": True}).json()
+    status = wait_for_job(job["job_id"])
+
+    assert status["status"] == "completed", status["error"]
+    with open(runner.result_path(job["job_id"])) as fh:
+        assert json.load(fh)["fixed"] == 1
+    db.expire_all()
+    assert float(db.get(Bill, bill.bill_id).total_amount) == 1800
+
+def test_writing_jobs_never_use_a_replica(db, runner, monkeypatch):
+    [bill] = billed(db, 1)
+    corrupt(db, bill, total_amount=1)
+    Base.metadata.drop_all(bind=REPLICA["engine"])
+    Base.metadata.create_all(bind=REPLICA["engine"])
+    monkeypatch.setattr(read_router, "replicas", [REPLICA])
+    REPLICA.update(healthy=True, checked_at=0.0, error=None)
+    job_dir = jobs.results_dir() / "reconcile"
+    job_dir.mkdir(parents=True)
+    jobs._write_status(job_dir, {"job_id": "reconcile", "status": "running"})
+
+    # In-process, with the healthy replica configured
+    jobs._execute("reconcile", "bill_reconcile", jobs._validate_reconcile({"fix": True}))
+
+    with Session(REPLICA["engine"]) as replica_db:
+        assert replica_db.query(Bill).count() == 0
+    db.expire_all()
+    assert float(db.get(Bill, bill.bill_id).total_amount) == 1800
@@ -0,0 +1,110 @@
+"""
+Booking: tokens from the per-doctor counter, concurrent bookings, refusals
+that use up no token, and bookings racing a day close
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import Appointment, Bill, TokenCounter
+from app.services import reports
+from app.services.booking import BookingError, book_appointment, uses_procedure
+from factories import add_doctor, add_patient
+
+DAY = date.today()
+
+@pytest.fixture
+def clinic(db):
+    doctors = add_doctor(db, "DOC001"), add_doctor(db, "DOC002")
+    patient = add_patient(db)
+    db.commit()
+    return doctors, patient
+
+def book(client, patient_id: int, doctor_id: str = "DOC001"):
+    return client.post("/api/appointments", json={
+        "patient_id": patient_id, "doctor_id": doctor_id, "appointment_date": DAY.isoformat()
+    })
+
+def last_token(db, doctor_id: str = "DOC001"):
+    db.expire_all()
+    counter = db.query(TokenCounter).filter_by(doctor_id=doctor_id, token_date=DAY).first()
+    return counter.last_token_number if counter else None
+
+def test_tokens_count_up_per_doctor_and_day(clinic, db, client):
+    patient = clinic[1]
+
+    tokens = [book(client, patient.patient_id, doctor).json()["token_number"]
+              for doctor in ("DOC001", "DOC001", "DOC002")]
+
+    assert tokens == [f"DOC001-{DAY:%Y%m%d}-001", f"DOC001-{DAY:%Y%m%d}-002", f"DOC002-{DAY:%Y%m%d}-001"]
+    assert db.query(Appointment).count() == db.query(Bill).count() == 3
+
+def test_booking_returns_the_bill(clinic, client):
+    response = book(client, clinic[1].patient_id).json()
+
+    assert response["bill_id"] > 0
+    assert (response["doctor_charges"], response["hospital_charges"], response["total_amount"]) == (1000, 500, 1500)
+
+def test_concurrent_bookings_get_distinct_tokens(clinic, db):
+    patient = clinic[1]
+    with ThreadPoolExecutor(8) as pool:
+        responses = list(pool.map(lambda _: book(TestClient(app), patient.patient_id), range(16)))
+
+    assert [r.status_code for r in responses] == [200] * 16
+    assert sorted(int(r.json()["token_number"][-3:]) for r in responses) == list(range(1, 17))
+    assert last_token(db) == 16
+
+@pytest.mark.parametrize("patient_id, doctor_id, detail", [
+    (999999, "DOC001", "Patient not found"),
+    (None, "DOC999", "Doctor not found or inactive"),
+])
+def test_refusals_use_up_no_token(clinic, db, patient_id, doctor_id, detail):
+    with pytest.raises(BookingError) as error:
+        book_appointment(db, patient_id or clinic[1].patient_id, doctor_id, DAY)
+
+    assert (error.value.status_code, error.value.detail) == (404, detail)
+    assert last_token(db) is None
+    assert db.query(Appointment).count() == 0
+
+def test_counter_left_at_zero_restarts_at_one(clinic, db):
+    db.add(TokenCounter(doctor_id="DOC001", token_date=DAY, last_token_number=0))
+    db.commit()
+
+    assert book_appointment(db, clinic[1].patient_id, "DOC001", DAY)["token_number"].endswith("-001")
+
+def test_sqlite_books_without_the_procedure(clinic, db, monkeypatch):
+    monkeypatch.setattr("app.config.settings.booking_stored_procedure", True)
+    assert not uses_procedure(db)
+
+def test_booking_racing_a_close_waits_and_is_refused(clinic, db, client, monkeypatch):
+    patient = clinic[1]
+    closing, release = threading.Event(), threading.Event()
+    compute = reports.compute_summary_pieces
+
+    def slow_summary(*args, **kwargs):
+        closing.set()
+        release.wait(5)
+        return compute(*args, **kwargs)
+    monkeypatch.setattr(reports, "compute_summary_pieces", slow_summary)
+
+    closer = threading.Thread(target=lambda: TestClient(app).post(
+        "/api/admin/day-close", json={"date": DAY.isoformat()}
+    ))
+    closer.start()
+    assert closing.wait(5)
+    result = {}
+    booker = threading.Thread(target=lambda: result.update(response=book(TestClient(app), patient.patient_id)))
+    booker.start()
+    booker.join(0.5)
+    assert booker.is_alive()  # waiting for the close to commit
+
+    release.set()
+    closer.join(5)
+    booker.join(5)
+    assert result["response"].status_code == 409
+    assert last_token(db) is None
+    assert db.query(Appointment).count() == 0
@@ -0,0 +1,86 @@
+"""
+Single-flight coalescing of identical in-flight requests
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.coalesce import SingleFlight, coalesce
+
+def run_concurrently(group: SingleFlight, keys, fn):
+    """Start one call per key while the leader is held, then release it"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(len(keys)) as pool:
+        leader = pool.submit(group.do, keys[0], slow)
+        started.wait(5)
+        followers = [pool.submit(group.do, key, fn) for key in keys[1:]]
+        # Followers of the same key register as waiters before the leader finishes
+        while group.stats()["coalesced"] < sum(k == keys[0] for k in keys[1:]):
+            pass
+        release.set()
+        return [leader] + followers
+
+def test_identical_calls_share_one_execution():
+    group = SingleFlight("test", timeout_seconds=5)
+    calls = []
+
+    futures = run_concurrently(group, [("a",)] * 4, lambda: calls.append(1) or "result")
+
+    assert [f.result() for f in futures] == ["result"] * 4
+    assert len(calls) == 1
+    stats = group.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 3
+    assert stats["in_flight"] == 0
+
+def test_followers_share_the_leaders_error():
+    group = SingleFlight("test", timeout_seconds=5)
+
+    def fail():
+        raise ValueError("report failed")
+
+    futures = run_concurrently(group, [("a",)] * 3, fail)
+
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result()
+    assert group.stats()["errors"] == 1
+
+def test_waiter_computes_on_its_own_after_the_timeout():
+    group = SingleFlight("test", timeout_seconds=0.05)
+    release = threading.Event()
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(group.do, ("a",), lambda: release.wait(5) and "leader")
+        while not group.stats()["in_flight"]:
+            pass
+        assert group.do(("a",), lambda: "own") == "own"
+        release.set()
+        assert leader.result() == "leader"
+    assert group.stats()["timeouts"] == 1
+
+def test_decorator_keys_on_arguments():
+    seen = []
+
+    @coalesce("test_decorated", timeout_seconds=1)
+    def report(start_date=None, end_date=None):
+        seen.append((start_date, end_date))
+        return len(seen)
+
+    assert report("2024-01-01", "2024-01-31") == 1
+    assert report(start_date="2024-01-01", end_date="2024-02-29") == 2
+    assert report.single_flight.stats()["executions"] == 2
+
+def test_stats_endpoint_lists_the_report_groups(db, client):
+    client.get("/api/dashboard/stats")
+
+    groups = client.get("/api/admin/coalescing").json()["groups"]
+    assert {"dashboard_stats", "report_summary", "report_service_wise"} <= set(groups)
+    assert groups["dashboard_stats"]["executions"] >= 1
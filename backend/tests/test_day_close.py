@@ -0,0 +1,138 @@
+"""
+End-of-day close: settling stale appointments, snapshots, refused writes on
+closed days and writes racing a close
+"""
+import threading
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import Appointment, DailyServiceRollup
+from app.services import reports
+from app.services.report_cache import report_cache
+from factories import add_doctor, add_patient, add_visit
+
+PAST = date(2024, 3, 1)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    report_cache.clear()
+    yield
+    report_cache.clear()
+
+@pytest.fixture
+def day(db):
+    """Two visits on PAST: one paid with an ECG, one pending"""
+    doctor, patient = add_doctor(db), add_patient(db)
+    paid = add_visit(db, doctor, patient, PAST, status="Paid", expenses={"ECG": 300})
+    pending = add_visit(db, doctor, patient, PAST, expenses={"ECG": 200})
+    db.commit()
+    return paid, pending
+
+def close(client, day: date):
+    return client.post("/api/admin/day-close", json={"date": day.isoformat()})
+
+def summary(client, day: date) -> dict:
+    return client.get("/api/reports/summary", params={"start_date": day, "end_date": day}).json()
+
+def test_close_settles_stale_appointments(day, db, client):
+    paid, pending = day
+
+    response = close(client, PAST)
+
+    assert response.status_code == 200
+    assert response.json()["stale_completed"] == 1
+    assert response.json()["stale_no_show"] == 1
+    db.expire_all()
+    assert db.get(Appointment, paid.appointment_id).status == "Completed"
+    assert db.get(Appointment, pending.appointment_id).status == "No Show"
+
+def test_reports_read_the_snapshot(day, db, client):
+    before = summary(client, PAST)
+    close(client, PAST)
+
+    # Raw rows changed behind the API's back do not reach a closed day's report
+    add_visit(db, add_doctor(db, "DOC002"), add_patient(db), PAST, status="Paid")
+    db.commit()
+    report_cache.clear()
+
+    after = summary(client, PAST)
+    assert after["revenue"] == before["revenue"]
+    assert after["appointments"]["total"] == 2
+
+def test_service_snapshot_is_split_by_payment_status(day, db, client):
+    close(client, PAST)
+
+    rows = {(r.service_id, r.service_type, r.payment_status): float(r.amount)
+            for r in db.query(DailyServiceRollup)}
+    assert rows == {(0, "ECG", "Paid"): 300.0, (0, "ECG", "Pending"): 200.0}
+    report = client.get("/api/reports/service-wise", params={"start_date": PAST, "end_date": PAST}).json()
+    assert report["totals"] == {"count": 2, "total_amount": 500.0, "by_payment_status": {"Paid": 300.0, "Pending": 200.0}}
+
+def test_writes_to_a_closed_day_are_refused(day, client):
+    paid, pending = day
+    close(client, PAST)
+
+    assert client.patch(f"/api/bills/{pending.bill_id}/payment-status",
+                        json={"payment_status": "Paid"}).status_code == 409
+    assert client.post("/api/expenses", json={
+        "appointment_id": pending.appointment_id, "service_type": "ECG", "amount": 100
+    }).status_code == 409
+    assert client.patch(f"/api/appointments/{pending.appointment_id}/status",
+                        params={"status": "Cancelled"}).status_code == 409
+    assert client.delete(f"/api/appointments/{paid.appointment_id}").status_code == 409
+
+def test_booking_a_closed_day_is_refused(db, client):
+    doctor, patient = add_doctor(db), add_patient(db)
+    db.commit()
+    assert close(client, date.today()).status_code == 200
+
+    response = client.post("/api/appointments", json={
+        "patient_id": patient.patient_id, "doctor_id": doctor.doctor_id,
+        "appointment_date": date.today().isoformat()
+    })
+
+    assert response.status_code == 409
+    # The refused booking did not use up a token
+    assert client.get("/api/doctors", params={"include": "today_stats"}).json()[0]["today_stats"]["last_token"] is None
+
+def test_close_rules_and_reopen(day, client):
+    pending = day[1]
+    assert close(client, date.today() + timedelta(days=1)).status_code == 400
+    assert close(client, PAST).status_code == 200
+    assert close(client, PAST).status_code == 409
+
+    assert client.delete(f"/api/admin/day-close/{PAST}").status_code == 200
+    assert client.delete(f"/api/admin/day-close/{PAST}").status_code == 404
+    assert client.patch(f"/api/bills/{pending.bill_id}/payment-status",
+                        json={"payment_status": "Paid"}).status_code == 200
+
+def test_payment_racing_a_close_waits_and_is_refused(day, client, monkeypatch):
+    pending = day[1]
+    closing, release = threading.Event(), threading.Event()
+    compute = reports.compute_summary_pieces
+
+    def slow_summary(*args, **kwargs):
+        closing.set()
+        release.wait(5)
+        return compute(*args, **kwargs)
+    monkeypatch.setattr(reports, "compute_summary_pieces", slow_summary)
+
+    closer = threading.Thread(target=close, args=(TestClient(app), PAST))
+    closer.start()
+    assert closing.wait(5)
+    result = {}
+    payer = threading.Thread(target=lambda: result.update(response=TestClient(app).patch(
+        f"/api/bills/{pending.bill_id}/payment-status", json={"payment_status": "Paid"}
+    )))
+    payer.start()
+    payer.join(0.5)
+    assert payer.is_alive()  # waiting for the close to commit
+
+    release.set()
+    closer.join(5)
+    payer.join(5)
+    assert result["response"].status_code == 409
+    assert summary(client, PAST)["revenue"]["pending_amount"] > 0
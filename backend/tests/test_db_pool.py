@@ -0,0 +1,63 @@
+"""
+Connection pool instrumentation: waits, timeouts and idle pre-pings are
+counted per engine, including after the pool is recreated by dispose()
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app import database
+from app.config import settings
+from app.database import InstrumentedQueuePool, PoolStats
+
+@pytest.fixture
+def pooled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "db_pool_pre_ping", False)
+    monkeypatch.setattr(settings, "db_pre_ping_idle_seconds", 1)
+    bound = create_engine(
+        f"sqlite:///{tmp_path}/pool.db", poolclass=InstrumentedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    stats = PoolStats()
+    database._instrument_pool(bound, stats)
+    yield bound, stats
+    bound.dispose()
+
+def test_exhausted_pool_counts_the_wait_and_timeout(pooled):
+    bound, stats = pooled
+    with bound.connect():
+        with pytest.raises(exc.TimeoutError):
+            bound.connect()
+
+    counters = stats.snapshot()
+    assert counters["checkouts"] == 1
+    assert counters["waits"] == 1
+    assert counters["timeouts"] == 1
+
+def test_connection_idle_past_the_threshold_is_pinged(pooled):
+    bound, stats = pooled
+    with bound.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    with bound.connect():
+        pass
+    assert stats.pings == 0
+
+    time.sleep(1.1)
+    with bound.connect():
+        pass
+    assert stats.pings == 1
+
+def test_stats_survive_dispose(pooled):
+    bound, stats = pooled
+    bound.dispose()
+    with bound.connect():
+        pass
+    assert bound.pool.stats is stats
+    assert stats.snapshot()["connects"] == 1
+
+def test_db_pool_endpoint_reports_counters(client):
+    data = client.get("/api/admin/db-pool").json()
+
+    assert data["dialect"] == "sqlite"
+    assert "checkouts" in data["counters"]
@@ -0,0 +1,44 @@
+"""
+Doctor list with include=today_stats: today's counts, last token and capacity
+"""
+from datetime import date, time, timedelta
+
+from app.models import DoctorSchedule, TokenCounter
+from app.services.doctor_load import schedule_capacity
+from factories import add_doctor, add_patient, add_visit
+
+def test_capacity_follows_the_schedule_window():
+    monday = date(2024, 3, 4)
+    assert schedule_capacity("Monday, Tuesday", time(9), time(10), monday) == 6
+    assert schedule_capacity("Tuesday", time(9), time(10), monday) == 0
+    assert schedule_capacity(None, None, None, monday) is None
+
+def test_today_stats_counts_only_todays_appointments(db, client):
+    today = date.today()
+    busy, idle = add_doctor(db, "DOC001"), add_doctor(db, "DOC002")
+    patient = add_patient(db)
+    for status in ("Scheduled", "Scheduled", "Completed", "Cancelled"):
+        add_visit(db, busy, patient, today).appointment.status = status
+    add_visit(db, busy, patient, today - timedelta(days=1))
+    db.add(TokenCounter(doctor_id=busy.doctor_id, token_date=today, last_token_number=4))
+    db.add(DoctorSchedule(doctor_id=busy.doctor_id, working_days=today.strftime("%A"),
+                          start_time=time(9), end_time=time(10)))
+    db.commit()
+
+    doctors = client.get("/api/doctors", params={"include": "today_stats"}).json()
+
+    stats = {d["doctor_id"]: d["today_stats"] for d in doctors}
+    assert stats["DOC001"] == {
+        "date": today.isoformat(), "booked": 4, "completed": 1, "cancelled": 1, "waiting": 2,
+        "last_token": f"DOC001-{today:%Y%m%d}-004", "capacity": 6, "remaining_capacity": 3
+    }
+    assert stats["DOC002"]["booked"] == 0
+    assert stats["DOC002"]["last_token"] is None
+    assert stats["DOC002"]["capacity"] is None
+
+def test_plain_list_is_unchanged(db, client):
+    add_doctor(db)
+    db.commit()
+
+    [doctor] = client.get("/api/doctors").json()
+    assert "today_stats" not in doctor
@@ -0,0 +1,69 @@
+"""
+Conditional GET: weak ETags from version probes and 304 before the handler
+"""
+import time
+
+from app.services.etags import etag_matches
+from factories import add_doctor
+
+ORIGIN = "http://localhost:3000"
+
+def test_weak_comparison():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc", W/"def"', 'W/"def"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('W/"abc"', 'W/"def"')
+    assert not etag_matches(None, 'W/"abc"')
+
+def test_unchanged_list_answers_304(db, client):
+    add_doctor(db)
+    db.commit()
+
+    first = client.get("/api/doctors")
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "no-cache"
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    again = client.get("/api/doctors", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert again.content == b""
+
+def test_write_changes_the_tag(db, client):
+    add_doctor(db, "DOC001")
+    db.commit()
+    etag = client.get("/api/doctors").headers["etag"]
+
+    time.sleep(1)  # updated_at resolution
+    add_doctor(db, "DOC002")
+    db.commit()
+
+    fresh = client.get("/api/doctors", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert len(fresh.json()) == 2
+    assert fresh.headers["etag"] != etag
+
+def test_query_string_is_part_of_the_tag(db, client):
+    add_doctor(db)
+    db.commit()
+
+    active = client.get("/api/doctors").headers["etag"]
+    assert client.get("/api/doctors", params={"status": "Inactive"}).headers["etag"] != active
+
+def test_live_stats_are_not_tagged(db, client):
+    add_doctor(db)
+    db.commit()
+
+    response = client.get("/api/doctors", params={"include": "today_stats"})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+
+def test_not_modified_carries_cors_headers(db, client):
+    add_doctor(db)
+    db.commit()
+    etag = client.get("/api/doctors", headers={"Origin": ORIGIN}).headers["etag"]
+
+    response = client.get("/api/doctors", headers={"Origin": ORIGIN, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert "access-control-allow-origin" in response.headers
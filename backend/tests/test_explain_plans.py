@@ -0,0 +1,92 @@
+"""
+Query plans of the hot read endpoints: every SELECT an endpoint issues against
+a year of seeded data is EXPLAINed, and a full scan of a large table or a sort
+for ORDER BY fails that endpoint's test. Older databases get the same indexes.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+from app.database import Base, engine, sync_model_indexes
+from app.services.patient_history import history_cache
+from app.services.report_cache import report_cache
+from factories import seed_clinic
+
+ROWS = 20000
+LARGE_TABLES = {"appointments", "bills", "additional_expenses", "patients", "services"}
+
+TODAY = date.today()
+MONTH_AGO = TODAY - timedelta(days=29)
+
+HOT_ENDPOINTS = [
+    "/api/services",
+    "/api/dashboard/stats",
+    "/api/appointments/today",
+    f"/api/appointments?date_from={TODAY - timedelta(days=7)}&date_to={TODAY}",
+    f"/api/appointments?status=Scheduled&date_from={TODAY}&date_to={TODAY}",
+    "/api/appointments/doctor/DOC001/today",
+    "/api/bills?payment_status=Pending",
+    f"/api/bills?date_from={MONTH_AGO}&date_to={TODAY}",
+    "/api/patients/7/history",
+    f"/api/reports/summary?start_date={MONTH_AGO}&end_date={TODAY}",
+    f"/api/reports/doctor-wise?start_date={MONTH_AGO}&end_date={TODAY}",
+    f"/api/reports/service-wise?start_date={MONTH_AGO}&end_date={TODAY}",
+    "/api/reports/appointments-by-date",
+    f"/api/reports/timeseries?bucket=week&start_date={TODAY - timedelta(days=180)}&end_date={TODAY}",
+    "/api/reports/timeseries?doctor_id=DOC001",
+]
+
+@pytest.fixture(scope="module")
+def seeded():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    seed_clinic(ROWS, TODAY)
+
+def plan_problems(statement: str, parameters) -> list:
+    """'problem: plan line' for every step of the statement's plan that degrades"""
+    problems = []
+    with engine.connect() as conn:
+        for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+            detail = row[3]
+            words = detail.split()
+            if words[0] == "SCAN" and words[1] in LARGE_TABLES and "INDEX" not in detail:
+                problems.append(f"full table scan: {detail}")
+            elif detail.startswith("USE TEMP B-TREE FOR") and "ORDER BY" in detail:
+                problems.append(f"sort: {detail}")
+    return problems
+
+@pytest.mark.parametrize("endpoint", HOT_ENDPOINTS)
+def test_hot_endpoint_plans_use_indexes(seeded, client, endpoint):
+    report_cache.clear()
+    history_cache._patients.clear()
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(endpoint)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    assert response.status_code == 200
+    assert captured
+    problems = {
+        f"{problem}\n    {' '.join(statement.split())[:300]}"
+        for statement, parameters in captured
+        for problem in plan_problems(statement, parameters)
+    }
+    assert not problems, "\n".join(sorted(problems))
+
+def test_older_databases_get_the_model_indexes(db):
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX idx_appointment_patient_date"))
+        conn.execute(text("CREATE INDEX idx_patient ON appointments (patient_id)"))
+
+    sync_model_indexes()
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes("appointments")}
+    assert "idx_appointment_patient_date" in names
+    assert "idx_patient" not in names
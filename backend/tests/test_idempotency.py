@@ -0,0 +1,124 @@
+"""
+Idempotency-Key: one execution per key, replays from memory and from the
+table, refused key reuse, concurrent duplicates, released and abandoned claims
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.database import engine
+from app.main import app
+from app.models import AdditionalExpense, Appointment, IdempotencyKey
+from app.services.idempotency import _sha256, idempotency_store
+from factories import add_doctor, add_patient, add_visit
+
+DAY = date.today()
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    idempotency_store._cache.clear()
+    monkeypatch.setattr(idempotency_store, "wait_seconds", 1)
+
+@pytest.fixture
+def booking(db):
+    doctor, patient = add_doctor(db), add_patient(db)
+    db.commit()
+    return {"patient_id": patient.patient_id, "doctor_id": doctor.doctor_id, "appointment_date": DAY.isoformat()}
+
+def book(client, body: dict, key: str = "key-1"):
+    return client.post("/api/appointments", json=body, headers={"Idempotency-Key": key})
+
+def appointments(db) -> int:
+    db.expire_all()
+    return db.query(Appointment).count()
+
+def test_retry_replays_the_first_response(booking, db, client):
+    first = book(client, booking)
+    retry = book(client, booking)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert appointments(db) == 1
+
+def test_replay_from_the_table(booking, db, client):
+    first = book(client, booking)
+    idempotency_store._cache.clear()  # as another worker would see it
+    replays = idempotency_store.db_replays
+
+    assert book(client, booking).json() == first.json()
+    assert idempotency_store.db_replays == replays + 1
+    assert appointments(db) == 1
+
+def test_keys_are_scoped_and_bodies_must_match(booking, db, client):
+    book(client, booking)
+
+    assert book(client, {**booking, "appointment_date": "2030-01-01"}).status_code == 422
+    assert book(client, booking, key="key-2").status_code == 200
+    assert book(client, booking, key="x" * 256).status_code == 400
+    # Without a key nothing changes
+    assert client.post("/api/appointments", json=booking).status_code == 200
+    assert appointments(db) == 3
+
+def test_concurrent_duplicates_run_once(booking, db):
+    async def send_twice():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(book(client, booking), book(client, booking))
+
+    first, second = asyncio.run(send_twice())
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert appointments(db) == 1
+
+def test_server_errors_release_the_key(db, monkeypatch):
+    bill = add_visit(db, add_doctor(db), add_patient(db), DAY)
+    db.commit()
+    body = {"appointment_id": bill.appointment_id, "service_type": "ECG", "amount": 300}
+    client = TestClient(app, raise_server_exceptions=False)
+
+    def fail(*args):
+        raise RuntimeError("database went away")
+    with monkeypatch.context() as patch:
+        patch.setattr(main, "refresh_bill_totals", fail)
+        assert client.post("/api/expenses", json=body, headers={"Idempotency-Key": "k"}).status_code == 500
+
+    assert client.post("/api/expenses", json=body, headers={"Idempotency-Key": "k"}).status_code == 200
+    db.expire_all()
+    assert db.query(AdditionalExpense).count() == 1
+
+def claim(key: str, age: timedelta, body: bytes):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(IdempotencyKey.__table__.insert().values(
+            key_hash=_sha256("POST", "/api/appointments", key), request_hash=_sha256(body),
+            created_at=now - age, expires_at=now + timedelta(hours=1)
+        ))
+
+def test_open_claims_of_other_workers(booking, db, client, monkeypatch):
+    monkeypatch.setattr(idempotency_store, "abandon_seconds", 60)
+    body = client.build_request("POST", "/api", json=booking).content
+    claim("running", timedelta(seconds=1), body)
+    claim("abandoned", timedelta(minutes=5), body)
+
+    # Still running elsewhere: wait, then 409 without booking
+    assert book(client, booking, key="running").status_code == 409
+    # Its worker died long ago: taken over and run
+    assert book(client, booking, key="abandoned").status_code == 200
+    assert appointments(db) == 1
+
+def test_replays_carry_the_cors_headers(booking, client):
+    headers = {"Idempotency-Key": "key-1", "Origin": "http://reception.local"}
+    client.post("/api/appointments", json=booking, headers=headers)
+
+    replay = client.post("/api/appointments", json=booking, headers=headers)
+
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert "access-control-allow-origin" in replay.headers
+    assert "Idempotent-Replayed" in replay.headers["access-control-expose-headers"]
@@ -0,0 +1,103 @@
+"""
+Background jobs: validation, end-to-end runs in the process pool, broken
+pools and jobs orphaned by a restart
+"""
+import csv
+import json
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+import pytest
+
+from app.services import jobs
+from app.services.jobs import JobError, fail_orphaned_jobs, read_status
+from factories import add_doctor, add_patient, add_visit, wait_for_job
+
+@pytest.mark.parametrize("job_type, params, detail", [
+    ("nope", {}, "Unknown job type"),
+    ("report_summary", {"start_date": "2024-01-01"}, "'end_date' is required"),
+    ("report_summary", {"start_date": "2024-02-01", "end_date": "2024-01-01"}, "must not be before"),
+    ("report_timeseries", {"start_date": "2024-01-01", "end_date": "2024-02-01", "bucket": "hour"}, "bucket"),
+])
+def test_bad_requests_are_rejected(runner, job_type, params, detail):
+    with pytest.raises(JobError) as error:
+        runner.submit(job_type, params)
+    assert error.value.status_code == 400
+    assert detail in error.value.detail
+
+def test_report_job_matches_the_report(db, runner, client):
+    doctor, patient = add_doctor(db), add_patient(db)
+    for day in (date(2024, 1, 10), date(2024, 5, 20)):
+        add_visit(db, doctor, patient, day, status="Paid")
+    db.commit()
+    params = {"start_date": "2024-01-01", "end_date": "2024-06-30"}
+
+    status = wait_for_job(runner.submit("report_summary", params)["job_id"])
+
+    assert status["status"] == "completed", status["error"]
+    with open(runner.result_path(status["job_id"])) as fh:
+        result = json.load(fh)
+    assert result == client.get("/api/reports/summary", params=params).json()
+
+def test_later_jobs_see_edited_past_days(db, runner):
+    doctor, patient = add_doctor(db), add_patient(db)
+    db.commit()
+    params = {"start_date": "2024-01-01", "end_date": "2024-01-31"}
+
+    def appointments() -> int:
+        status = wait_for_job(runner.submit("report_summary", params)["job_id"])
+        with open(runner.result_path(status["job_id"])) as fh:
+            return json.load(fh)["appointments"]["total"]
+
+    assert appointments() == 0
+    add_visit(db, doctor, patient, date(2024, 1, 15))
+    db.commit()
+    # Same pool process, but the first job's pieces died with that job
+    assert appointments() == 1
+
+def test_export_job_writes_every_patient(db, runner, client):
+    for _ in range(3):
+        add_patient(db)
+    db.commit()
+
+    job = client.post("/api/jobs", json={"job_type": "patients_export"})
+    assert job.status_code == 202
+    status = wait_for_job(job.json()["job_id"])
+    assert status["status"] == "completed", status["error"]
+
+    body = client.get(f"/api/jobs/{status['job_id']}/result")
+    rows = list(csv.reader(body.text.splitlines()))
+    assert rows[0][0] == "patient_id"
+    assert len(rows) == 4
+
+class BrokenPool:
+    def submit(self, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("child died"))
+        return future
+
+    def shutdown(self, **kwargs):
+        pass
+
+def test_broken_pool_is_replaced(runner):
+    broken = runner._pool = BrokenPool()
+
+    status = runner.submit("patients_export", {})
+    status = wait_for_job(status["job_id"])
+
+    assert status["status"] == "failed"
+    assert "exited unexpectedly" in status["error"]
+    assert runner._pool is None
+    assert runner._get_pool() is not broken
+
+def test_restart_fails_orphaned_jobs(runner):
+    job_dir = jobs.results_dir()
+    for job_id, state in (("aaa", "queued"), ("bbb", "running"), ("ccc", "completed")):
+        (job_dir / job_id).mkdir(parents=True)
+        jobs._write_status(job_dir / job_id, {"job_id": job_id, "status": state, "error": None})
+
+    assert fail_orphaned_jobs() == 2
+    assert read_status("aaa")["status"] == read_status("bbb")["status"] == "failed"
+    assert "restart" in read_status("aaa")["error"]
+    assert read_status("ccc")["status"] == "completed"
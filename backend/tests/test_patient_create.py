@@ -0,0 +1,48 @@
+"""
+Patient registration: one INSERT, NIC conflicts as 409, walk-in get-or-create
+"""
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.models import Patient
+from app.services.audit import audit_writer
+
+PATIENT = {"patient_name": "Nimal Perera", "age": 42, "phone_number": "0771234567",
+           "gender": "Male", "nic": "820123456V"}
+
+def test_create_returns_the_stored_row(db, client):
+    response = client.post("/api/patients", json=PATIENT)
+
+    assert response.status_code == 200
+    created = response.json()
+    assert created["patient_id"] > 0
+    assert created["nic"] == PATIENT["nic"]
+    assert created["registration_date"]
+
+def test_duplicate_nic_is_a_409_naming_the_existing_patient(db, client):
+    first = client.post("/api/patients", json=PATIENT).json()
+
+    response = client.post("/api/patients", json={**PATIENT, "patient_name": "Someone Else"})
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Patient with this NIC already exists", "patient_id": first["patient_id"]}
+    assert db.scalar(select(func.count()).select_from(Patient)) == 1
+
+def test_get_or_create_registers_once(db, client):
+    created = client.post("/api/patients/get-or-create", json=PATIENT)
+    found = client.post("/api/patients/get-or-create", json={**PATIENT, "patient_name": "Someone Else"})
+
+    assert (created.status_code, created.json()["created"]) == (201, True)
+    assert (found.status_code, found.json()["created"]) == (200, False)
+    assert found.json()["patient_id"] == created.json()["patient_id"]
+    assert found.json()["patient_name"] == PATIENT["patient_name"]
+
+def test_nic_match_is_audited_as_a_read(db, client, monkeypatch):
+    events = []
+    monkeypatch.setattr(settings, "audit_enabled", True)
+    monkeypatch.setattr(audit_writer, "enqueue", lambda **event: events.append(event))
+
+    client.post("/api/patients/get-or-create", json=PATIENT)
+    client.post("/api/patients/get-or-create", json=PATIENT)
+
+    assert [e["action"] for e in events] == ["CREATE", "READ"]
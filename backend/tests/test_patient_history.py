@@ -0,0 +1,88 @@
+"""
+Patient visit history: fixed query count per page, cursor paging and the
+per-patient page cache
+"""
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app.config import settings
+from app.database import engine
+from app.services.patient_history import history_cache
+from factories import add_doctor, add_patient, add_visit
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    history_cache._patients.clear()
+    history_cache._invalidated_at.clear()
+
+@pytest.fixture
+def visits(db):
+    doctor, patient = add_doctor(db), add_patient(db, nic="111111111V")
+    bills = [add_visit(db, doctor, patient, date(2024, 3, day), expenses={"X-Ray": 100, "ECG": 200})
+             for day in range(1, 6)]
+    db.commit()
+    return patient, bills
+
+def count_queries():
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", listener)
+
+def test_page_is_loaded_in_three_queries(visits, client):
+    url = f"/api/patients/{visits[0].patient_id}/history"
+    statements, stop = count_queries()
+    try:
+        page = client.get(url, params={"limit": 5}).json()
+    finally:
+        stop()
+
+    assert len(statements) == 3
+    assert len(page["visits"]) == 5
+    assert all(len(v["additional_expenses"]) == 2 for v in page["visits"])
+
+def test_cursor_pages_walk_back_through_visits(visits, client):
+    patient, _ = visits
+    url = f"/api/patients/{patient.patient_id}/history"
+
+    first = client.get(url, params={"limit": 3}).json()
+    second = client.get(url, params={
+        "limit": 3, "before_date": first["next_before_date"], "before_id": first["next_before_id"]
+    }).json()
+
+    assert [v["appointment_date"] for v in first["visits"]] == ["2024-03-05", "2024-03-04", "2024-03-03"]
+    assert [v["appointment_date"] for v in second["visits"]] == ["2024-03-02", "2024-03-01"]
+    assert first["has_more"] and not second["has_more"]
+
+def test_new_expense_drops_the_cached_page(visits, client):
+    patient, bills = visits
+    url = f"/api/patients/{patient.patient_id}/history"
+    client.get(url)
+    client.get(url)
+    assert history_cache.stats()["hits"] >= 1
+
+    client.post("/api/expenses", json={"appointment_id": bills[-1].appointment_id, "service_type": "Lab", "amount": 50})
+
+    assert len(client.get(url).json()["visits"][0]["additional_expenses"]) == 3
+
+def test_bulk_import_update_drops_the_cached_page(visits, client, monkeypatch, tmp_path):
+    patient, _ = visits
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    url = f"/api/patients/{patient.patient_id}/history"
+    client.get(url)
+
+    job = client.post("/api/patients/import", files={"file": (
+        "patients.csv", b"patient_name,age,phone_number,gender,nic\nNew Name,40,0771234567,Male,111111111V\n"
+    )}).json()
+    deadline = time.monotonic() + 10
+    while client.get(f"/api/patients/import/{job['job_id']}").json()["status"] != "completed":
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    assert client.get(url).json()["patient"]["patient_name"] == "New Name"
+
+def test_unknown_patient_is_404(db, client):
+    assert client.get("/api/patients/999/history").status_code == 404
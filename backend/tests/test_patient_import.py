@@ -0,0 +1,100 @@
+"""
+Bulk patient CSV import: spooled parts, background upsert by NIC, progress
+polling and the per-row error report
+"""
+import csv
+import io
+import json
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.config import settings
+from app.models import Patient
+from app.services.patient_import import fail_interrupted_imports, imports_dir
+from factories import add_patient
+
+HEADER = "patient_name,age,phone_number,gender,nic\n"
+URL = "/api/patients/import"
+
+@pytest.fixture(autouse=True)
+def upload_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "import_chunk_size", 2)
+
+def upload(client, content: str, **params):
+    return client.post(URL, params=params, files={"file": ("patients.csv", content.encode(), "text/csv")})
+
+def finished(client, job_id: str) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = client.get(f"{URL}/{job_id}").json()
+        if status["status"] in ("completed", "failed"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"import {job_id} did not finish")
+
+def test_rows_are_upserted_and_rejects_reported(db, client):
+    add_patient(db, nic="111111111V")
+    db.commit()
+    content = HEADER + (
+        "Kamala Silva,35,0771234567,Female,111111111V\n"
+        "Sunil Fernando,50,0712345678,Male,222222222V\n"
+        "Bad Age,0,0712345678,Male,333333333V\n"
+        "Ruwan Jay,28,0701234567,Male,444444444V\n"
+    )
+
+    accepted = upload(client, content)
+    assert accepted.status_code == 202
+    status = finished(client, accepted.json()["job_id"])
+
+    assert status["status"] == "completed"
+    assert (status["inserted"], status["updated"], status["failed"]) == (2, 1, 1)
+    assert status["errors"][0]["row"] == 4
+    db.expire_all()
+    assert db.scalar(select(Patient.patient_name).where(Patient.nic == "111111111V")) == "Kamala Silva"
+
+    report = client.get(f"{URL}/{status['job_id']}/errors")
+    rows = list(csv.reader(io.StringIO(report.text)))
+    assert rows[0] == ["row", "nic", "error"]
+    assert rows[1][:2] == ["4", "333333333V"]
+    assert "age" in rows[1][2]
+
+def test_file_sent_in_parts_is_imported_once_complete(db, client):
+    content = HEADER + "Kamala Silva,35,0771234567,Female,111111111V\n"
+    cut = len(HEADER) + 10  # parts may split a line
+
+    first = upload(client, content[:cut], final="false").json()
+    assert first["status"] == "uploading"
+    upload(client, content[cut:], job_id=first["job_id"], final="true")
+
+    status = finished(client, first["job_id"])
+    assert (status["parts"], status["inserted"]) == (2, 1)
+
+def test_oversized_part_is_refused(db, client, monkeypatch):
+    monkeypatch.setattr(settings, "max_file_size", 16)
+
+    response = upload(client, HEADER + "Kamala Silva,35,0771234567,Female,111111111V\n")
+
+    assert response.status_code == 413
+    assert not any(imports_dir().iterdir())
+
+def test_missing_columns_fail_the_import(db, client):
+    status = finished(client, upload(client, "name,nic\nKamala,111111111V\n").json()["job_id"])
+
+    assert status["status"] == "failed"
+    assert "missing columns" in status["message"]
+
+def test_imports_interrupted_by_a_restart_are_marked_failed(db):
+    for job_id, state in (("a1", "running"), ("b2", "queued"), ("c3", "completed"), ("d4", "uploading")):
+        job_dir = imports_dir() / job_id
+        job_dir.mkdir(parents=True)
+        (job_dir / "status.json").write_text(json.dumps({"job_id": job_id, "status": state}))
+        (job_dir / "upload.csv").write_text(HEADER)
+
+    assert fail_interrupted_imports() == 2
+
+    states = {p.parent.name: json.loads(p.read_text())["status"] for p in imports_dir().glob("*/status.json")}
+    assert states == {"a1": "failed", "b2": "failed", "c3": "completed", "d4": "uploading"}
+    assert not (imports_dir() / "a1" / "upload.csv").exists()
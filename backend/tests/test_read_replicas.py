@@ -0,0 +1,101 @@
+"""
+Read replica routing, with a second SQLite file standing in for the replica.
+The primary holds one patient and the replica two, so each response shows
+which database served it.
+"""
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine, read_router
+from app.config import settings
+from app.main import app
+from factories import add_patient
+
+DASHBOARD = "/api/dashboard/stats"
+REPLICA = read_router.replicas[0]
+PRIMARY_PATIENTS, REPLICA_PATIENTS = 1, 2
+
+def seed(bind, patients: int):
+    Base.metadata.drop_all(bind=bind)
+    Base.metadata.create_all(bind=bind)
+    with Session(bind) as db:
+        for _ in range(patients):
+            add_patient(db)
+        db.commit()
+
+def served_by(client) -> str:
+    patients = client.get(DASHBOARD).json()["total_patients"]
+    return {PRIMARY_PATIENTS: "primary", REPLICA_PATIENTS: "replica"}[patients]
+
+@pytest.fixture
+def replica(monkeypatch):
+    replica = REPLICA
+    monkeypatch.setattr(read_router, "replicas", [replica])
+    seed(engine, PRIMARY_PATIENTS)
+    seed(replica["engine"], REPLICA_PATIENTS)
+    # Fresh routing state; health is re-checked on the first pick
+    replica.update(healthy=True, checked_at=0.0, error=None, reads=0)
+    read_router._last_write.clear()
+    read_router.primary_reads = read_router.sticky_reads = read_router.fallbacks = 0
+    return replica
+
+def test_read_served_by_replica(replica, client):
+    assert served_by(client) == "replica"
+    assert replica["reads"] == 1
+    assert read_router.primary_reads == 0
+
+def test_unhealthy_replica_falls_back_to_primary(replica, client):
+    read_router.mark_unhealthy(replica, Exception("replication stopped"))
+
+    assert served_by(client) == "primary"
+    assert replica["reads"] == 0
+    assert read_router.primary_reads == 1
+
+def test_unreachable_replica_falls_back_to_primary(replica, client, monkeypatch, tmp_path):
+    # A database file in a directory that does not exist cannot be opened
+    dead = create_engine(f"sqlite:///{tmp_path}/missing-dir/replica.db")
+    monkeypatch.setitem(replica, "engine", dead)
+
+    assert served_by(client) == "primary"
+    assert replica["healthy"] is False
+    assert replica["error"]
+
+def test_replica_dropping_after_pick_falls_back_to_primary(replica, client, monkeypatch, tmp_path):
+    # Healthy at the last check, gone by the time the request checks out a connection
+    dead = create_engine(f"sqlite:///{tmp_path}/missing-dir/replica.db")
+    monkeypatch.setitem(replica, "engine", dead)
+    replica["checked_at"] = time.monotonic()
+
+    assert served_by(client) == "primary"
+    assert read_router.fallbacks == 1
+    assert replica["healthy"] is False
+
+def test_reads_stay_on_primary_after_a_write(replica, client, monkeypatch):
+    monkeypatch.setattr(settings, "read_your_writes_seconds", 1)
+    created = client.post("/api/doctors", json={
+        "doctor_id": "DOC002", "doctor_name": "Doctor Two", "specialization": "Cardiology",
+        "consultation_charges": 2000, "hospital_charges": 500
+    })
+    assert created.status_code == 200
+
+    # The writer sees the primary straight away ...
+    assert served_by(client) == "primary"
+    assert read_router.sticky_reads == 1
+    # ... while other clients keep reading from the replica
+    other = TestClient(app, headers={"Authorization": "Bearer another-client"})
+    assert served_by(other) == "replica"
+
+    time.sleep(1.1)
+    client.cookies.clear()
+    assert served_by(client) == "replica"
+
+def test_replica_status_reports_its_own_pool(replica, client):
+    client.get(DASHBOARD)
+
+    [status] = client.get("/api/admin/db-replicas").json()["replicas"]
+    assert status["healthy"] is True
+    assert status["pool"]["checkouts"] >= 1
@@ -0,0 +1,76 @@
+"""
+Batch receipts: merged HTML/PDF, streamed zip, bill selection and the
+in-process vs. pool split
+"""
+import io
+import zipfile
+from datetime import date
+
+import pytest
+
+from app.config import settings
+from app.services import receipts
+from factories import add_doctor, add_patient, add_visit
+
+DAY = date(2024, 3, 1)
+
+@pytest.fixture
+def bills(db):
+    doctor, patient = add_doctor(db), add_patient(db)
+    bills = [add_visit(db, doctor, patient, DAY, expenses={"ECG": 300}) for _ in range(3)]
+    add_visit(db, doctor, patient, date(2024, 3, 2))
+    db.commit()
+    yield [b.bill_id for b in bills]
+    receipts.shutdown_pool()
+
+def test_merged_html_holds_every_bill(bills, client):
+    response = client.post("/api/bills/receipts", json={"bill_ids": bills, "format": "html"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.text.count("</html>") == 1
+    for bill_id in bills:
+        assert f"#{bill_id}" in response.text
+
+def test_bill_date_selects_the_days_bills(bills, client):
+    response = client.post("/api/bills/receipts", json={
+        "bill_date": DAY.isoformat(), "format": "html", "output": "zip"
+    })
+
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert sorted(names) == sorted(f"receipt-{b}.html" for b in bills)
+
+def test_merged_pdf(bills, client):
+    response = client.post("/api/bills/receipts", json={"bill_ids": bills})
+
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+def test_large_batches_render_in_the_pool(bills, client, monkeypatch):
+    monkeypatch.setattr(settings, "receipt_chunk_size", 1)
+    in_process = client.post("/api/bills/receipts", json={"bill_ids": bills[:1], "format": "html"}).text
+
+    pooled = client.post("/api/bills/receipts", json={"bill_ids": bills, "format": "html"})
+
+    assert receipts._pool is not None
+    assert in_process.count("</html>") == pooled.text.count("</html>") == 1
+    for bill_id in bills:
+        assert f"#{bill_id}" in pooled.text
+
+@pytest.mark.parametrize("body, status", [
+    ({"bill_ids": [1], "format": "docx"}, 400),
+    ({"bill_ids": [1], "output": "tar"}, 400),
+    ({"format": "html"}, 400),
+    ({"bill_date": "01/03/2024"}, 400),
+    ({"bill_ids": [999999]}, 404),
+])
+def test_bad_requests(bills, client, body, status):
+    assert client.post("/api/bills/receipts", json=body).status_code == status
+
+def test_single_receipt(bills, client):
+    response = client.get(f"/api/bills/{bills[0]}/receipt")
+
+    assert response.status_code == 200
+    assert f"#{bills[0]}" in response.text
+    assert client.get("/api/bills/999999/receipt").status_code == 404
@@ -0,0 +1,62 @@
+"""
+Closed-day report cache: past days are served from memory until an edit
+invalidates them or the closed TTL runs out
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from app.services.report_cache import ReportCache, report_cache
+from factories import add_doctor, add_patient, add_visit
+
+PAST = date(2024, 3, 1)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    report_cache.clear()
+    yield
+    report_cache.clear()
+
+def summary(client, day):
+    return client.get("/api/reports/summary", params={"start_date": day, "end_date": day}).json()
+
+def test_closed_day_is_served_from_cache(db, client):
+    doctor, patient = add_doctor(db), add_patient(db)
+    add_visit(db, doctor, patient, PAST, status="Paid")
+    db.commit()
+    assert summary(client, PAST)["revenue"]["total_collected"] == 1500.0
+    hits = report_cache.stats()["hits"]
+
+    # A row written behind the API's back is not seen until the cache is dropped
+    add_visit(db, doctor, patient, PAST, status="Paid")
+    db.commit()
+    assert summary(client, PAST)["revenue"]["total_collected"] == 1500.0
+    assert report_cache.stats()["hits"] == hits + 1
+
+    client.delete("/api/reports/cache")
+    assert summary(client, PAST)["revenue"]["total_collected"] == 3000.0
+
+def test_backdated_expense_invalidates_its_day(db, client):
+    doctor, patient = add_doctor(db), add_patient(db)
+    bill = add_visit(db, doctor, patient, PAST, status="Paid")
+    db.commit()
+    assert summary(client, PAST)["revenue"]["additional_services"] == 0
+
+    response = client.post("/api/expenses", json={
+        "appointment_id": bill.appointment_id, "service_type": "X-Ray", "amount": 250
+    })
+
+    assert response.status_code == 200
+    assert summary(client, PAST)["revenue"]["total_collected"] == 1750.0
+
+def test_closed_and_open_days_expire_after_their_ttls(monkeypatch):
+    cache = ReportCache(open_ttl_seconds=30, closed_ttl_seconds=600)
+    today = date(2024, 3, 10)
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.report_cache.time.monotonic", lambda: clock[0])
+    cache.put_many("summary", {today - timedelta(days=1): {"n": 1}, today: {"n": 2}}, today)
+
+    clock[0] += 31
+    assert list(cache.get_many("summary", [today - timedelta(days=1), today])) == [today - timedelta(days=1)]
+    clock[0] += 600
+    assert cache.get_many("summary", [today - timedelta(days=1)]) == {}
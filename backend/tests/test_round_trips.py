@@ -0,0 +1,81 @@
+"""
+Round trips: read endpoints use read sessions, and write endpoints answer from
+the objects they wrote instead of re-reading them after commit
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine, get_db
+from app.main import app
+from app.models import Bill
+from app.services.bill_reconcile import refresh_bill_totals
+from factories import add_doctor, add_patient, add_visit
+
+@pytest.fixture
+def statements():
+    """Statements and COMMITs sent to the primary, in order"""
+    sent = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        sent.append(" ".join(statement.split()))
+
+    def on_commit(conn):
+        sent.append("COMMIT")
+    event.listen(engine, "before_cursor_execute", on_execute)
+    event.listen(engine, "commit", on_commit)
+    yield sent
+    event.remove(engine, "before_cursor_execute", on_execute)
+    event.remove(engine, "commit", on_commit)
+
+def after_last_commit(sent: list) -> list:
+    return sent[len(sent) - sent[::-1].index("COMMIT"):]
+
+def test_no_get_endpoint_uses_a_write_session():
+    write_routes = [
+        route.path for route in app.routes
+        if "GET" in getattr(route, "methods", ()) and hasattr(route, "dependant")
+        and any(d.call is get_db for d in route.dependant.dependencies)
+    ]
+    assert write_routes == []
+
+def test_booking_is_not_re_read_after_commit(db, client, statements):
+    doctor, patient = add_doctor(db), add_patient(db)
+    db.commit()
+    statements.clear()
+
+    response = client.post("/api/appointments", json={
+        "patient_id": patient.patient_id, "doctor_id": doctor.doctor_id,
+        "appointment_date": date.today().isoformat()
+    })
+
+    assert response.status_code == 200, response.text
+    assert response.json()["appointment_id"] > 0
+    assert statements.count("COMMIT") == 1
+    assert after_last_commit(statements) == []
+
+def test_expense_writes_are_not_re_read_after_commit(db, client, statements):
+    bill = add_visit(db, add_doctor(db), add_patient(db), date.today())
+    db.commit()
+    statements.clear()
+
+    created = client.post("/api/expenses", json={
+        "appointment_id": bill.appointment_id, "service_type": "ECG", "amount": 300
+    })
+    assert created.status_code == 200, created.text
+    assert after_last_commit(statements) == []
+
+    statements.clear()
+    assert client.delete(f"/api/expenses/{created.json()['expense_id']}").status_code == 200
+    assert after_last_commit(statements) == []
+
+def test_refresh_bill_totals_returns_the_bill_date(db):
+    bill = add_visit(db, add_doctor(db), add_patient(db), date(2024, 3, 1), expenses={"ECG": 300})
+    bill.total_amount = 1
+    db.commit()
+
+    assert refresh_bill_totals(db, bill.appointment_id) == date(2024, 3, 1)
+    db.commit()
+    db.expire_all()
+    assert float(db.get(Bill, bill.bill_id).total_amount) == 1800
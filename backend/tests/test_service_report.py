@@ -0,0 +1,126 @@
+"""
+Service-wise report: catalog services grouped by category with payment status
+subtotals, live catalog names, service dates on new expenses and the backfill
+of an older expense table
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.database import add_expense_service_columns, engine
+from app.models import AdditionalExpense, DayClose, Service
+from app.services.report_cache import report_cache
+from factories import add_doctor, add_patient, add_visit
+
+PAST = date(2024, 3, 1)
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    report_cache.clear()
+    yield
+    report_cache.clear()
+
+@pytest.fixture
+def catalog(db):
+    ecg = Service(name="ECG", price=300, category="Cardiology")
+    xray = Service(name="X-Ray", price=700, category="Radiology")
+    db.add_all([ecg, xray])
+    db.flush()
+    return ecg, xray
+
+def add_expense(db, bill, service, amount: float, service_type: str = None):
+    db.add(AdditionalExpense(
+        appointment_id=bill.appointment_id, service_id=service.id if service else None,
+        service_type=service_type or service.name, amount=amount, service_date=bill.bill_date
+    ))
+
+def service_wise(client, day: date = PAST) -> dict:
+    return client.get("/api/reports/service-wise", params={"start_date": day, "end_date": day}).json()
+
+def test_report_groups_services_by_category_and_payment_status(catalog, db, client):
+    ecg, xray = catalog
+    doctor, patient = add_doctor(db), add_patient(db)
+    paid = add_visit(db, doctor, patient, PAST, status="Paid")
+    pending = add_visit(db, doctor, patient, PAST)
+    add_expense(db, paid, ecg, 300)
+    add_expense(db, pending, ecg, 300)
+    add_expense(db, pending, xray, 700)
+    add_expense(db, pending, None, 50, service_type="Dressing")
+    db.commit()
+
+    report = service_wise(client)
+
+    assert [c["category"] for c in report["categories"]] == ["Cardiology", "Radiology", "Uncategorized"]
+    cardiology = report["categories"][0]
+    assert cardiology["by_payment_status"] == {"Paid": 300.0, "Pending": 300.0}
+    [entry] = cardiology["services"]
+    assert (entry["service_id"], entry["service_name"], entry["count"]) == (ecg.id, "ECG", 2)
+    assert report["categories"][2]["services"][0]["service_name"] == "Dressing"
+    assert report["totals"] == {"count": 4, "total_amount": 1350.0,
+                                "by_payment_status": {"Paid": 300.0, "Pending": 1050.0}}
+
+def test_catalog_edits_show_without_invalidation(catalog, db, client):
+    ecg, _ = catalog
+    add_expense(db, add_visit(db, add_doctor(db), add_patient(db), PAST), ecg, 300)
+    db.commit()
+    service_wise(client)
+
+    ecg.name, ecg.category = "Electrocardiogram", "Diagnostics"
+    db.commit()
+
+    [category] = service_wise(client)["categories"]
+    assert category["category"] == "Diagnostics"
+    assert category["services"][0]["service_name"] == "Electrocardiogram"
+
+def test_new_expenses_are_dated_today(catalog, db, client):
+    ecg, _ = catalog
+    bill = add_visit(db, add_doctor(db), add_patient(db), date.today())
+    db.commit()
+
+    response = client.post("/api/expenses", json={
+        "appointment_id": bill.appointment_id, "service_id": ecg.id, "service_type": "ECG", "amount": 300
+    })
+
+    assert response.status_code == 200, response.text
+    db.expire_all()
+    expense = db.query(AdditionalExpense).one()
+    assert (expense.service_id, expense.service_date) == (ecg.id, date.today())
+    assert client.post("/api/expenses", json={
+        "appointment_id": bill.appointment_id, "service_id": 999, "service_type": "ECG", "amount": 300
+    }).status_code == 404
+
+def test_payment_is_refused_when_an_expense_day_is_closed(catalog, db, client):
+    ecg, _ = catalog
+    bill = add_visit(db, add_doctor(db), add_patient(db), date.today())
+    db.add(AdditionalExpense(appointment_id=bill.appointment_id, service_id=ecg.id, service_type="ECG",
+                             amount=300, service_date=PAST))
+    db.add(DayClose(close_date=PAST))
+    db.commit()
+
+    response = client.patch(f"/api/bills/{bill.bill_id}/payment-status", json={"payment_status": "Paid"})
+
+    assert response.status_code == 409
+
+def test_older_expense_tables_are_backfilled(catalog, db):
+    ecg, _ = catalog
+    db.commit()
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE additional_expenses"))
+        conn.execute(text(
+            "CREATE TABLE additional_expenses (expense_id INTEGER PRIMARY KEY, appointment_id INTEGER NOT NULL, "
+            "service_type VARCHAR(50) NOT NULL, service_description VARCHAR(255), "
+            "amount NUMERIC(10, 2) NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO additional_expenses (appointment_id, service_type, amount, created_at) "
+            "VALUES (1, 'ECG', 300, :a), (1, 'Dressing', 50, :b)"
+        ), {"a": datetime(2024, 3, 1, 9, 30), "b": datetime(2024, 3, 2, 18, 0)})
+
+    add_expense_service_columns()
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT service_type, service_id, service_date FROM additional_expenses ORDER BY expense_id"
+        )).fetchall()
+    assert [tuple(r) for r in rows] == [("ECG", ecg.id, "2024-03-01"), ("Dressing", None, "2024-03-02")]
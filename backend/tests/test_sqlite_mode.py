@@ -0,0 +1,49 @@
+"""
+SQLite mode: pooled WAL connections and schema setup without MySQL-only DDL
+"""
+import threading
+
+from sqlalchemy import inspect, text
+
+from app.database import create_database_schema, engine
+from factories import add_doctor
+
+def test_connections_use_wal_and_a_busy_timeout():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+def test_concurrent_readers_get_their_own_connections():
+    seen, barrier = set(), threading.Barrier(3)
+
+    def read():
+        with engine.connect() as conn:
+            barrier.wait(timeout=5)
+            seen.add(id(conn.connection.dbapi_connection))
+            conn.execute(text("SELECT 1"))
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(seen) == 3
+
+def test_schema_setup_runs_on_sqlite(db):
+    create_database_schema()
+
+    tables = set(inspect(engine).get_table_names())
+    assert {"patients", "doctors", "appointments", "bills", "doctor_schedules"} <= tables
+
+def test_doctor_schedule_round_trip(db, client):
+    add_doctor(db)
+    db.commit()
+    schedule = {"doctor_id": "DOC001", "working_days": "Mon,Wed", "start_time": "09:00", "end_time": "12:00"}
+
+    assert client.post("/api/doctors/schedule", json=schedule).status_code == 200
+    assert client.post("/api/doctors/schedule", json={**schedule, "end_time": "13:00"}).status_code == 200
+
+    [saved] = client.get("/api/doctors/schedules").json()
+    assert saved["working_days"] == "Mon,Wed"
+    assert saved["end_time"] == "13:00"
+    assert saved["created_at"]
@@ -0,0 +1,52 @@
+"""
+Production launch helpers: one-time startup tasks and worker sizing
+"""
+import start
+from app.services import startup
+from app.services.startup import LAUNCH_ID_ENV, resolve_workers, run_once, state_files
+
+def test_task_runs_once_per_launch(monkeypatch, tmp_path):
+    monkeypatch.setattr(startup, "state_dir", lambda: tmp_path)
+    monkeypatch.setenv(LAUNCH_ID_ENV, "launch-a")
+    calls = []
+
+    assert run_once("schema", lambda: calls.append(1)) is True
+    assert run_once("schema", lambda: calls.append(2)) is False
+    assert calls == [1]
+    assert len(state_files("launch-a")) == 2
+
+    # A new launch runs it again
+    monkeypatch.setenv(LAUNCH_ID_ENV, "launch-b")
+    assert run_once("schema", lambda: calls.append(3)) is True
+    assert calls == [1, 3]
+
+def test_failed_task_is_retried_by_the_next_worker(monkeypatch, tmp_path):
+    monkeypatch.setattr(startup, "state_dir", lambda: tmp_path)
+    monkeypatch.setenv(LAUNCH_ID_ENV, "launch-a")
+
+    def fail():
+        raise RuntimeError("database not ready")
+
+    try:
+        run_once("schema", fail)
+    except RuntimeError:
+        pass
+    assert run_once("schema", lambda: None) is True
+
+def test_without_a_launch_id_tasks_always_run(monkeypatch):
+    monkeypatch.delenv(LAUNCH_ID_ENV, raising=False)
+    calls = []
+    run_once("schema", lambda: calls.append(1))
+    run_once("schema", lambda: calls.append(1))
+    assert calls == [1, 1]
+
+def test_worker_count_defaults_to_available_cpus(monkeypatch):
+    monkeypatch.setattr(startup, "available_cpus", lambda: 6)
+    assert resolve_workers(0) == 6
+    assert resolve_workers(3) == 3
+
+def test_prod_command_never_reloads():
+    command, workers, _ = start.build_prod_command(workers=4)
+    assert workers == 4
+    assert "--reload" not in command
+    assert "--reload" in start.build_dev_command()
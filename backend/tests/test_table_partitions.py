@@ -0,0 +1,73 @@
+"""
+Clinical partitioning: a no-op on SQLite, and the REORGANIZE statements the
+MySQL maintenance issues for upcoming months and old years
+"""
+from datetime import date
+
+import pytest
+
+from app.config import settings
+from app.services import table_partitions
+from app.services.audit_partitions import _to_days, add_months, month_key, month_start
+from app.services.jobs import _validate_partitions
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, *args):
+        self.statements.append(str(statement))
+
+def monthly(*months: date) -> list:
+    partitions = [{"name": f"p{month_key(m)}", "upper_bound": add_months(m, 1), "rows": 0} for m in months]
+    return partitions + [{"name": "pmax", "upper_bound": None, "rows": 0}]
+
+def test_sqlite_is_left_alone(db, client, monkeypatch):
+    monkeypatch.setattr(settings, "clinical_partitioning", True)
+
+    assert not table_partitions.is_enabled()
+    assert table_partitions.maintain_partitions(convert=True)["converted"] == []
+    body = client.get("/api/admin/partitions").json()
+    assert body["enabled"] is False
+    assert body["tables"] == {"appointments": [], "bills": []}
+    assert client.post("/api/admin/partitions", params={"convert": True}).status_code == 400
+
+def test_upcoming_months_are_split_from_pmax(monkeypatch):
+    monkeypatch.setattr(settings, "clinical_partitions_ahead", 2)
+    current = month_start(date.today())
+    conn = RecordingConnection()
+
+    created = table_partitions._create_ahead(conn, "bills", monthly(add_months(current, -1)))
+
+    assert created == [f"p{month_key(add_months(current, i))}" for i in range(3)]
+    [statement] = conn.statements
+    assert statement.startswith("ALTER TABLE bills REORGANIZE PARTITION pmax INTO")
+    assert statement.endswith("PARTITION pmax VALUES LESS THAN MAXVALUE)")
+
+def test_nothing_is_created_when_far_enough_ahead(monkeypatch):
+    monkeypatch.setattr(settings, "clinical_partitions_ahead", 1)
+    current = month_start(date.today())
+    conn = RecordingConnection()
+
+    assert table_partitions._create_ahead(conn, "bills", monthly(current, add_months(current, 1))) == []
+    assert conn.statements == []
+
+def test_only_whole_old_years_are_merged(monkeypatch):
+    monkeypatch.setattr(settings, "clinical_partition_merge_after_months", 12)
+    old_year = table_partitions.merge_horizon().year - 1
+    full = [date(old_year, m, 1) for m in range(1, 13)]
+    partial = [date(old_year - 1, m, 1) for m in range(1, 6)]
+    conn = RecordingConnection()
+
+    merged = table_partitions._merge_old(conn, "appointments", monthly(*partial, *full))
+
+    assert merged == [f"y{old_year}"]
+    [statement] = conn.statements
+    assert f"p{old_year}01, " in statement and f"p{old_year}12 " in statement
+    assert f"PARTITION y{old_year} VALUES LESS THAN ({_to_days(date(old_year + 1, 1, 1))})" in statement
+
+@pytest.mark.parametrize("params, convert", [
+    ({}, False), ({"convert": True}, True), ({"convert": "yes"}, True), ({"convert": "false"}, False),
+])
+def test_job_parameters(params, convert):
+    assert _validate_partitions(params) == {"convert": convert}
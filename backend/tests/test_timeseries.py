@@ -0,0 +1,62 @@
+"""
+/api/reports/timeseries: SQL bucketing and calendar gap-filling
+"""
+from datetime import date
+
+from factories import add_doctor, add_patient, add_visit
+
+URL = "/api/reports/timeseries"
+
+def test_days_without_activity_are_zero_filled(db, client):
+    doctor = add_doctor(db)
+    patient = add_patient(db, registered=date(2024, 3, 1))
+    add_visit(db, doctor, patient, date(2024, 3, 1), status="Paid", expenses={"X-Ray": 250})
+    add_visit(db, doctor, patient, date(2024, 3, 3), status="Pending")
+    db.commit()
+
+    data = client.get(URL, params={"start_date": "2024-03-01", "end_date": "2024-03-04"}).json()
+
+    assert data["buckets"] == ["2024-03-01", "2024-03-02", "2024-03-03", "2024-03-04"]
+    assert data["series"]["appointments"] == [1, 0, 1, 0]
+    assert data["series"]["revenue"] == [1750.0, 0, 0, 0]
+    assert data["series"]["new_patients"] == [1, 0, 0, 0]
+    assert data["series"]["expenses"] == [250.0, 0, 0, 0]
+    assert data["totals"]["appointments"] == 2
+
+def test_week_and_month_buckets_start_on_monday_and_the_first(db, client):
+    doctor = add_doctor(db)
+    patient = add_patient(db)
+    # Wednesday 2024-03-06 and Sunday 2024-03-10 share the week of Monday 2024-03-04
+    for day in (date(2024, 3, 6), date(2024, 3, 10), date(2024, 4, 2)):
+        add_visit(db, doctor, patient, day)
+    db.commit()
+
+    week = client.get(URL, params={
+        "metric": "appointments", "bucket": "week", "start_date": "2024-03-04", "end_date": "2024-03-17"
+    }).json()
+    month = client.get(URL, params={
+        "metric": "appointments", "bucket": "month", "start_date": "2024-03-08", "end_date": "2024-04-30"
+    }).json()
+
+    assert week["buckets"] == ["2024-03-04", "2024-03-11"]
+    assert week["series"] == {"appointments": [2, 0]}
+    assert month["buckets"] == ["2024-03-01", "2024-04-01"]
+    assert month["series"] == {"appointments": [1, 1]}
+
+def test_comma_separated_metrics_and_doctor_filter(db, client):
+    one, two = add_doctor(db, "DOC001"), add_doctor(db, "DOC002")
+    patient = add_patient(db)
+    add_visit(db, one, patient, date(2024, 3, 1), status="Paid")
+    add_visit(db, two, patient, date(2024, 3, 1), status="Paid")
+    db.commit()
+
+    data = client.get(URL, params={
+        "metric": "appointments,revenue", "doctor_id": "DOC002", "start_date": "2024-03-01", "end_date": "2024-03-01"
+    }).json()
+
+    assert data["series"] == {"appointments": [1], "revenue": [1500.0]}
+
+def test_invalid_metric_or_bucket_is_rejected(client):
+    assert client.get(URL, params={"metric": "profit"}).status_code == 400
+    assert client.get(URL, params={"bucket": "year"}).status_code == 400
+    assert client.get(URL, params={"start_date": "2024-03-02", "end_date": "2024-03-01"}).status_code == 400
@@ -30,6 +30,26 @@ async function apiRequest(endpoint, options = {}) {
     return response.json();
 }
 
+// Writes that must not run twice (bookings, expenses, payments): one Idempotency-Key per
+// action, resent on each retry after a network failure so the server applies it once
+async function idempotentRequest(endpoint, options = {}, retries = 2) {
+    const key = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await apiRequest(endpoint, {
+                ...options,
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key, ...options.headers }
+            });
+        } catch (error) {
+            // fetch rejects with a TypeError when no response arrived
+            if (!(error instanceof TypeError) || attempt >= retries) throw error;
+            await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+        }
+    }
+}
+
 // ==================== DASHBOARD ====================
 const Dashboard = {
     getStats: () => apiRequest('/dashboard/stats')
@@ -40,7 +60,9 @@ const Patients = {
     getAll: (search = '') => apiRequest(`/patients${search ? `?search=${encodeURIComponent(search)}` : ''}`),
     getById: (id) => apiRequest(`/patients/${id}`),
     getByNIC: (nic) => apiRequest(`/patients/nic/${nic}`),
+    getHistory: (id, params = {}) => apiRequest(`/patients/${id}/history?${new URLSearchParams(params)}`),
     create: (data) => apiRequest('/patients', { method: 'POST', body: JSON.stringify(data) }),
+    getOrCreate: (data) => apiRequest('/patients/get-or-create', { method: 'POST', body: JSON.stringify(data) }),
     update: (id, data) => apiRequest(`/patients/${id}`, { method: 'PUT', body: JSON.stringify(data) }),
     delete: (id) => apiRequest(`/patients/${id}`, { method: 'DELETE' })
 };
@@ -48,6 +70,7 @@ const Patients = {
 // ==================== DOCTORS ====================
 const Doctors = {
     getAll: (status = 'Active') => apiRequest(`/doctors?status=${status}`),
+    getWithTodayStats: (status = 'Active') => apiRequest(`/doctors?status=${status}&include=today_stats`),
     getById: (id) => apiRequest(`/doctors/${id}`),
     getSpecializations: () => apiRequest('/doctors/specializations'),
     create: (data) => apiRequest('/doctors', { method: 'POST', body: JSON.stringify(data) }),
@@ -70,7 +93,7 @@ const Appointments = {
     getById: (id) => apiRequest(`/appointments/${id}`),
     getToday: () => apiRequest('/appointments/today'),
     getDoctorToday: (doctorId) => apiRequest(`/appointments/doctor/${doctorId}/today`),
-    create: (data) => apiRequest('/appointments', { method: 'POST', body: JSON.stringify(data) }),
+    create: (data) => idempotentRequest('/appointments', { method: 'POST', body: JSON.stringify(data) }),
     updateStatus: (id, status) => apiRequest(`/appointments/${id}/status?status=${status}`, { method: 'PATCH' }),
     cancel: (id) => apiRequest(`/appointments/${id}`, { method: 'DELETE' })
 };
@@ -78,7 +101,7 @@ const Appointments = {
 // ==================== ADDITIONAL EXPENSES ====================
 const Expenses = {
     getByAppointment: (appointmentId) => apiRequest(`/expenses/appointment/${appointmentId}`),
-    add: (data) => apiRequest('/expenses', { method: 'POST', body: JSON.stringify(data) }),
+    add: (data) => idempotentRequest('/expenses', { method: 'POST', body: JSON.stringify(data) }),
     delete: (id) => apiRequest(`/expenses/${id}`, { method: 'DELETE' })
 };
 
@@ -91,7 +114,7 @@ const Bills = {
     getById: (id) => apiRequest(`/bills/${id}`),
     getByAppointment: (appointmentId) => apiRequest(`/bills/appointment/${appointmentId}`),
     updatePaymentStatus: (id, status) => {
-        return apiRequest(`/bills/${id}/payment-status`, { 
+        return idempotentRequest(`/bills/${id}/payment-status`, { 
             method: 'PATCH',
             body: JSON.stringify({ payment_status: status })
         });
@@ -124,6 +147,15 @@ const Reports = {
         if (startDate) params.append('start_date', startDate);
         if (endDate) params.append('end_date', endDate);
         return apiRequest(`/reports/appointments-by-date?${params}`);
+    },
+    getTimeseries: (metrics, bucket = 'day', startDate, endDate, doctorId) => {
+        const params = new URLSearchParams();
+        (metrics || []).forEach(m => params.append('metric', m));
+        params.append('bucket', bucket);
+        if (startDate) params.append('start_date', startDate);
+        if (endDate) params.append('end_date', endDate);
+        if (doctorId) params.append('doctor_id', doctorId);
+        return apiRequest(`/reports/timeseries?${params}`);
     }
 };
 